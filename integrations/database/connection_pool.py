@@ -0,0 +1,308 @@
+"""Thread-safe pool of :class:`SWAILiteManager` connections.
+
+A ``sqlite3`` connection belongs to the thread that opened it, so one
+``SWAILiteManager`` cannot be shared by Streamlit reruns (each runs on
+its own thread) or by worker threads.  :class:`SWAILitePool` owns one
+read-write connection, lent to one thread at a time, and up to
+``readers`` read-only connections.  With the WAL journal of the default
+profile, readers never block the writer or each other.
+
+Connections are checked out with context managers::
+
+    pool = SWAILitePool("data/databases/messages.db", readers=4)
+    with pool.writer() as manager:
+        manager.store_messages(batch)
+    with pool.reader() as manager:
+        manager.get_lead_history("5511999990000")
+
+A thread that nests ``reader()`` blocks gets the same connection back.
+Connections idle for more than ``health_check_interval`` seconds are
+pinged on checkout and replaced if they no longer answer.
+:func:`shared_pool` keeps one pool per database file for the whole
+process.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from integrations.database.sqlite_manager import SWAILiteManager
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READERS = 4
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the timeout."""
+
+
+def _ping(manager: SWAILiteManager) -> bool:
+    try:
+        manager.conn.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+class SWAILitePool:
+    """One writer and ``readers`` read-only connections to a SQLite file.
+
+    Parameters
+    ----------
+    db_path:
+        Database file; ``:memory:`` cannot be shared and is rejected.
+    readers:
+        Maximum read-only connections, opened on demand.
+    profile:
+        ``SWAILiteManager`` pragma profile for every connection.
+    timeout:
+        Default seconds to wait for a connection before :class:`PoolTimeout`.
+    health_check_interval:
+        Seconds a connection may sit idle before it is pinged on checkout.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        readers: int = DEFAULT_READERS,
+        profile: Optional[Mapping[str, Any]] = None,
+        timeout: float = 5.0,
+        health_check_interval: float = 30.0,
+    ) -> None:
+        if db_path == ":memory:":
+            raise ValueError("a pool needs a database file, not :memory:")
+        if readers < 1:
+            raise ValueError("readers must be positive")
+        self.db_path = db_path
+        self.max_readers = readers
+        self.profile = profile
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        # Opening the writer first creates or migrates the schema
+        self._writer = SWAILiteManager(db_path, profile, check_same_thread=False)
+        self._writer_lock = threading.RLock()
+        self._writer_checked = time.monotonic()
+
+        self._idle: "queue.LifoQueue[SWAILiteManager]" = queue.LifoQueue()
+        self._last_used: Dict[int, float] = {}
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._stats: Dict[str, float] = {
+            "writer_checkouts": 0,
+            "reader_checkouts": 0,
+            "waits": 0,
+            "wait_ms": 0.0,
+            "timeouts": 0,
+            "replaced": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Checkout
+    # ------------------------------------------------------------------
+    @contextmanager
+    def writer(self, timeout: Optional[float] = None) -> Iterator[SWAILiteManager]:
+        """Lend the read-write manager to the calling thread."""
+        self._check_open()
+        started = time.monotonic()
+        if not self._writer_lock.acquire(timeout=self.timeout if timeout is None else timeout):
+            self._count("timeouts")
+            raise PoolTimeout("conexão de escrita ocupada")
+        try:
+            self._record_checkout("writer_checkouts", started)
+            if time.monotonic() - self._writer_checked > self.health_check_interval and not _ping(self._writer):
+                try:
+                    self._writer = self._replace(self._writer, read_only=False)
+                except Exception:
+                    # Ping the (closed) old manager again on the next checkout
+                    self._writer_checked = float("-inf")
+                    raise
+            yield self._writer
+            self._writer_checked = time.monotonic()
+        finally:
+            self._writer_lock.release()
+
+    @contextmanager
+    def reader(self, timeout: Optional[float] = None) -> Iterator[SWAILiteManager]:
+        """Lend a read-only manager to the calling thread.
+
+        Nested checkouts on the same thread reuse its connection.
+        """
+        held = getattr(self._local, "reader", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        manager = self._acquire_reader(self.timeout if timeout is None else timeout)
+        self._local.reader, self._local.depth = manager, 1
+        try:
+            yield manager
+        finally:
+            self._local.reader = None
+            self._release_reader(manager)
+
+    def _acquire_reader(self, timeout: float) -> SWAILiteManager:
+        self._check_open()
+        started = time.monotonic()
+        try:
+            manager = self._idle.get_nowait()
+        except queue.Empty:
+            manager = self._open_reader_slot()
+            if manager is None:
+                self._count("waits")
+                try:
+                    manager = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    self._count("timeouts")
+                    raise PoolTimeout(f"nenhuma conexão de leitura livre em {timeout:.1f}s") from None
+
+        idle_for = time.monotonic() - self._last_used.get(id(manager), started)
+        if idle_for > self.health_check_interval and not _ping(manager):
+            manager = self._replace(manager, read_only=True)
+        self._record_checkout("reader_checkouts", started)
+        return manager
+
+    def _open_reader_slot(self) -> Optional[SWAILiteManager]:
+        with self._lock:
+            if self._opened >= self.max_readers:
+                return None
+            self._opened += 1
+        try:
+            return SWAILiteManager(self.db_path, self.profile, read_only=True, check_same_thread=False)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _release_reader(self, manager: SWAILiteManager) -> None:
+        if self._closed:
+            manager.close()
+            return
+        self._last_used[id(manager)] = time.monotonic()
+        self._idle.put(manager)
+
+    def _replace(self, manager: SWAILiteManager, read_only: bool) -> SWAILiteManager:
+        logger.warning("conexão SQLite sem resposta substituída (%s)", "leitura" if read_only else "escrita")
+        try:
+            manager.close()
+        except sqlite3.Error:
+            pass
+        self._last_used.pop(id(manager), None)
+        self._count("replaced")
+        try:
+            return SWAILiteManager(self.db_path, self.profile, read_only=read_only, check_same_thread=False)
+        except Exception:
+            if read_only:
+                # The dead reader's slot is free: reopened on a later checkout
+                with self._lock:
+                    self._opened -= 1
+            raise
+
+    # ------------------------------------------------------------------
+    # Health and statistics
+    # ------------------------------------------------------------------
+    def health(self) -> Dict[str, Any]:
+        """Ping the writer and every idle reader, replacing dead ones."""
+        self._check_open()
+        with self.writer() as manager:
+            writer_ok = _ping(manager)
+        checked = failed = 0
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for manager in idle:
+            checked += 1
+            if not _ping(manager):
+                failed += 1
+                try:
+                    manager = self._replace(manager, read_only=True)
+                except Exception as exc:
+                    logger.error("não foi possível reabrir a conexão de leitura: %s", exc)
+                    continue
+            self._release_reader(manager)
+        return {
+            "status": "ok" if writer_ok and not failed else "degraded",
+            "writer": writer_ok,
+            "readers_checked": checked,
+            "readers_replaced": failed,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Checkout counters, waits and connection usage."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            opened = self._opened
+        idle = self._idle.qsize()
+        stats.update({
+            "readers_open": opened,
+            "readers_idle": idle,
+            "readers_in_use": opened - idle,
+            "readers_max": self.max_readers,
+        })
+        return stats
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _record_checkout(self, key: str, started: float) -> None:
+        with self._lock:
+            self._stats[key] += 1
+            self._stats["wait_ms"] += (time.monotonic() - started) * 1000
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("pool de conexões fechado")
+
+    def close(self) -> None:
+        """Close idle connections now and checked-out ones when returned."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            self._writer.close()
+
+    def __enter__(self) -> "SWAILitePool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+_shared: Dict[str, SWAILitePool] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_pool(db_path: str, readers: int = DEFAULT_READERS, **options: Any) -> SWAILitePool:
+    """Return the process-wide pool for ``db_path``, creating it once."""
+    with _shared_lock:
+        pool = _shared.get(db_path)
+        if pool is None or pool._closed:
+            pool = _shared[db_path] = SWAILitePool(db_path, readers=readers, **options)
+        return pool
+
+
+__all__ = ["DEFAULT_READERS", "PoolTimeout", "SWAILitePool", "shared_pool"]
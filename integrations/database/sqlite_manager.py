@@ -2,8 +2,259 @@
 
 from __future__ import annotations
 
+from dataclasses import dataclass
+from pathlib import Path
 import sqlite3
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from modules.live_features import STATE_COLUMNS, count_interactions, empty_state, fold_messages
+
+# Connection pragmas for concurrent webhook writes and dashboard reads:
+# WAL lets readers proceed while the writer commits, NORMAL only fsyncs
+# at checkpoints, and the busy timeout absorbs short writer locks.
+PERFORMANCE_PROFILE: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # KiB (negative values are sizes, not pages)
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms
+}
+
+_PROFILE_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+# Stored in the database file: only the read-write connection sets them
+_PERSISTENT_PRAGMAS = ("journal_mode",)
+_DIAGNOSTIC_PRAGMAS = _PROFILE_PRAGMAS + ("page_size", "page_count", "freelist_count")
+_SYNCHRONOUS_NAMES = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+_TEMP_STORE_NAMES = {0: "DEFAULT", 1: "FILE", 2: "MEMORY"}
+# Oldest SQLite accepted: ``ON CONFLICT ... RETURNING`` arrived in 3.35.
+MIN_SQLITE_VERSION = (3, 35, 0)
+# Host parameters per statement guaranteed by any build (the compile-time
+# default before 3.32, and builds may still lower ``SQLITE_MAX_VARIABLE_NUMBER``);
+# longer ``IN (...)`` lists are split into chunks of this size.
+_MAX_VARIABLES = 999
+
+# Ordered ``(version, description, statements)``; append new entries, never
+# edit applied ones.
+SCHEMA_MIGRATIONS: Tuple[Tuple[int, str, Tuple[str, ...]], ...] = (
+    (
+        1,
+        "base tables",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT UNIQUE,
+                sender_phone TEXT,
+                receiver_phone TEXT,
+                sender_type TEXT,
+                content TEXT,
+                timestamp TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                lead_phone TEXT,
+                secretary_phone TEXT,
+                start_time TEXT,
+                message_count INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'active'
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS conversation_messages (
+                conversation_id TEXT,
+                message_id TEXT UNIQUE,
+                FOREIGN KEY(conversation_id) REFERENCES conversations(conversation_id)
+            )
+            """,
+        ),
+    ),
+    (
+        2,
+        "lookup indexes",
+        (
+            # Covers "all messages of a conversation" without touching the table
+            "CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation "
+            "ON conversation_messages (conversation_id, message_id)",
+            "CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_messages_sender_timestamp ON messages (sender_phone, timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_messages_receiver_timestamp ON messages (receiver_phone, timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_conversations_lead_start ON conversations (lead_phone, start_time)",
+        ),
+    ),
+    (
+        3,
+        "conversation end time",
+        (
+            "ALTER TABLE conversations ADD COLUMN end_time TEXT",
+            """
+            UPDATE conversations SET end_time = coalesce(
+                (SELECT max(m.timestamp) FROM conversation_messages AS cm
+                 JOIN messages AS m ON m.message_id = cm.message_id
+                 WHERE cm.conversation_id = conversations.conversation_id),
+                start_time
+            )
+            """,
+            # Latest conversation of a lead/secretary pair (session windowing)
+            "CREATE INDEX IF NOT EXISTS idx_conversations_pair_start "
+            "ON conversations (lead_phone, secretary_phone, start_time)",
+        ),
+    ),
+    (
+        4,
+        "conversation features",
+        (
+            # Running aggregates maintained by ``modules.live_features``;
+            # fill them for older data with ``rebuild_conversation_features``
+            """
+            CREATE TABLE IF NOT EXISTS conversation_features (
+                conversation_id TEXT PRIMARY KEY,
+                total_messages INTEGER NOT NULL DEFAULT 0,
+                secretary_messages INTEGER NOT NULL DEFAULT 0,
+                patient_messages INTEGER NOT NULL DEFAULT 0,
+                num_interactions INTEGER NOT NULL DEFAULT 0,
+                agendamento_keywords INTEGER NOT NULL DEFAULT 0,
+                preco_keywords INTEGER NOT NULL DEFAULT 0,
+                audio_media_messages INTEGER NOT NULL DEFAULT 0,
+                patient_questions INTEGER NOT NULL DEFAULT 0,
+                secretary_questions INTEGER NOT NULL DEFAULT 0,
+                first_timestamp TEXT,
+                last_timestamp TEXT,
+                last_sender TEXT
+            )
+            """,
+        ),
+    ),
+)
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+MESSAGE_COLUMNS = (
+    "message_id",
+    "sender_phone",
+    "receiver_phone",
+    "sender_type",
+    "content",
+    "timestamp",
+)
+
+INSERTED = "inserted"
+IGNORED = "ignored"
+OVERWRITTEN = "overwritten"
+
+_INSERT_OR_IGNORE_SQL = """
+    INSERT OR IGNORE INTO messages (message_id, sender_phone, receiver_phone, sender_type, content, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO messages (message_id, sender_phone, receiver_phone, sender_type, content, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(message_id) DO UPDATE SET
+        sender_phone=excluded.sender_phone,
+        receiver_phone=excluded.receiver_phone,
+        sender_type=excluded.sender_type,
+        content=excluded.content,
+        timestamp=excluded.timestamp
+"""
+
+_LINK_MESSAGE_SQL = """
+    INSERT OR IGNORE INTO conversation_messages (conversation_id, message_id)
+    SELECT ?, ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM conversations WHERE conversation_id = ? AND status = 'completed'
+    )
+"""
+
+# Creates the conversation or merges into it: earliest start time and latest
+# end time win, and ``message_count`` grows by the number of newly linked
+# messages.  Scalar ``min``/``max`` return NULL if either side is NULL, so a
+# message without a timestamp falls back to the known value.
+_MERGE_CONVERSATION_SQL = """
+    INSERT INTO conversations (
+        conversation_id, lead_phone, secretary_phone, start_time, end_time, message_count, status
+    ) VALUES (?, ?, ?, ?, ?, ?, 'active')
+    ON CONFLICT(conversation_id) DO UPDATE SET
+        start_time = coalesce(min(start_time, excluded.start_time), start_time, excluded.start_time),
+        end_time = coalesce(max(end_time, excluded.end_time), end_time, excluded.end_time),
+        message_count = message_count + excluded.message_count
+    WHERE status != 'completed'
+"""
+
+_UPSERT_CONVERSATION_SQL = _MERGE_CONVERSATION_SQL + "    RETURNING *\n"
+
+# Session state computed in memory is authoritative for the window; the
+# message count is always re-derived from the links actually stored.
+_SAVE_SESSION_SQL = """
+    INSERT INTO conversations (
+        conversation_id, lead_phone, secretary_phone, start_time, end_time, message_count, status
+    ) VALUES (?1, ?2, ?3, ?4, ?5, (SELECT count(*) FROM conversation_messages WHERE conversation_id = ?1), 'active')
+    ON CONFLICT(conversation_id) DO UPDATE SET
+        start_time = excluded.start_time,
+        end_time = excluded.end_time,
+        message_count = excluded.message_count
+    WHERE status != 'completed'
+"""
+
+_FEATURE_COLUMNS = ("conversation_id",) + STATE_COLUMNS
+_SAVE_FEATURES_SQL = (
+    f"INSERT OR REPLACE INTO conversation_features ({', '.join(_FEATURE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_FEATURE_COLUMNS))})"
+)
+
+# Linked messages of conversations in the order features are folded
+_LINKED_MESSAGES_SQL = """
+    SELECT cm.conversation_id, m.sender_phone, m.sender_type, m.content, m.timestamp
+    FROM conversation_messages AS cm
+    JOIN messages AS m ON m.message_id = cm.message_id
+    {where}
+    ORDER BY cm.conversation_id, m.timestamp, m.id
+"""
+
+
+def _chunks(values: List[Any]) -> Iterator[List[Any]]:
+    for start in range(0, len(values), _MAX_VARIABLES):
+        yield values[start:start + _MAX_VARIABLES]
+
+
+def _compile_profile(profile: Mapping[str, Any]) -> Tuple[str, ...]:
+    """Validate a profile and turn it into ``PRAGMA`` statements."""
+    statements = []
+    for name, value in profile.items():
+        if name not in _PROFILE_PRAGMAS:
+            raise ValueError(f"unsupported pragma in profile: {name!r}")
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"invalid value for pragma {name!r}: {value!r}")
+        if isinstance(value, str) and not value.isalpha():
+            raise ValueError(f"invalid value for pragma {name!r}: {value!r}")
+        statements.append(f"PRAGMA {name} = {value}")
+    return tuple(statements)
+
+
+@dataclass(frozen=True)
+class StoreOutcome:
+    """Result of storing one message through :meth:`SWAILiteManager.store_messages`.
+
+    ``status`` is :data:`INSERTED`, :data:`IGNORED` (already stored and
+    ``overwrite`` was false) or :data:`OVERWRITTEN`.  ``row_id`` is the
+    ``messages.id`` of the stored row.
+    """
+
+    message_id: Optional[str]
+    status: str
+    row_id: Optional[int]
+
+
+def check_sqlite_version() -> None:
+    """Raise :class:`RuntimeError` if the linked SQLite is too old."""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(map(str, MIN_SQLITE_VERSION))
+        raise RuntimeError(
+            f"SQLite {sqlite3.sqlite_version} não suportado: "
+            f"é necessário SQLite {required} ou superior"
+        )
 
 
 class SWAILiteManager:
@@ -11,56 +262,97 @@ class SWAILiteManager:
 
     Besides persisting messages produced by Layer 1, this manager also
     stores conversations generated by Layer 2 of the pipeline.
+
+    ``read_only`` opens an existing database with ``mode=ro`` (no schema
+    migration, writes fail); ``check_same_thread=False`` lets a caller
+    that serializes access, such as
+    :class:`~integrations.database.connection_pool.SWAILitePool`, use the
+    connection from several threads.  ``settings`` supplies the
+    ``AGENDAMENTO_KEYWORDS``/``PRECO_KEYWORDS`` lists counted in
+    ``conversation_features`` (the module constants when omitted).
+
+    Requires SQLite :data:`MIN_SQLITE_VERSION` (3.35) or newer; older
+    libraries are rejected when the manager is created.
     """
 
-    def __init__(self, db_path: str) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        profile: Optional[Mapping[str, Any]] = None,
+        read_only: bool = False,
+        check_same_thread: bool = True,
+        settings: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        check_sqlite_version()
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.read_only = read_only
+        self.settings = settings
+        self.profile = dict(PERFORMANCE_PROFILE if profile is None else profile)
+        self._pragmas = _compile_profile({
+            name: value for name, value in self.profile.items()
+            if not (read_only and name in _PERSISTENT_PRAGMAS)
+        })
+        if read_only:
+            uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+        else:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
         self.conn.row_factory = sqlite3.Row
-        self._ensure_tables()
+        self._apply_profile(self.conn)
+        if not read_only:
+            self._ensure_tables()
+
+    # ------------------------------------------------------------------
+    # Connection tuning
+    # ------------------------------------------------------------------
+    def _apply_profile(self, conn: sqlite3.Connection) -> None:
+        """Run the profile pragmas on a freshly opened connection."""
+        for statement in self._pragmas:
+            conn.execute(statement)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Report the pragmas in effect on the connection.
+
+        Useful to confirm a profile was honoured: ``journal_mode`` stays
+        ``memory`` for ``:memory:`` databases, for instance, even when
+        WAL was requested.
+        """
+        report: Dict[str, Any] = {
+            "db_path": self.db_path,
+            "sqlite_version": sqlite3.sqlite_version,
+        }
+        for pragma in _DIAGNOSTIC_PRAGMAS:
+            report[pragma] = self.conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+        report["synchronous"] = _SYNCHRONOUS_NAMES.get(report["synchronous"], report["synchronous"])
+        report["temp_store"] = _TEMP_STORE_NAMES.get(report["temp_store"], report["temp_store"])
+        report["journal_mode"] = str(report["journal_mode"]).upper()
+        return report
 
     # ------------------------------------------------------------------
     # Schema management
     # ------------------------------------------------------------------
     def _ensure_tables(self) -> None:
-        """Create required tables if they do not exist."""
-        with self.conn:
-            self.conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    message_id TEXT UNIQUE,
-                    sender_phone TEXT,
-                    receiver_phone TEXT,
-                    sender_type TEXT,
-                    content TEXT,
-                    timestamp TEXT
-                )
-                """
-            )
+        """Bring the schema up to :data:`SCHEMA_VERSION`.
 
-            self.conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS conversations (
-                    conversation_id TEXT PRIMARY KEY,
-                    lead_phone TEXT,
-                    secretary_phone TEXT,
-                    start_time TEXT,
-                    message_count INTEGER DEFAULT 0,
-                    status TEXT DEFAULT 'active'
-                )
-                """
-            )
+        Migrations newer than ``PRAGMA user_version`` are applied in
+        order, each in its own transaction together with the version
+        bump, so an interrupted upgrade resumes where it stopped.
+        Databases created before versioning report version 0; the first
+        migration only uses ``IF NOT EXISTS`` and adopts them as-is.
+        """
+        current = self.schema_version()
+        for version, _description, statements in SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {version:d}")
 
-            self.conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS conversation_messages (
-                    conversation_id TEXT,
-                    message_id TEXT UNIQUE,
-                    FOREIGN KEY(conversation_id) REFERENCES conversations(conversation_id)
-                )
-                """
-            )
+    def schema_version(self) -> int:
+        """Return the schema version stored in the database file."""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
 
     # ------------------------------------------------------------------
     # Messages interface
@@ -68,45 +360,101 @@ class SWAILiteManager:
     def store_message(self, message: Dict[str, Any], overwrite: bool = False) -> Optional[int]:
         """Store a formatted message into the database."""
 
-        columns = (
-            "message_id",
-            "sender_phone",
-            "receiver_phone",
-            "sender_type",
-            "content",
-            "timestamp",
-        )
-        values = tuple(message.get(col) for col in columns)
+        values = tuple(message.get(col) for col in MESSAGE_COLUMNS)
 
         with self.conn:
             if overwrite:
-                cursor = self.conn.execute(
-                    """
-                    INSERT INTO messages (message_id, sender_phone, receiver_phone, sender_type, content, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(message_id) DO UPDATE SET
-                        sender_phone=excluded.sender_phone,
-                        receiver_phone=excluded.receiver_phone,
-                        sender_type=excluded.sender_type,
-                        content=excluded.content,
-                        timestamp=excluded.timestamp
-                    """,
-                    values,
-                )
+                keyed = [values[0]] if values[0] is not None else []
+                before = self._folded_rows(keyed)
+                cursor = self.conn.execute(_UPSERT_SQL, values)
+                self._fold_overwrites(before, keyed)
                 return cursor.lastrowid
 
-            cursor = self.conn.execute(
-                """
-                INSERT OR IGNORE INTO messages (message_id, sender_phone, receiver_phone, sender_type, content, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                values,
-            )
+            cursor = self.conn.execute(_INSERT_OR_IGNORE_SQL, values)
 
             if cursor.rowcount == 0:
                 return None
 
-            return cursor.lastrowid
+            row_id = cursor.lastrowid
+            self._fold_arrivals([values[0]])
+            return row_id
+
+    def store_messages(
+        self,
+        messages: Iterable[Dict[str, Any]],
+        overwrite: bool = False,
+        batch_size: int = 500,
+    ) -> List[StoreOutcome]:
+        """Store many formatted messages in a single transaction.
+
+        Rows are written with ``executemany`` in batches of
+        ``batch_size``, so a whole backfill costs one commit instead of
+        one per message.  Returns one :class:`StoreOutcome` per input
+        message, in order; a ``message_id`` repeated within the input is
+        treated exactly as if the messages had been stored one by one.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        rows = [tuple(message.get(col) for col in MESSAGE_COLUMNS) for message in messages]
+        outcomes: List[StoreOutcome] = []
+        sql = _UPSERT_SQL if overwrite else _INSERT_OR_IGNORE_SQL
+
+        with self.conn:
+            for start in range(0, len(rows), batch_size):
+                outcomes.extend(self._store_batch(rows[start:start + batch_size], sql, overwrite))
+
+        return outcomes
+
+    def _store_batch(self, rows: List[tuple], sql: str, overwrite: bool) -> List[StoreOutcome]:
+        ids = list({row[0] for row in rows if row[0] is not None})
+        stored = self._row_ids(ids)
+
+        # Status is decided before writing: a message already in the table
+        # (or seen earlier in this batch) is either ignored or overwritten.
+        statuses = []
+        seen = set(stored)
+        for row in rows:
+            message_id = row[0]
+            if message_id is not None and message_id in seen:
+                statuses.append(OVERWRITTEN if overwrite else IGNORED)
+            else:
+                statuses.append(INSERTED)
+                if message_id is not None:
+                    seen.add(message_id)
+
+        keyed = [row for row in rows if row[0] is not None]
+        before = self._folded_rows(ids) if overwrite else {}
+        self.conn.executemany(sql, keyed)
+        stored = self._row_ids(ids)
+
+        outcomes = []
+        for row, status in zip(rows, statuses):
+            if row[0] is None:
+                # Without a message_id there is nothing to deduplicate on
+                row_id = self.conn.execute(sql, row).lastrowid
+            else:
+                row_id = stored.get(row[0])
+            outcomes.append(StoreOutcome(row[0], status, row_id))
+        if overwrite:
+            self._fold_overwrites(before, ids)
+        else:
+            self._fold_arrivals([row[0] for row, status in zip(rows, statuses) if status == INSERTED and row[0] is not None])
+        return outcomes
+
+    def _row_ids(self, message_ids: List[str]) -> Dict[str, int]:
+        rows = self._select_in("SELECT message_id, id FROM messages WHERE message_id IN ({placeholders})", message_ids)
+        return {row["message_id"]: row["id"] for row in rows}
+
+    def _select_in(self, sql: str, values: List[Any]) -> Iterator[sqlite3.Row]:
+        """Run ``sql`` once per chunk of ``values``, filling ``{placeholders}``.
+
+        Keeps every ``IN (...)`` list under SQLite's host parameter limit;
+        rows come chunk by chunk, so an ``ORDER BY`` only holds within a chunk.
+        """
+        for chunk in _chunks(values):
+            yield from self.conn.execute(sql.format(placeholders=",".join("?" * len(chunk))), chunk)
 
     def get_message_by_id(self, message_id: str) -> Optional[Dict[str, Any]]:
         """Return a stored message given its ``message_id``."""
@@ -118,6 +466,50 @@ class SWAILiteManager:
         row = cursor.fetchone()
         return dict(row) if row else None
 
+    def get_messages_between(
+        self,
+        start: str,
+        end: str,
+        sender_phone: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return messages with ``start <= timestamp < end``, oldest first.
+
+        Timestamps are compared as ISO-8601 strings, as stored by Layer 1.
+        """
+
+        sql = "SELECT * FROM messages WHERE timestamp >= ? AND timestamp < ?"
+        params: List[Any] = [start, end]
+        if sender_phone is not None:
+            sql += " AND sender_phone = ?"
+            params.append(sender_phone)
+        sql += " ORDER BY timestamp"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def get_lead_history(
+        self,
+        lead_phone: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return every message sent to or by ``lead_phone``, oldest first."""
+
+        since = since or ""
+        sql = """
+            SELECT * FROM messages WHERE sender_phone = ? AND timestamp >= ?
+            UNION
+            SELECT * FROM messages WHERE receiver_phone = ? AND timestamp >= ?
+            ORDER BY timestamp
+        """
+        params: List[Any] = [lead_phone, since, lead_phone, since]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
     # ------------------------------------------------------------------
     # Conversations interface
     # ------------------------------------------------------------------
@@ -130,6 +522,91 @@ class SWAILiteManager:
         row = cursor.fetchone()
         return dict(row) if row else None
 
+    def get_conversation_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Return the messages linked to a conversation, oldest first."""
+        cursor = self.conn.execute(
+            """
+            SELECT m.* FROM conversation_messages AS cm
+            JOIN messages AS m ON m.message_id = cm.message_id
+            WHERE cm.conversation_id = ?
+            ORDER BY m.timestamp
+            """,
+            (conversation_id,),
+        )
+        return [dict(row) for row in cursor]
+
+    def get_lead_conversations(self, lead_phone: str) -> List[Dict[str, Any]]:
+        """Return a lead's conversations, oldest first."""
+        cursor = self.conn.execute(
+            "SELECT * FROM conversations WHERE lead_phone = ? ORDER BY start_time",
+            (lead_phone,),
+        )
+        return [dict(row) for row in cursor]
+
+    def get_pair_conversations(
+        self,
+        lead_phone: str,
+        secretary_phone: str,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the conversations between a lead and a secretary, newest first."""
+        sql = """
+            SELECT * FROM conversations WHERE lead_phone = ? AND secretary_phone = ?
+            ORDER BY start_time DESC
+        """
+        params: List[Any] = [lead_phone, secretary_phone]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def get_conversation_message_ids(self, conversation_id: str) -> List[str]:
+        """Return the ids linked to a conversation (stored messages or not)."""
+        cursor = self.conn.execute(
+            "SELECT message_id FROM conversation_messages WHERE conversation_id = ?",
+            (conversation_id,),
+        )
+        return [row["message_id"] for row in cursor]
+
+    def save_sessions(
+        self,
+        conversations: Iterable[Dict[str, Any]],
+        links: Iterable[Tuple[str, str]],
+    ) -> Dict[str, int]:
+        """Persist conversation windows kept in memory by a session engine.
+
+        ``links`` are ``(conversation_id, message_id)`` pairs; messages
+        already linked elsewhere are ignored.  Each conversation row is
+        written with its in-memory ``start_time``/``end_time`` and a
+        ``message_count`` recounted from the stored links, all in one
+        transaction.  Completed conversations are left untouched.
+        Returns the stored link count of every conversation written.
+        """
+        rows = [
+            (c["conversation_id"], c["lead_phone"], c["secretary_phone"], c["start_time"], c["end_time"])
+            for c in conversations
+        ]
+        links = list(links)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            new_links = self._new_links(links)
+            self.conn.executemany(
+                "INSERT INTO conversation_messages (conversation_id, message_id) VALUES (?, ?)",
+                new_links,
+            )
+            self.conn.executemany(_SAVE_SESSION_SQL, rows)
+            self._fold_features(new_links)
+            counts = dict.fromkeys((row[0] for row in rows), 0)
+            counts.update(
+                (row[0], row[1])
+                for row in self._select_in(
+                    "SELECT conversation_id, count(*) FROM conversation_messages "
+                    "WHERE conversation_id IN ({placeholders}) GROUP BY conversation_id",
+                    list(counts),
+                )
+            )
+        return counts
+
     def record_conversation_message(
         self,
         conversation_id: str,
@@ -145,51 +622,342 @@ class SWAILiteManager:
         """
 
         with self.conn:
-            # Ensure conversation exists
-            self.conn.execute(
-                """
-                INSERT OR IGNORE INTO conversations (
-                    conversation_id, lead_phone, secretary_phone, start_time, message_count, status
-                ) VALUES (?, ?, ?, ?, 0, 'active')
-                """,
-                (conversation_id, lead_phone, secretary_phone, timestamp),
-            )
-
-            row = self.conn.execute(
-                "SELECT * FROM conversations WHERE conversation_id = ?",
-                (conversation_id,),
-            ).fetchone()
-
-            if row["status"] == "completed":
-                return dict(row)
-
-            # Preserve earliest start time
-            if row["start_time"] > timestamp:
-                self.conn.execute(
-                    "UPDATE conversations SET start_time = ? WHERE conversation_id = ?",
-                    (timestamp, conversation_id),
+            # Link first, unless the conversation is already completed; the
+            # rowcount tells whether this message is new to the conversation.
+            cursor = self.conn.execute(_LINK_MESSAGE_SQL, (conversation_id, message_id, conversation_id))
+            if cursor.rowcount:
+                self._fold_features([(conversation_id, message_id)])
+
+            # Create or update the conversation in the same statement: keep
+            # the earliest start time and count the link only if it is new.
+            rows = self.conn.execute(
+                _UPSERT_CONVERSATION_SQL,
+                (conversation_id, lead_phone, secretary_phone, timestamp, timestamp, cursor.rowcount),
+            ).fetchall()
+            row = rows[0] if rows else None
+
+            if row is None:
+                # Completed conversations are left untouched (no RETURNING row)
+                row = self.conn.execute(
+                    "SELECT * FROM conversations WHERE conversation_id = ?",
+                    (conversation_id,),
+                ).fetchone()
+
+        return dict(row)
+
+    def record_conversation_messages(
+        self,
+        records: Iterable[Tuple[str, str, str, str, str]],
+        batch_size: int = 500,
+    ) -> List[Dict[str, Any]]:
+        """Batched :meth:`record_conversation_message`.
+
+        ``records`` holds ``(conversation_id, message_id, lead_phone,
+        secretary_phone, timestamp)`` tuples.  Each batch is grouped in
+        memory by conversation and written in one transaction: one
+        ``executemany`` for the links and one for the conversation
+        counters.  Returns, for every record and in order, the
+        conversation row as :meth:`record_conversation_message` would
+        have returned it at that point.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        records = list(records)
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(records), batch_size):
+            results.extend(self._record_conversation_batch(records[start:start + batch_size]))
+        return results
+
+    def store_and_group(
+        self,
+        messages: Iterable[Dict[str, Any]],
+        records: Iterable[Tuple[str, str, str, str, str]],
+        overwrite: bool = False,
+        batch_size: int = 500,
+    ) -> Tuple[List[StoreOutcome], List[Dict[str, Any]]]:
+        """Store Layer 1 messages and group them into conversations atomically.
+
+        Combines :meth:`store_messages` and
+        :meth:`record_conversation_messages` in one transaction, so a
+        crash never leaves stored messages without their conversation
+        links.  Returns both methods' results.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        rows = [tuple(message.get(col) for col in MESSAGE_COLUMNS) for message in messages]
+        records = list(records)
+        sql = _UPSERT_SQL if overwrite else _INSERT_OR_IGNORE_SQL
+        outcomes: List[StoreOutcome] = []
+        results: List[Dict[str, Any]] = []
+
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for start in range(0, len(rows), batch_size):
+                outcomes.extend(self._store_batch(rows[start:start + batch_size], sql, overwrite))
+            for start in range(0, len(records), batch_size):
+                results.extend(self._group_batch(records[start:start + batch_size]))
+
+        return outcomes, results
+
+    def _record_conversation_batch(self, records: List[Tuple[str, str, str, str, str]]) -> List[Dict[str, Any]]:
+        if not records:
+            return []
+
+        with self.conn:
+            # Reserve the write lock so the state read below stays current
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self._group_batch(records)
+
+    def _group_batch(self, records: List[Tuple[str, str, str, str, str]]) -> List[Dict[str, Any]]:
+        """Link ``records`` and update their conversations; runs inside the caller's transaction."""
+        if not records:
+            return []
+
+        conversations = {
+            row["conversation_id"]: dict(row)
+            for row in self._select_in(
+                "SELECT * FROM conversations WHERE conversation_id IN ({placeholders})",
+                list({record[0] for record in records}),
+            )
+        }
+        linked = {
+            row["message_id"]
+            for row in self._select_in(
+                "SELECT message_id FROM conversation_messages WHERE message_id IN ({placeholders})",
+                list({record[1] for record in records}),
+            )
+        }
+
+        links: List[Tuple[str, str]] = []
+        # conversation_id -> [lead_phone, secretary_phone, min start_time, max end_time, new links]
+        deltas: Dict[str, List[Any]] = {}
+        results: List[Dict[str, Any]] = []
+        for conversation_id, message_id, lead_phone, secretary_phone, timestamp in records:
+            row = conversations.get(conversation_id)
+            if row is None:
+                row = conversations[conversation_id] = {
+                    "conversation_id": conversation_id,
+                    "lead_phone": lead_phone,
+                    "secretary_phone": secretary_phone,
+                    "start_time": timestamp,
+                    "message_count": 0,
+                    "status": "active",
+                    "end_time": timestamp,
+                }
+                deltas[conversation_id] = [lead_phone, secretary_phone, timestamp, timestamp, 0]
+
+            if row["status"] != "completed":
+                delta = deltas.setdefault(
+                    conversation_id,
+                    [row["lead_phone"], row["secretary_phone"], row["start_time"], timestamp, 0],
                 )
+                if timestamp is not None:
+                    if row["start_time"] is None or row["start_time"] > timestamp:
+                        row["start_time"] = delta[2] = timestamp
+                    if row["end_time"] is None or row["end_time"] < timestamp:
+                        row["end_time"] = timestamp
+                    if delta[3] is None or delta[3] < timestamp:
+                        delta[3] = timestamp
+                if message_id not in linked:
+                    linked.add(message_id)
+                    links.append((conversation_id, message_id))
+                    row["message_count"] += 1
+                    delta[4] += 1
+
+            results.append(dict(row))
+
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO conversation_messages (conversation_id, message_id) VALUES (?, ?)",
+            links,
+        )
+        self.conn.executemany(
+            _MERGE_CONVERSATION_SQL,
+            [(conversation_id, *delta) for conversation_id, delta in deltas.items()],
+        )
+        self._fold_features(links)
+
+        return results
+
+    # ------------------------------------------------------------------
+    # Conversation features
+    # ------------------------------------------------------------------
+    def _new_links(self, links: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Links whose message is not linked yet (first one wins)."""
+        if not links:
+            return []
+        linked = {
+            row["message_id"]
+            for row in self._select_in(
+                "SELECT message_id FROM conversation_messages WHERE message_id IN ({placeholders})",
+                list({message_id for _, message_id in links}),
+            )
+        }
+        new_links = []
+        for conversation_id, message_id in links:
+            if message_id not in linked:
+                linked.add(message_id)
+                new_links.append((conversation_id, message_id))
+        return new_links
 
-            cursor = self.conn.execute(
-                """
-                INSERT OR IGNORE INTO conversation_messages (conversation_id, message_id)
-                VALUES (?, ?)
-                """,
-                (conversation_id, message_id),
+    def _fold_features(self, links: List[Tuple[str, str]]) -> None:
+        """Add newly linked messages to ``conversation_features``.
+
+        Runs inside the caller's transaction.  Messages not stored in
+        ``messages`` yet are skipped here and folded by
+        :meth:`_fold_arrivals` when they are stored.
+        """
+        if not links:
+            return
+        conversation_of = dict((message_id, conversation_id) for conversation_id, message_id in links)
+        stored = sorted(
+            self._select_in(
+                "SELECT message_id, sender_phone, sender_type, content, timestamp, id FROM messages "
+                "WHERE message_id IN ({placeholders})",
+                list(conversation_of),
+            ),
+            # ORDER BY timestamp, id across chunks (NULL timestamps first, as in SQLite)
+            key=lambda row: (row["timestamp"] is not None, row["timestamp"] or "", row["id"]),
+        )
+        messages: Dict[str, List[Tuple[Any, ...]]] = {}
+        for row in stored:
+            messages.setdefault(conversation_of[row["message_id"]], []).append(tuple(row)[1:5])
+        if not messages:
+            return
+
+        states = {
+            row["conversation_id"]: dict(row)
+            for row in self._select_in(
+                "SELECT * FROM conversation_features WHERE conversation_id IN ({placeholders})",
+                list(messages),
             )
+        }
+        for conversation_id, rows in messages.items():
+            state = states.setdefault(conversation_id, empty_state(conversation_id))
+            if fold_messages(state, rows, self.settings):
+                self._recount_interactions(state)
+        self.conn.executemany(
+            _SAVE_FEATURES_SQL, [tuple(state[column] for column in _FEATURE_COLUMNS) for state in states.values()]
+        )
 
-            if cursor.rowcount:
-                self.conn.execute(
-                    "UPDATE conversations SET message_count = message_count + 1 WHERE conversation_id = ?",
-                    (conversation_id,),
+    def _fold_arrivals(self, message_ids: List[str]) -> None:
+        """Fold newly stored messages that were already linked to a conversation.
+
+        Covers messages grouped before their ``messages`` row existed;
+        each message is folded exactly once, by whichever of the link
+        or the row comes second.
+        """
+        links = [
+            (row["conversation_id"], row["message_id"])
+            for row in self._select_in(
+                "SELECT conversation_id, message_id FROM conversation_messages WHERE message_id IN ({placeholders})",
+                message_ids,
+            )
+        ]
+        self._fold_features(links)
+
+    def _folded_rows(self, message_ids: List[str]) -> Dict[str, Tuple[Any, ...]]:
+        """Stored fields of messages that ``conversation_features`` depends on."""
+        return {
+            row["message_id"]: tuple(row)[1:]
+            for row in self._select_in(
+                "SELECT message_id, sender_phone, sender_type, content, timestamp FROM messages "
+                "WHERE message_id IN ({placeholders})",
+                message_ids,
+            )
+        }
+
+    def _fold_overwrites(self, before: Dict[str, Tuple[Any, ...]], message_ids: List[str]) -> None:
+        """Update features after an upsert of ``message_ids``; runs inside the caller's transaction.
+
+        ``before`` holds :meth:`_folded_rows` from before the upsert.
+        Newly inserted messages are folded as arrivals; conversations
+        holding a message whose folded fields changed are recounted.
+        """
+        after = self._folded_rows(message_ids)
+        self._fold_arrivals([message_id for message_id in after if message_id not in before])
+        changed = [message_id for message_id, row in after.items() if message_id in before and before[message_id] != row]
+        if changed:
+            conversation_ids = [
+                row["conversation_id"]
+                for row in self._select_in(
+                    "SELECT DISTINCT conversation_id FROM conversation_messages WHERE message_id IN ({placeholders})",
+                    changed,
                 )
+            ]
+            self._rebuild_features(list(dict.fromkeys(conversation_ids)), self.settings)
 
-            row = self.conn.execute(
-                "SELECT * FROM conversations WHERE conversation_id = ?",
-                (conversation_id,),
-            ).fetchone()
+    def _recount_interactions(self, state: Dict[str, Any]) -> None:
+        # A late message changed the order of senders: walk the conversation again
+        senders = [
+            row["sender_phone"]
+            for row in self.conn.execute(
+                _LINKED_MESSAGES_SQL.format(where="WHERE cm.conversation_id = ? AND m.timestamp IS NOT NULL"),
+                (state["conversation_id"],),
+            )
+        ]
+        state["num_interactions"] = count_interactions(senders)
+        state["last_sender"] = senders[-1] if senders else None
 
-        return dict(row)
+    def rebuild_conversation_features(
+        self,
+        conversation_ids: Optional[Iterable[str]] = None,
+        settings: Optional[Mapping[str, Any]] = None,
+    ) -> int:
+        """Recompute ``conversation_features`` from the stored messages.
+
+        Fills the table for conversations grouped before it existed, or
+        repairs it; ``None`` rebuilds every conversation.  Keywords are
+        counted with the lists of ``settings``, defaulting to the
+        manager's.  Returns the number of conversations written.
+        """
+        ids = None if conversation_ids is None else list(dict.fromkeys(conversation_ids))
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self._rebuild_features(ids, self.settings if settings is None else settings)
+
+    def _rebuild_features(self, ids: Optional[List[str]], settings: Optional[Mapping[str, Any]]) -> int:
+        """Recount features of ``ids`` (every conversation for ``None``); runs inside the caller's transaction."""
+        if ids is None:
+            linked = self.conn.execute(_LINKED_MESSAGES_SQL.format(where=""))
+        else:
+            # Chunked by conversation, so each one is still read in order
+            linked = self._select_in(_LINKED_MESSAGES_SQL.format(where="WHERE cm.conversation_id IN ({placeholders})"), ids)
+        messages: Dict[str, List[Tuple[Any, ...]]] = {}
+        for row in linked:
+            messages.setdefault(row["conversation_id"], []).append(tuple(row)[1:])
+
+        states = []
+        for conversation_id, rows in messages.items():
+            state = empty_state(conversation_id)
+            fold_messages(state, rows, settings)
+            states.append(state)
+
+        if ids is None:
+            self.conn.execute("DELETE FROM conversation_features")
+        for chunk in _chunks(ids or []):
+            self.conn.execute(
+                f"DELETE FROM conversation_features WHERE conversation_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+        self.conn.executemany(
+            _SAVE_FEATURES_SQL, [tuple(state[column] for column in _FEATURE_COLUMNS) for state in states]
+        )
+        return len(states)
+
+    def get_conversation_features(self, conversation_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Running feature aggregates, for every conversation or the given ones."""
+        if conversation_ids is None:
+            cursor = self.conn.execute("SELECT * FROM conversation_features ORDER BY conversation_id")
+        else:
+            # Sorted before chunking so the chunks come out in conversation_id order
+            cursor = self._select_in(
+                "SELECT * FROM conversation_features WHERE conversation_id IN ({placeholders}) ORDER BY conversation_id",
+                sorted(set(conversation_ids)),
+            )
+        return [dict(row) for row in cursor]
 
     def close(self) -> None:
         self.conn.close()
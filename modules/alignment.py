@@ -0,0 +1,155 @@
+"""Alignment scoring between secretary messages and the aligned content.
+
+:class:`AlignmentScorer` fits the TF-IDF model once, on the aligned
+content plus the corpus of secretary texts being scored, and caches the
+normalized aligned-content vector.  Scoring any number of conversations
+is then a single sparse matrix-vector product instead of one
+``TfidfVectorizer.fit_transform`` per conversation.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from modules.constants import SECRETARY_SENDERS
+
+
+SEQUENCE_SCORE = 75  # Valor padrão, pode ser refinado
+
+
+def empty_alignment(detalhes: str) -> Dict:
+    """Alignment result used when no score can be computed."""
+    return {
+        'score_similaridade': 0,
+        'score_cobertura': 0,
+        'score_sequencia': 0,
+        'score_geral': 0,
+        'detalhes': detalhes
+    }
+
+
+def secretary_text(chat_df: pd.DataFrame, secretary_senders: Iterable[str] = SECRETARY_SENDERS) -> Optional[str]:
+    """Join the secretary's messages, or ``None`` when she never wrote."""
+    if chat_df.empty:
+        return None
+    messages = chat_df.loc[chat_df['sender'].isin(list(secretary_senders)), 'message'].tolist()
+    return ' '.join(messages) if messages else None
+
+
+class AlignmentScorer:
+    """TF-IDF alignment model fitted once for a whole batch.
+
+    Parameters
+    ----------
+    aligned_content:
+        Instructions the secretary is expected to follow.
+    corpus:
+        Secretary texts that will be scored.  Including them in the fit
+        gives a meaningful IDF; texts outside the corpus can still be
+        scored, their unseen terms weighted as if absent from every
+        fitted document.
+    """
+
+    def __init__(self, aligned_content: str, corpus: Iterable[Optional[str]] = ()) -> None:
+        self.aligned_content = aligned_content
+        self.aligned_words = set(aligned_content.lower().split())
+
+        documents = [aligned_content] + [text for text in corpus if text]
+        self.vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, norm=None)
+        try:
+            fitted = self.vectorizer.fit_transform(documents).tocsr()
+        except ValueError:
+            # Vocabulário vazio (apenas stop words): similaridade sempre 0
+            self._analyzer = None
+            return
+
+        self._analyzer = self.vectorizer.build_analyzer()
+        self._vocabulary = self.vectorizer.vocabulary_
+        self._idf = self.vectorizer.idf_
+        self._unseen_idf = np.log((1 + len(documents)) / 1) + 1
+        # Rows already computed by the fit, reused when scoring the corpus itself
+        self._corpus = documents[1:]
+        self._corpus_matrix = fitted[1:]
+        aligned_vector = fitted[0].toarray().ravel()
+        norm = np.linalg.norm(aligned_vector)
+        self._aligned = aligned_vector / norm if norm else None
+
+    def similarity(self, texts: Sequence[Optional[str]]) -> np.ndarray:
+        """Cosine similarity (0..1) of each text to the aligned content."""
+        similarities = np.zeros(len(texts))
+        if self._analyzer is None or self._aligned is None or not len(texts):
+            return similarities
+
+        present = [row for row, text in enumerate(texts) if text]
+        if [texts[row] for row in present] == self._corpus:
+            tfidf = self._corpus_matrix
+            norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+            dots = np.zeros(len(present))
+            np.divide(tfidf @ self._aligned, norms, out=dots, where=norms > 0)
+            similarities[present] = dots
+            return similarities
+
+        rows, cols, counts = [], [], []
+        unseen_sq = np.zeros(len(texts))
+        for row, text in enumerate(texts):
+            if not text:
+                continue
+            tokens: Dict[str, int] = {}
+            for token in self._analyzer(text):
+                tokens[token] = tokens.get(token, 0) + 1
+            for token, count in tokens.items():
+                col = self._vocabulary.get(token)
+                if col is None:
+                    unseen_sq[row] += (count * self._unseen_idf) ** 2
+                else:
+                    rows.append(row)
+                    cols.append(col)
+                    counts.append(count)
+
+        tfidf = sparse.csr_matrix(
+            (np.asarray(counts, dtype=float) * self._idf[cols], (rows, cols)),
+            shape=(len(texts), len(self._idf)),
+        )
+        norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel() + unseen_sq)
+        dots = tfidf @ self._aligned
+        np.divide(dots, norms, out=similarities, where=norms > 0)
+        return similarities
+
+    def coverage(self, text: str) -> float:
+        """Fraction (0..1) of aligned-content words used in ``text``."""
+        if not self.aligned_words:
+            return 0.0
+        return len(self.aligned_words.intersection(text.lower().split())) / len(self.aligned_words)
+
+    def score_texts(self, texts: Sequence[Optional[str]]) -> List[Dict]:
+        """Return one alignment result per secretary text."""
+        similarities = self.similarity(texts)
+        results = []
+        for text, similarity in zip(texts, similarities):
+            if not text:
+                results.append(empty_alignment('Nenhuma mensagem da secretária encontrada'))
+                continue
+
+            score_similaridade = float(similarity) * 100
+            score_cobertura = self.coverage(text) * 100
+            score_geral = (score_similaridade * 0.4 + score_cobertura * 0.4 + SEQUENCE_SCORE * 0.2)
+            results.append({
+                'score_similaridade': round(score_similaridade, 2),
+                'score_cobertura': round(score_cobertura, 2),
+                'score_sequencia': round(SEQUENCE_SCORE, 2),
+                'score_geral': round(score_geral, 2),
+                'detalhes': f'Similaridade semântica: {score_similaridade:.1f}%, Cobertura de tópicos: {score_cobertura:.1f}%'
+            })
+        return results
+
+    def score(self, chat_df: pd.DataFrame, secretary_senders: Iterable[str] = SECRETARY_SENDERS) -> Dict:
+        """Score a single conversation."""
+        return self.score_texts([secretary_text(chat_df, secretary_senders)])[0]
+
+
+__all__ = ["AlignmentScorer", "empty_alignment", "secretary_text"]
@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import json
 from modules.constants import EXTRACTED_FEATURES_CSV, ASSETS_DIR
+from modules.utils import load_data
 
 def perform_eda(df):
     print("\n--- Análise Exploratória de Dados Aprimorada ---")
@@ -65,7 +66,7 @@ def perform_eda(df):
 
     # Matriz de Correlação
     plt.figure(figsize=(12, 10))
-    correlation_matrix = df.drop(columns=["chat_type"], errors='ignore').corr()
+    correlation_matrix = df.drop(columns=["chat_type"], errors='ignore').corr(numeric_only=True)
     sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", fmt=".2f")
     plt.title("Matriz de Correlação das Features")
     plt.savefig(f"{ASSETS_DIR}/correlation_matrix_enhanced.png")
@@ -74,11 +75,11 @@ def perform_eda(df):
 
 
 if __name__ == "__main__":
-    try:
-        features_df = pd.read_csv(EXTRACTED_FEATURES_CSV)
+    features_df = load_data()
+    if features_df is not None:
         perform_eda(features_df)
         print("Análise exploratória aprimorada concluída.")
-    except FileNotFoundError:
+    else:
         print(f"Erro: \'{EXTRACTED_FEATURES_CSV}\' não encontrado. Por favor, execute \'extract_features_enhanced.py\' primeiro.")
 
 
@@ -0,0 +1,80 @@
+"""Batch extraction of conversation exports across worker processes.
+
+Conversation folders are independent, so feature extraction fans out
+over a :class:`~concurrent.futures.ProcessPoolExecutor`.  Tasks are
+submitted in chunks to amortize pickling and results come back in the
+same order as the input so the resulting table is deterministic.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+from pathlib import Path
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
+
+CHAT_FILE_PATTERN = "*/_chat.txt"
+
+
+def find_chat_files(case_dirs: Mapping[str, str], pattern: str = CHAT_FILE_PATTERN) -> List[Tuple[str, str]]:
+    """Return ``(chat_file, chat_type)`` pairs for every export found.
+
+    ``case_dirs`` maps a chat type (``"success"``/``"fail"``) to the
+    directory holding its exports.  Missing directories are skipped and
+    files are sorted so repeated runs yield the same order.
+    """
+    tasks = []
+    for chat_type, directory in case_dirs.items():
+        if not directory:
+            continue
+        base = Path(directory)
+        if not base.is_dir():
+            continue
+        for chat_file in sorted(base.glob(pattern)):
+            if chat_file.is_file():
+                tasks.append((str(chat_file), chat_type))
+    return tasks
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """Return the effective worker count (``None``/``0`` means all CPUs)."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _default_chunksize(task_count: int, workers: int) -> int:
+    # Roughly four chunks per worker keeps the pool busy without paying
+    # one round-trip per conversation.
+    return max(1, math.ceil(task_count / (workers * 4)))
+
+
+def map_chat_files(
+    extract: Callable[[str, str], Any],
+    tasks: Sequence[Tuple[str, str]],
+    workers: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+) -> List[Any]:
+    """Apply ``extract(chat_file, chat_type)`` to every task, in order.
+
+    ``extract`` must be picklable (a module-level function, a bound
+    method of a picklable object or a :func:`functools.partial`).  With a
+    single worker, or a single task, everything runs in-process.
+    """
+    if not tasks:
+        return []
+
+    workers = min(resolve_workers(workers), len(tasks))
+    chat_files = [chat_file for chat_file, _ in tasks]
+    chat_types = [chat_type for _, chat_type in tasks]
+
+    if workers == 1:
+        return [extract(chat_file, chat_type) for chat_file, chat_type in tasks]
+
+    chunksize = chunksize or _default_chunksize(len(tasks), workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(extract, chat_files, chat_types, chunksize=chunksize))
+
+
+__all__ = ["CHAT_FILE_PATTERN", "find_chat_files", "map_chat_files", "resolve_workers"]
@@ -0,0 +1,175 @@
+"""Single-pass parser for WhatsApp ``_chat.txt`` exports.
+
+The export is scanned once with a precompiled multi-line pattern and the
+result is kept in columnar form: timestamps as ``int64`` epoch seconds,
+integer sender codes and offsets into one concatenated message buffer.
+Both ``swai_core`` and the ``modules.extract_features*`` scripts build
+their features from this structure.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Formato: [DD/MM/AAAA, HH:MM:SS] Nome: Mensagem
+_HEADER_RE = re.compile(
+    r"^\[([0-9]{2}/[0-9]{2}/[0-9]{4}, [0-9]{2}:[0-9]{2}:[0-9]{2})\] ([^\n]*?): ",
+    re.MULTILINE,
+)
+_STAMP_WIDTH = 20  # len("DD/MM/AAAA, HH:MM:SS")
+
+
+@dataclass(frozen=True)
+class ParsedChat:
+    """Columnar representation of a parsed chat export.
+
+    ``timestamps`` holds the wall-clock time of each message as epoch
+    seconds (the export carries no timezone), ``sender_codes`` indexes
+    into ``senders`` and message ``i`` is
+    ``text[offsets[i]:offsets[i + 1]]``.
+    """
+
+    timestamps: np.ndarray
+    sender_codes: np.ndarray
+    senders: List[str]
+    offsets: np.ndarray
+    text: str
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def message(self, index: int) -> str:
+        """Return the body of message ``index``."""
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def iter_messages(self) -> Iterator[str]:
+        """Yield message bodies in chat order."""
+        text = self.text
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            yield text[start:end]
+
+    def messages(self) -> List[str]:
+        """Return all message bodies as a list."""
+        return list(self.iter_messages())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Return a ``timestamp``/``sender``/``message`` DataFrame.
+
+        This is the shape historically returned by
+        ``parse_whatsapp_chat`` and consumed by the feature extractors.
+        """
+        senders = np.asarray(self.senders, dtype=object)
+        return pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(self.timestamps, unit="s"),
+                "sender": senders[self.sender_codes] if len(self) else senders[:0],
+                "message": self.messages(),
+            }
+        )
+
+
+def _normalize_body(raw: str) -> str:
+    """Strip each physical line of a (possibly multi-line) message."""
+    if raw.endswith("\n"):
+        raw = raw[:-1]
+    if "\n" not in raw:
+        return raw.strip()
+    return "\n".join(line.strip() for line in raw.split("\n"))
+
+
+def _stamps_to_epoch(stamps: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert fixed-width ``DD/MM/AAAA, HH:MM:SS`` stamps to epoch seconds.
+
+    Returns the epoch seconds and a mask of the stamps that are real
+    dates; out-of-range fields (``31/02``, ``25:00:00``) are flagged
+    instead of rolling over into the next month or day.
+    """
+    if not stamps:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    buffer = "".join(stamps).encode("ascii")
+    digits = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, _STAMP_WIDTH).astype(np.int64) - 48
+
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    year = digits[:, 6] * 1000 + digits[:, 7] * 100 + digits[:, 8] * 10 + digits[:, 9]
+    hour = digits[:, 12] * 10 + digits[:, 13]
+    minute = digits[:, 15] * 10 + digits[:, 16]
+    second = digits[:, 18] * 10 + digits[:, 19]
+
+    months = (year - 1970).astype("datetime64[Y]") + (month - 1).astype("timedelta64[M]")
+    days = months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+    month_length = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+
+    valid = (
+        (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_length)
+        & (hour < 24) & (minute < 60) & (second < 60)
+    )
+    return days.astype(np.int64) * 86400 + hour * 3600 + minute * 60 + second, valid
+
+
+def parse_chat_text(content: str) -> ParsedChat:
+    """Parse the full text of a WhatsApp export in a single pass.
+
+    Lines that do not start with a message header are treated as
+    continuations of the previous message; text before the first header
+    is ignored.  Messages whose header carries an impossible date are
+    dropped, as ``strptime`` rejected them.
+    """
+
+    stamps: List[str] = []
+    codes: List[int] = []
+    sender_index: dict[str, int] = {}
+    bodies: List[str] = []
+
+    previous_end = -1
+    for match in _HEADER_RE.finditer(content):
+        if previous_end >= 0:
+            bodies.append(_normalize_body(content[previous_end:match.start()]))
+        stamp, sender = match.groups()
+        stamps.append(stamp)
+        codes.append(sender_index.setdefault(sender.strip(), len(sender_index)))
+        previous_end = match.end()
+
+    if previous_end >= 0:
+        bodies.append(_normalize_body(content[previous_end:]))
+
+    timestamps, valid = _stamps_to_epoch(stamps)
+    sender_codes = np.asarray(codes, dtype=np.int32)
+    senders = list(sender_index)
+    if not valid.all():
+        timestamps = timestamps[valid]
+        bodies = [body for body, keep in zip(bodies, valid.tolist()) if keep]
+        # Re-code in order of first appearance among the surviving messages,
+        # which is what the secretary tie-break in swai_core relies on
+        sender_codes, used = pd.factorize(sender_codes[valid], sort=False)
+        sender_codes = sender_codes.astype(np.int32)
+        senders = [senders[code] for code in used.tolist()]
+
+    offsets = np.zeros(len(bodies) + 1, dtype=np.int64)
+    if bodies:
+        np.cumsum([len(body) for body in bodies], out=offsets[1:])
+
+    return ParsedChat(
+        timestamps=timestamps,
+        sender_codes=sender_codes,
+        senders=senders,
+        offsets=offsets,
+        text="".join(bodies),
+    )
+
+
+def parse_chat_file(file_path) -> ParsedChat:
+    """Read and parse a ``_chat.txt`` export."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        return parse_chat_text(f.read())
+
+
+__all__ = ["ParsedChat", "parse_chat_file", "parse_chat_text"]
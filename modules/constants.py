@@ -11,6 +11,9 @@ FAIL_CASES_DIR = f"{DATA_DIR}/fail_cases"
 
 EXTRACTED_FEATURES_CSV = f"{DATA_DIR}/extracted_features_enhanced.csv"
 DETAILED_ANALYSIS_JSON = f"{DATA_DIR}/detailed_analysis_results.json"
+FEATURE_STORE_DIR = f"{DATA_DIR}/feature_store"  # Parquet particionado por clínica/mês
+ROLLUP_DB = f"{DATA_DIR}/feature_rollups.sqlite"  # Agregados diários/semanais dos KPIs
+CLINIC_ID = "default"
 
 ALIGNED_CONTENT_FILE = "src/aligned_content.txt" # This file will be created by the user
 ALIGNED_CONTENT_TEMPLATE = "src/aligned_content_template.txt"
@@ -29,5 +32,20 @@ SECONDARY_COLOR = "#FF7F11" # Orange
 VALOR_MEDIO_CONSULTA = 800
 LEADS_DIARIOS = 5
 
+# Remetentes que representam a secretária nas conversas exportadas
+SECRETARY_SENDERS = ('Dra Cristal Endocrinologista', 'Sol')
+
+# Famílias de palavras-chave contadas nas features de conversa
+KEYWORD_FAMILIES = {
+    'agendamento': ['agendar', 'consulta', 'horário', 'disponibilidade', 'marcar'],
+    'preco': ['valor', 'preço', 'custo', 'investimento', 'reais'],
+}
+
+# As mesmas famílias no formato das configurações do app (swai_settings)
+KEYWORD_SETTINGS = {
+    'AGENDAMENTO_KEYWORDS': KEYWORD_FAMILIES['agendamento'],
+    'PRECO_KEYWORDS': KEYWORD_FAMILIES['preco'],
+}
+
 
 
@@ -1,28 +1,16 @@
 
 import os
-import re
 import pandas as pd
-from datetime import datetime
+from modules.chat_parser import parse_chat_file
+from modules.constants import KEYWORD_SETTINGS
+from modules.keyword_matcher import KeywordAutomaton
 
 def parse_whatsapp_chat(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    chat_data = []
-    for line in lines:
-        # Regex para capturar data, hora, remetente e mensagem
-        match = re.match(r'\[(\d{2}/\d{2}/\d{4}), (\d{2}:\d{2}:\d{2})\] (.*?): (.*)', line)
-        if match:
-            date_str, time_str, sender, message = match.groups()
-            timestamp = datetime.strptime(f'{date_str} {time_str}', '%d/%m/%Y %H:%M:%S')
-            chat_data.append({'timestamp': timestamp, 'sender': sender.strip(), 'message': message.strip()})
-        else:
-            # Se a linha não corresponder ao padrão, pode ser uma continuação da mensagem anterior
-            if chat_data:
-                chat_data[-1]['message'] += '\n' + line.strip()
-    return pd.DataFrame(chat_data)
-
-def extract_features(chat_df, chat_type):
+    """Parse WhatsApp chat file and return DataFrame with messages"""
+    return parse_chat_file(file_path).to_dataframe()
+
+def extract_features(chat_df, chat_type, settings=None):
+    """Extract conversation features; keywords come from ``settings`` (defaults to the constants)"""
     features = {}
     
     if chat_df.empty:
@@ -63,13 +51,10 @@ def extract_features(chat_df, chat_type):
     # Features de Conteúdo (Análise de Texto)
     all_messages_lower = ' '.join(chat_df['message'].str.lower().tolist())
 
-    # Palavras-chave de Agendamento
-    agendamento_keywords = ['agendar', 'consulta', 'horário', 'disponibilidade', 'marcar']
-    features['agendamento_keywords'] = sum(all_messages_lower.count(kw) for kw in agendamento_keywords)
-
-    # Palavras-chave de Preço
-    preco_keywords = ['valor', 'preço', 'custo', 'investimento', 'reais']
-    features['preco_keywords'] = sum(all_messages_lower.count(kw) for kw in preco_keywords)
+    # Palavras-chave de Agendamento e de Preço (uma única varredura)
+    keyword_counts = KeywordAutomaton.from_settings(settings or KEYWORD_SETTINGS).count(all_messages_lower)
+    features['agendamento_keywords'] = keyword_counts['agendamento']
+    features['preco_keywords'] = keyword_counts['preco']
 
     # Presença de Áudios/Mídias
     features['audio_media_messages'] = chat_df['message'].str.contains('áudio ocultado|imagem ocultada|vídeo ocultado', case=False).sum()
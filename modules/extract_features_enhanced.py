@@ -1,30 +1,19 @@
 import os
-import re
+from pathlib import Path
 import pandas as pd
-from datetime import datetime
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from modules.constants import ALIGNED_CONTENT_FILE, SUCCESS_CASES_DIR, FAIL_CASES_DIR, EXTRACTED_FEATURES_CSV, DETAILED_ANALYSIS_JSON
+from modules.alignment import AlignmentScorer, empty_alignment, secretary_text
+from modules.batch_extraction import find_chat_files, map_chat_files
+from modules.chat_parser import parse_chat_file
+from modules.keyword_matcher import KeywordAutomaton
+from modules.pendencies import extract_pendency_table
+from modules.rollups import RollupStore
+from modules.feature_store import DETAILS_TABLE, PENDENCIES_TABLE, parquet_available, save_features
+from modules.constants import ALIGNED_CONTENT_FILE, SUCCESS_CASES_DIR, FAIL_CASES_DIR, EXTRACTED_FEATURES_CSV, DETAILED_ANALYSIS_JSON, FEATURE_STORE_DIR, CLINIC_ID, KEYWORD_SETTINGS, ROLLUP_DB
 
 def parse_whatsapp_chat(file_path):
     """Parse WhatsApp chat file and return DataFrame with messages"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    chat_data = []
-    for line in lines:
-        # Regex para capturar data, hora, remetente e mensagem
-        match = re.match(r'\[(\d{2}/\d{2}/\d{4}), (\d{2}:\d{2}:\d{2})\] (.*?): (.*)', line)
-        if match:
-            date_str, time_str, sender, message = match.groups()
-            timestamp = datetime.strptime(f'{date_str} {time_str}', '%d/%m/%Y %H:%M:%S')
-            chat_data.append({'timestamp': timestamp, 'sender': sender.strip(), 'message': message.strip()})
-        else:
-            # Se a linha não corresponder ao padrão, pode ser uma continuação da mensagem anterior
-            if chat_data:
-                chat_data[-1]['message'] += '\n' + line.strip()
-    return pd.DataFrame(chat_data)
+    return parse_chat_file(file_path).to_dataframe()
 
 def load_aligned_content(file_path=ALIGNED_CONTENT_FILE):
     """Load aligned content from file"""
@@ -78,118 +67,33 @@ def generate_daily_summary(chat_df):
 
 def extract_pendencies(chat_df):
     """Extract pendencies from the conversation"""
-    pendencies = []
-    secretary_senders = ['Dra Cristal Endocrinologista', 'Sol']
-    
-    # Padrões para detectar pendências
-    patterns = {
-        'agendamento': [
-            r'vou agendar',
-            r'podemos agendar',
-            r'disponibilidade para',
-            r'marcar para'
-        ],
-        'informacao': [
-            r'vou te passar',
-            r'preciso que',
-            r'me passa',
-            r'pode me enviar',
-            r'preciso de',
-            r'vou te explicar'
-        ],
-        'exame': [
-            r'solicitar exames',
-            r'pedidos de exames',
-            r'levar exames',
-            r'bioimpedância'
-        ],
-        'pagamento': [
-            r'pagamento',
-            r'valor',
-            r'pix',
-            r'cartão'
-        ]
-    }
-    
-    for _, row in chat_df.iterrows():
-        message = row['message'].lower()
-        sender = row['sender']
-        
-        for pend_type, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                if re.search(pattern, message):
-                    responsible = 'secretaria' if sender in secretary_senders else 'paciente'
-                    pendencies.append({
-                        'descricao': row['message'][:100] + '...' if len(row['message']) > 100 else row['message'],
-                        'responsavel': responsible,
-                        'tipo': pend_type,
-                        'status': 'pendente'
-                    })
-                    break
-    
-    return pendencies
+    table = extract_pendency_table(chat_df)
+    return table.drop(columns='message_index').astype(object).to_dict('records')
 
 def calculate_alignment_score(chat_df, aligned_content):
-    """Calculate alignment score between secretary behavior and aligned content"""
+    """Calculate alignment score between secretary behavior and aligned content
+
+    ``aligned_content`` may be the raw text or an already fitted
+    :class:`AlignmentScorer`, which avoids refitting TF-IDF per conversation.
+    """
     if aligned_content is None:
-        return {
-            'score_similaridade': 0,
-            'score_cobertura': 0,
-            'score_sequencia': 0,
-            'score_geral': 0,
-            'detalhes': 'Conteúdo alinhado não fornecido'
-        }
-    
-    secretary_senders = ['Dra Cristal Endocrinologista', 'Sol']
-    secretary_messages = chat_df[chat_df['sender'].isin(secretary_senders)]['message'].tolist()
-    
-    if not secretary_messages:
-        return {
-            'score_similaridade': 0,
-            'score_cobertura': 0,
-            'score_sequencia': 0,
-            'score_geral': 0,
-            'detalhes': 'Nenhuma mensagem da secretária encontrada'
-        }
-    
-    # Combinar todas as mensagens da secretária
-    secretary_text = ' '.join(secretary_messages)
-    
-    # Calcular similaridade usando TF-IDF
-    vectorizer = TfidfVectorizer(stop_words='english', lowercase=True)
-    try:
-        tfidf_matrix = vectorizer.fit_transform([secretary_text, aligned_content])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-        score_similaridade = similarity * 100
-    except:
-        score_similaridade = 0
-    
-    # Calcular cobertura de tópicos (simplificado)
-    aligned_words = set(aligned_content.lower().split())
-    secretary_words = set(secretary_text.lower().split())
-    
-    if aligned_words:
-        coverage = len(aligned_words.intersection(secretary_words)) / len(aligned_words)
-        score_cobertura = coverage * 100
-    else:
-        score_cobertura = 0
-    
-    # Score de sequência (simplificado - baseado na ordem das mensagens)
-    score_sequencia = 75  # Valor padrão, pode ser refinado
-    
-    # Score geral (média ponderada)
-    score_geral = (score_similaridade * 0.4 + score_cobertura * 0.4 + score_sequencia * 0.2)
-    
-    return {
-        'score_similaridade': round(score_similaridade, 2),
-        'score_cobertura': round(score_cobertura, 2),
-        'score_sequencia': round(score_sequencia, 2),
-        'score_geral': round(score_geral, 2),
-        'detalhes': f'Similaridade semântica: {score_similaridade:.1f}%, Cobertura de tópicos: {score_cobertura:.1f}%'
-    }
-
-def extract_features_enhanced(chat_df, chat_type, aligned_content=None):
-    """Extract enhanced features including summary, pendencies, and alignment"""
+        return empty_alignment('Conteúdo alinhado não fornecido')
+
+    if isinstance(aligned_content, AlignmentScorer):
+        return aligned_content.score(chat_df)
+
+    text = secretary_text(chat_df)
+    if text is None:
+        return empty_alignment('Nenhuma mensagem da secretária encontrada')
+
+    return AlignmentScorer(aligned_content, corpus=[text]).score_texts([text])[0]
+
+def extract_features_enhanced(chat_df, chat_type, aligned_content=None, settings=None):
+    """Extract enhanced features including summary, pendencies, and alignment
+
+    Keywords are read from ``settings`` (``AGENDAMENTO_KEYWORDS``/``PRECO_KEYWORDS``),
+    falling back to the module constants.
+    """
     features = {}
     
     if chat_df.empty:
@@ -211,6 +115,7 @@ def extract_features_enhanced(chat_df, chat_type, aligned_content=None):
         }
 
     # Features originais
+    features['start_time'] = chat_df['timestamp'].min().isoformat()
     duration = (chat_df['timestamp'].max() - chat_df['timestamp'].min()).total_seconds() / 60
     features['duration_minutes'] = duration
     features['total_messages'] = len(chat_df)
@@ -226,11 +131,9 @@ def extract_features_enhanced(chat_df, chat_type, aligned_content=None):
 
     all_messages_lower = ' '.join(chat_df['message'].str.lower().tolist())
 
-    agendamento_keywords = ['agendar', 'consulta', 'horário', 'disponibilidade', 'marcar']
-    features['agendamento_keywords'] = sum(all_messages_lower.count(kw) for kw in agendamento_keywords)
-
-    preco_keywords = ['valor', 'preço', 'custo', 'investimento', 'reais']
-    features['preco_keywords'] = sum(all_messages_lower.count(kw) for kw in preco_keywords)
+    keyword_counts = KeywordAutomaton.from_settings(settings or KEYWORD_SETTINGS).count(all_messages_lower)
+    features['agendamento_keywords'] = keyword_counts['agendamento']
+    features['preco_keywords'] = keyword_counts['preco']
 
     features['audio_media_messages'] = chat_df['message'].str.contains('áudio ocultado|imagem ocultada|vídeo ocultado', case=False).sum()
 
@@ -246,33 +149,63 @@ def extract_features_enhanced(chat_df, chat_type, aligned_content=None):
 
     return features
 
-if __name__ == '__main__':
-    # Carregar conteúdo alinhado
-    aligned_content = load_aligned_content()
-    
-    success_dir = SUCCESS_CASES_DIR
-    fail_dir = FAIL_CASES_DIR
-
-    all_features = []
-
-    # Processar casos de sucesso
-    for root, _, files in os.walk(success_dir):
-        for file in files:
-            if file.endswith('_chat.txt'):
-                file_path = os.path.join(root, file)
-                chat_df = parse_whatsapp_chat(file_path)
-                features = extract_features_enhanced(chat_df, 'success', aligned_content)
-                all_features.append(features)
-
-    # Processar casos de falha
-    for root, _, files in os.walk(fail_dir):
-        for file in files:
-            if file.endswith('_chat.txt'):
-                file_path = os.path.join(root, file)
-                chat_df = parse_whatsapp_chat(file_path)
-                features = extract_features_enhanced(chat_df, 'fail', aligned_content)
-                all_features.append(features)
+def extract_chat_file(file_path, chat_type, aligned_content=None, settings=None):
+    """Parse one exported chat and extract its enhanced features"""
+    chat_df = parse_whatsapp_chat(file_path)
+    features = extract_features_enhanced(chat_df, chat_type, aligned_content, settings)
+    features['chat_name'] = Path(file_path).parent.name
+    return features
+
+def extract_chat_file_deferred(file_path, chat_type, settings=None):
+    """Extract enhanced features leaving alignment for a batch pass
+
+    Returns ``(features, secretary_text)`` so the caller can fit a single
+    :class:`AlignmentScorer` on every secretary text at once.
+    """
+    chat_df = parse_whatsapp_chat(file_path)
+    features = extract_features_enhanced(chat_df, chat_type, settings=settings)
+    features['chat_name'] = Path(file_path).parent.name
+    return features, secretary_text(chat_df)
+
+def score_alignment_batch(all_features, texts, aligned_content):
+    """Fill ``alinhamento`` for all conversations with one TF-IDF fit"""
+    if aligned_content is None:
+        return all_features
+    scorer = AlignmentScorer(aligned_content, corpus=texts)
+    for features, alignment in zip(all_features, scorer.score_texts(texts)):
+        features['alinhamento'] = alignment
+    return all_features
+
+KEY_COLUMNS = ['chat_name', 'chat_type', 'start_time']
 
+def pendencies_frame(detailed_results):
+    """One row per pendency, keyed by the conversation it came from"""
+    rows = [
+        {**{key: features.get(key) for key in KEY_COLUMNS}, **pendency}
+        for features in detailed_results
+        for pendency in features.get('pendencias', [])
+    ]
+    return pd.DataFrame(rows, columns=KEY_COLUMNS + ['descricao', 'responsavel', 'tipo', 'status'])
+
+def details_frame(detailed_results):
+    """Daily summary and alignment details, one row per conversation"""
+    return pd.DataFrame([
+        {
+            **{key: features.get(key) for key in KEY_COLUMNS},
+            'resumo_diario': features.get('resumo_diario'),
+            'alignment_details': features.get('alinhamento', {}).get('detalhes'),
+        }
+        for features in detailed_results
+    ], columns=KEY_COLUMNS + ['resumo_diario', 'alignment_details'])
+
+def save_extraction(all_features, feature_store_dir=FEATURE_STORE_DIR, features_csv=EXTRACTED_FEATURES_CSV,
+                    detailed_json=DETAILED_ANALYSIS_JSON, rollup_db=ROLLUP_DB, clinic=CLINIC_ID):
+    """Persist extracted features and keep the KPI rollups in sync with them
+
+    Writes the feature store (or the CSV/JSON pair without pyarrow) and
+    then syncs ``rollup_db``, so period/secretary filters read the same
+    rows as the unfiltered metrics.  Returns the features DataFrame.
+    """
     # Separar features simples das complexas para o CSV
     simple_features = []
     detailed_results = []
@@ -294,20 +227,55 @@ if __name__ == '__main__':
         simple_features.append(simple_feature)
         detailed_results.append(features)
 
-    # Salvar features simples em CSV
     features_df = pd.DataFrame(simple_features)
-    features_df.to_csv(EXTRACTED_FEATURES_CSV, index=False)
-    
-    # Salvar resultados detalhados em arquivo separado
-    import json
-    with open(DETAILED_ANALYSIS_JSON, 'w', encoding='utf-8') as f:
-        json.dump(detailed_results, f, ensure_ascii=False, indent=2, default=str)
-    
-    print('Extração de features aprimorada concluída.')
-    print('Dados salvos em:')
-    print(f'- {EXTRACTED_FEATURES_CSV} (features numéricas)')
-    print(f'- {DETAILED_ANALYSIS_JSON} (análise completa)')
+
+    if parquet_available():
+        # Feature store: features tipadas, pendências e detalhes em tabelas próprias
+        save_features(features_df, feature_store_dir, clinic=clinic)
+        save_features(pendencies_frame(detailed_results), feature_store_dir, clinic=clinic, table=PENDENCIES_TABLE)
+        save_features(details_frame(detailed_results), feature_store_dir, clinic=clinic, table=DETAILS_TABLE)
+        print('Extração de features aprimorada concluída.')
+        print(f'Dados salvos no feature store: {feature_store_dir}')
+    else:
+        # Salvar features simples em CSV
+        features_df.to_csv(features_csv, index=False)
+
+        # Salvar resultados detalhados em arquivo separado
+        import json
+        with open(detailed_json, 'w', encoding='utf-8') as f:
+            json.dump(detailed_results, f, ensure_ascii=False, indent=2, default=str)
+
+        print('Extração de features aprimorada concluída.')
+        print('Dados salvos em:')
+        print(f'- {features_csv} (features numéricas)')
+        print(f'- {detailed_json} (análise completa)')
+
+    if rollup_db:
+        # Agregados usados pelos filtros de período/secretária do dashboard
+        with RollupStore(rollup_db) as store:
+            changes = store.sync(features_df)
+        print(f'- {rollup_db} (agregados: {changes})')
+
+    return features_df
+
+if __name__ == '__main__':
+    # Carregar conteúdo alinhado
+    aligned_content = load_aligned_content()
     
+    # Processar casos de sucesso e de falha em paralelo (ordem preservada)
+    tasks = find_chat_files({'success': SUCCESS_CASES_DIR, 'fail': FAIL_CASES_DIR}, pattern='**/*_chat.txt')
+    workers = int(os.environ.get('SWAI_EXTRACTION_WORKERS', 0))
+    results = map_chat_files(extract_chat_file_deferred, tasks, workers=workers)
+
+    # Alinhamento: TF-IDF ajustado uma única vez para todas as conversas
+    all_features = score_alignment_batch(
+        [features for features, _ in results],
+        [text for _, text in results],
+        aligned_content,
+    )
+
+    save_extraction(all_features)
+
     if aligned_content is None:
         print(f'\nNOTA: Para calcular o grau de alinhamento, crie um arquivo "{ALIGNED_CONTENT_FILE}"')
         print('com as instruções da médica para a secretária.')
@@ -0,0 +1,154 @@
+"""Content-hash manifest for incremental conversation reprocessing.
+
+The manifest sits next to the features CSV and remembers, for every
+``_chat.txt`` that was processed, its size, modification time, SHA-256
+digest and the feature row extracted from it.  On the next run only new
+or modified exports are extracted again; rows for exports that vanished
+are dropped.  The manifest also records a digest of the extractor
+configuration (e.g. the keyword lists); when it changes every cached
+row is stale and all exports are extracted again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from modules.batch_extraction import map_chat_files
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+
+def manifest_path_for(features_csv: str) -> Path:
+    """Return the default manifest location for a features CSV."""
+    path = Path(features_csv)
+    return path.with_name(f"{path.stem}.manifest.json")
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def config_digest(config: Mapping[str, Any]) -> str:
+    """Return a stable SHA-256 digest of extractor settings."""
+    encoded = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class FeatureManifest:
+    """JSON manifest mapping export paths to their extracted feature row."""
+
+    def __init__(self, path: str | Path, entries: Optional[Dict[str, Dict]] = None,
+                 config: Optional[str] = None) -> None:
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = entries or {}
+        self.config = config
+
+    @classmethod
+    def load(cls, path: str | Path, config: Optional[str] = None) -> "FeatureManifest":
+        """Load a manifest, starting empty when missing, unreadable or built
+        with a different extractor ``config`` digest."""
+        path = Path(path)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path, config=config)
+        except (OSError, ValueError) as exc:
+            logger.warning("manifesto ilegível (%s), reprocessando tudo: %s", path, exc)
+            return cls(path, config=config)
+
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path, config=config)
+        if data.get("config") != config:
+            logger.info("configuração do extrator mudou (%s), reprocessando tudo", path)
+            return cls(path, config=config)
+        return cls(path, data.get("entries", {}), config)
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "config": self.config, "entries": self.entries}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def incremental_extract(
+    extract: Callable[[str, str], Dict],
+    tasks: Sequence[Tuple[str, str]],
+    manifest_path: str | Path,
+    workers: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+    config: Optional[str] = None,
+) -> Tuple[List[Dict], Dict[str, int]]:
+    """Extract features only for exports that changed since the last run.
+
+    An export is considered unchanged when size and ``mtime`` match the
+    manifest; when only the ``mtime`` moved, its content hash decides.
+    ``config`` is a digest of the extractor settings (see
+    :func:`config_digest`); a manifest written under another digest is
+    ignored.  Exports whose extraction returns nothing are not recorded,
+    so they are retried on the next run.  Returns the feature rows in
+    ``tasks`` order (empty rows omitted) and ``{"reused", "extracted",
+    "failed", "removed"}`` counters.
+    """
+
+    manifest = FeatureManifest.load(manifest_path, config)
+    previous = manifest.entries
+    entries: Dict[str, Dict] = {}
+    pending: List[Tuple[str, str]] = []
+    pending_meta: List[Dict] = []
+
+    for chat_file, chat_type in tasks:
+        stat = os.stat(chat_file)
+        meta = {"chat_type": chat_type, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        cached = previous.get(chat_file)
+
+        if cached and cached["chat_type"] == chat_type and cached["size"] == stat.st_size:
+            if cached["mtime_ns"] == stat.st_mtime_ns:
+                entries[chat_file] = cached
+                continue
+            digest = file_digest(chat_file)
+            if digest == cached["sha256"]:
+                entries[chat_file] = {**cached, **meta}
+                continue
+            meta["sha256"] = digest
+
+        pending.append((chat_file, chat_type))
+        pending_meta.append(meta)
+
+    failed = 0
+    results = map_chat_files(extract, pending, workers=workers, chunksize=chunksize)
+    for (chat_file, _), meta, features in zip(pending, pending_meta, results):
+        if not features:
+            failed += 1
+            continue
+        if "sha256" not in meta:
+            meta["sha256"] = file_digest(chat_file)
+        entries[chat_file] = {**meta, "features": features}
+
+    stats = {
+        "reused": len(tasks) - len(pending),
+        "extracted": len(pending) - failed,
+        "failed": failed,
+        "removed": len(set(previous) - {chat_file for chat_file, _ in tasks}),
+    }
+
+    manifest.entries = entries
+    manifest.save()
+
+    rows = [entries[chat_file]["features"] for chat_file, _ in tasks if chat_file in entries]
+    return rows, stats
+
+
+__all__ = ["FeatureManifest", "config_digest", "file_digest", "incremental_extract", "manifest_path_for"]
@@ -0,0 +1,332 @@
+"""Columnar Parquet feature store for extracted conversation features.
+
+Feature rows are written as a Hive-partitioned Parquet dataset
+(``clinic=<id>/month=<AAAA-MM>``) with typed columns and a categorical
+``chat_type``.  Each clinic keeps its partitions in versioned hidden
+directories (``clinic=<id>/.v-<uuid>/month=...``) and a ``CURRENT``
+pointer file naming the live one; a rewrite flips the pointer with a
+single rename.  Readers ask only for the columns they need and pass
+filters that pyarrow pushes down to partition pruning and row-group
+statistics, so large tables load without parsing a CSV.
+
+``pyarrow`` is optional: without it, and for trees that still only have
+the legacy CSV, :func:`load_features`/:func:`save_features` fall back to
+``extracted_features_enhanced.csv`` with the same projection and filter
+semantics.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+import shutil
+from typing import Iterable, List, Optional, Sequence, Tuple
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+    ds = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLINIC = "default"
+FEATURES_TABLE = "features"
+PENDENCIES_TABLE = "pendencias"
+DETAILS_TABLE = "detalhes"
+UNKNOWN_MONTH = "desconhecido"
+PARTITION_COLUMNS = ["clinic", "month"]
+_POINTER = "CURRENT"
+_VERSION_PREFIX = ".v-"  # hidden: pyarrow directory discovery skips it
+_RANGE_OPS = ("<", "<=", ">", ">=")
+
+# Tipos das colunas conhecidas; colunas extras são gravadas como vierem.
+# Contagens usam inteiros anuláveis: métrica ausente fica nula, não zero
+FEATURE_DTYPES = {
+    "chat_name": "string",
+    "chat_type": "category",
+    "start_time": "datetime64[s]",
+    "duration_minutes": "float64",
+    "total_messages": "Int32",
+    "secretary_messages": "Int32",
+    "patient_messages": "Int32",
+    "num_interactions": "Int32",
+    "agendamento_keywords": "Int32",
+    "preco_keywords": "Int32",
+    "audio_messages": "Int32",
+    "audio_media_messages": "Int32",
+    "patient_questions": "Int32",
+    "secretary_questions": "Int32",
+    "alignment_similarity": "float64",
+    "alignment_coverage": "float64",
+    "alignment_sequence": "float64",
+    "alignment_overall": "float64",
+    "tipo": "category",
+    "responsavel": "category",
+    "status": "category",
+}
+
+Filter = Tuple[str, str, object]
+
+
+def parquet_available() -> bool:
+    """Return ``True`` when pyarrow is installed."""
+    return pq is not None
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for column, dtype in FEATURE_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if dtype.startswith("datetime"):
+            df[column] = pd.to_datetime(df[column], errors="coerce").astype(dtype)
+        elif dtype.startswith("Int"):
+            df[column] = np.trunc(pd.to_numeric(df[column], errors="coerce").astype("float64")).astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def _categorical(df: pd.DataFrame) -> pd.DataFrame:
+    for column, dtype in FEATURE_DTYPES.items():
+        if dtype == "category" and column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def _month_column(df: pd.DataFrame) -> pd.Series:
+    if "start_time" not in df.columns:
+        return pd.Series(UNKNOWN_MONTH, index=df.index)
+    months = pd.to_datetime(df["start_time"], errors="coerce").dt.strftime("%Y-%m")
+    return months.fillna(UNKNOWN_MONTH)
+
+
+def _month_ranges(filters: Optional[Sequence[Filter]]) -> Optional[List[Filter]]:
+    """Exclude the unknown-month partition from ``month`` range filters.
+
+    ``"desconhecido"`` sorts after every ``AAAA-MM`` string, so a bare
+    ``("month", ">=", ...)`` would otherwise match it.
+    """
+    if not filters:
+        return filters
+    filters = list(filters)
+    if any(column == "month" and op in _RANGE_OPS for column, op, _ in filters):
+        filters.append(("month", "!=", UNKNOWN_MONTH))
+    return filters
+
+
+def apply_filters(df: pd.DataFrame, filters: Optional[Sequence[Filter]]) -> pd.DataFrame:
+    """Apply pyarrow-style ``(column, op, value)`` filters (ANDed) in pandas."""
+    filters = _month_ranges(filters)
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        series = df[column]
+        if op in ("=", "=="):
+            mask &= series == value
+        elif op == "!=":
+            mask &= series != value
+        elif op == "<":
+            mask &= series < value
+        elif op == "<=":
+            mask &= series <= value
+        elif op == ">":
+            mask &= series > value
+        elif op == ">=":
+            mask &= series >= value
+        elif op == "in":
+            mask &= series.isin(list(value))
+        elif op == "not in":
+            mask &= ~series.isin(list(value))
+        else:
+            raise ValueError(f"operador de filtro não suportado: {op!r}")
+    return df[mask].reset_index(drop=True)
+
+
+class FeatureStore:
+    """Partitioned Parquet dataset for one table (``features``, ``pendencias``...)."""
+
+    def __init__(self, root: str | Path, table: str = FEATURES_TABLE) -> None:
+        self.root = Path(root)
+        self.table = table
+        self.path = self.root / table
+
+    def exists(self) -> bool:
+        """Return ``True`` when the dataset has been written and can be read."""
+        return parquet_available() and bool(self.files())
+
+    def _current(self, clinic_dir: Path) -> Path:
+        """Directory holding the live partitions of one clinic."""
+        try:
+            return clinic_dir / (clinic_dir / _POINTER).read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return clinic_dir  # written before versioned directories
+
+    def files(self) -> List[str]:
+        """Parquet files of the live version of every clinic."""
+        if not self.path.is_dir():
+            return []
+        files: List[Path] = []
+        for clinic_dir in self.path.glob("clinic=*"):
+            current = self._current(clinic_dir)
+            if current == clinic_dir:
+                files.extend(clinic_dir.glob("month=*/*.parquet"))
+            else:
+                files.extend(current.rglob("*.parquet"))
+        return sorted(str(path) for path in files)
+
+    def write(self, df: pd.DataFrame, clinic: str = DEFAULT_CLINIC) -> None:
+        """Replace every partition of ``clinic`` with the rows in ``df``.
+
+        The new partitions go to a fresh hidden version directory and the
+        clinic's ``CURRENT`` pointer is then replaced in one rename, so a
+        crash or a concurrent reader never sees a half-written clinic:
+        readers get either the old or the new rows.  The version being
+        replaced is kept until the next write, so a reader that resolved
+        the old pointer can still finish; older or orphaned versions are
+        removed.
+        """
+        if not parquet_available():
+            raise RuntimeError("pyarrow não está instalado")
+
+        clinic_dir = self.path / f"clinic={clinic}"
+        clinic_dir.mkdir(parents=True, exist_ok=True)
+        previous = self._current(clinic_dir)
+        version = f"{_VERSION_PREFIX}{uuid.uuid4().hex}"
+
+        if df.empty:
+            (clinic_dir / version).mkdir()
+        else:
+            data = _typed(df.drop(columns=[c for c in PARTITION_COLUMNS if c in df.columns]))
+            data["month"] = _month_column(data)
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            pq.write_to_dataset(table, root_path=str(clinic_dir / version), partition_cols=["month"])
+
+        pointer = clinic_dir / f".{_POINTER}-{version}.tmp"
+        pointer.write_text(version, encoding="utf-8")
+        os.replace(pointer, clinic_dir / _POINTER)
+
+        for child in clinic_dir.iterdir():
+            if child.name in (_POINTER, version, previous.name):
+                continue
+            if child.is_dir():
+                shutil.rmtree(child, ignore_errors=True)
+            else:
+                child.unlink(missing_ok=True)
+
+    def read(
+        self,
+        columns: Optional[Iterable[str]] = None,
+        filters: Optional[Sequence[Filter]] = None,
+    ) -> pd.DataFrame:
+        """Read the dataset, loading only ``columns`` and rows matching ``filters``.
+
+        Filters on ``clinic``/``month`` prune whole directories; filters
+        on other columns are checked against row-group statistics before
+        any data page is decoded.
+        """
+        files = self.files()
+        if not files:
+            return pd.DataFrame(columns=list(columns) if columns is not None else [])
+        filters = _month_ranges(filters)
+        dataset = ds.dataset(
+            files,
+            format="parquet",
+            partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+            partition_base_dir=str(self.path),
+        )
+        table = dataset.to_table(
+            columns=list(columns) if columns is not None else None,
+            filter=pq.filters_to_expression(filters) if filters else None,
+        )
+        return _categorical(table.to_pandas())
+
+    def count_rows(self, filters: Optional[Sequence[Filter]] = None) -> int:
+        """Row count from Parquet metadata (no column data is read)."""
+        if not filters:
+            return sum(pq.ParquetFile(path).metadata.num_rows for path in self.files())
+        return self.read(columns=[], filters=filters).shape[0]
+
+    def clear(self) -> None:
+        """Remove the whole dataset."""
+        if self.path.exists():
+            shutil.rmtree(self.path)
+
+
+def load_features(
+    store_dir: Optional[str | Path],
+    csv_path: Optional[str | Path] = None,
+    columns: Optional[Iterable[str]] = None,
+    filters: Optional[Sequence[Filter]] = None,
+    table: str = FEATURES_TABLE,
+) -> Optional[pd.DataFrame]:
+    """Load rows of ``table`` from the Parquet store, or the legacy CSV.
+
+    Returns ``None`` when neither source exists.
+    """
+    if store_dir:
+        store = FeatureStore(store_dir, table)
+        if store.exists():
+            return store.read(columns=columns, filters=filters)
+
+    if csv_path and Path(csv_path).exists():
+        df = pd.read_csv(csv_path)
+        df = apply_filters(df, filters)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return _categorical(df)
+
+    return None
+
+
+def count_features(store_dir: Optional[str | Path], csv_path: Optional[str | Path] = None) -> Optional[int]:
+    """Number of stored feature rows without loading them, if any exist."""
+    if store_dir and FeatureStore(store_dir).exists():
+        return FeatureStore(store_dir).count_rows()
+    if csv_path and Path(csv_path).exists():
+        with open(csv_path, "rb") as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    return None
+
+
+def save_features(
+    df: pd.DataFrame,
+    store_dir: Optional[str | Path],
+    csv_path: Optional[str | Path] = None,
+    clinic: str = DEFAULT_CLINIC,
+    table: str = FEATURES_TABLE,
+) -> str:
+    """Persist rows of ``table``, preferring Parquet. Returns where they went."""
+    if store_dir and parquet_available():
+        store = FeatureStore(store_dir, table)
+        store.write(df, clinic=clinic)
+        return str(store.path)
+    if not csv_path:
+        raise RuntimeError("pyarrow não está instalado e nenhum CSV foi configurado")
+    df.to_csv(csv_path, index=False)
+    return str(csv_path)
+
+
+__all__: List[str] = [
+    "DEFAULT_CLINIC",
+    "DETAILS_TABLE",
+    "FEATURES_TABLE",
+    "FEATURE_DTYPES",
+    "PENDENCIES_TABLE",
+    "FeatureStore",
+    "apply_filters",
+    "count_features",
+    "load_features",
+    "parquet_available",
+    "save_features",
+]
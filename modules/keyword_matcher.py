@@ -0,0 +1,231 @@
+"""Multi-keyword matcher counting every keyword family in one pass.
+
+All keywords of all families are merged into one automaton and the text
+is scanned once, instead of one ``str.count``/``in`` per keyword.  Every
+occurrence is reported, including keywords nested in longer ones
+(``"agenda"`` inside ``"agendar"``).  Like ``str.count``, occurrences of
+the same keyword do not overlap (``"aa"`` is found twice in ``"aaaa"``).
+
+When `pyahocorasick <https://pypi.org/project/pyahocorasick/>`_ is
+installed its C Aho-Corasick automaton is used.  Otherwise the keywords
+are compiled into a trie-shaped regular expression: at each start
+position the longest keyword is matched, the shorter keywords that are
+its prefixes are credited from a precomputed output table and the scan
+resumes at the next position.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from functools import lru_cache
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+try:  # Optional C implementation of the Aho-Corasick automaton
+    import ahocorasick
+except ImportError:  # pragma: no cover - depends on the environment
+    ahocorasick = None
+
+
+def _build_fold_table() -> Dict[int, str]:
+    table = {}
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        base = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        if len(base) == 1 and base != char:
+            table[code] = base
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+_WORD_CHAR = re.compile(r"\w")
+
+
+def fold_accents(text: str) -> str:
+    """Remove Latin diacritics (``"horário"`` -> ``"horario"``)."""
+    return text.translate(_FOLD_TABLE)
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional group: longer keywords are tried first
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordAutomaton:
+    """Count keyword families over a text in a single scan.
+
+    Parameters
+    ----------
+    families:
+        Mapping of family name (e.g. ``"agendamento"``) to its keywords.
+        Matching is case-insensitive.
+    word_boundary:
+        Only count keywords that are whole words (``"valor"`` does not
+        match inside ``"valores"``).
+    fold_accents:
+        Ignore diacritics on both keywords and text.
+    backend:
+        ``"ahocorasick"``, ``"regex"`` or ``"auto"`` (the former when
+        available).
+    """
+
+    def __init__(
+        self,
+        families: Mapping[str, Iterable[str]],
+        word_boundary: bool = False,
+        fold_accents: bool = False,
+        backend: str = "auto",
+    ) -> None:
+        if backend == "auto":
+            backend = "ahocorasick" if ahocorasick is not None else "regex"
+        if backend not in ("ahocorasick", "regex"):
+            raise ValueError(f"backend desconhecido: {backend!r}")
+        if backend == "ahocorasick" and ahocorasick is None:
+            raise ImportError("pyahocorasick não está instalado")
+
+        self.backend = backend
+        self.word_boundary = word_boundary
+        self.fold_accents = fold_accents
+        self.families: Dict[str, Tuple[str, ...]] = {}
+        self._keyword_families: Dict[str, List[str]] = {}
+
+        for family, keywords in families.items():
+            normalized = tuple(dict.fromkeys(k for k in (self.normalize(k.strip()) for k in keywords) if k))
+            self.families[family] = normalized
+            for keyword in normalized:
+                self._keyword_families.setdefault(keyword, []).append(family)
+
+        keywords = list(self._keyword_families)
+        self._outputs = {keyword: self._prefix_outputs(keyword) for keyword in keywords}
+
+        self._automaton = None
+        self._pattern = None
+        if not keywords:
+            return
+
+        if backend == "ahocorasick":
+            self._automaton = ahocorasick.Automaton()
+            for keyword in keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+            return
+
+        body = _trie_regex(keywords)
+        # No leading lookaround: lets the regex engine skip ahead using the
+        # set of first characters, so only candidate positions are examined
+        self._pattern = re.compile(rf"{body}(?!\w)" if word_boundary else body)
+
+    @classmethod
+    def from_settings(cls, settings: Mapping, **options) -> "KeywordAutomaton":
+        """Return the (cached) automaton for ``AGENDAMENTO_KEYWORDS``/``PRECO_KEYWORDS``."""
+        return get_keyword_automaton(
+            {
+                "agendamento": settings.get("AGENDAMENTO_KEYWORDS", []),
+                "preco": settings.get("PRECO_KEYWORDS", []),
+            },
+            **options,
+        )
+
+    def normalize(self, text: str) -> str:
+        """Apply the automaton's case and accent normalization."""
+        text = text.lower()
+        return fold_accents(text) if self.fold_accents else text
+
+    def _prefix_outputs(self, keyword: str) -> Tuple[str, ...]:
+        """Keywords also matched whenever ``keyword`` is the longest match."""
+        outputs = []
+        for end in range(1, len(keyword) + 1):
+            prefix = keyword[:end]
+            if prefix not in self._keyword_families:
+                continue
+            if self.word_boundary and end < len(keyword) and _WORD_CHAR.match(keyword, end):
+                continue
+            outputs.append(prefix)
+        return tuple(outputs)
+
+    def keyword_counts(self, text: str) -> Counter:
+        """Return occurrences of every keyword found in ``text``."""
+        counts: Counter = Counter()
+        if not text or (self._pattern is None and self._automaton is None):
+            return counts
+        text = self.normalize(text)
+
+        # Earliest start of the next countable occurrence of each keyword,
+        # so repeated hits of one keyword never overlap (as ``str.count``)
+        next_start: Dict[str, int] = {}
+
+        if self._automaton is not None:
+            for end, keyword in self._automaton.iter(text):
+                start = end - len(keyword) + 1
+                if start < next_start.get(keyword, 0):
+                    continue
+                if self.word_boundary and (
+                    (start and _WORD_CHAR.match(text, start - 1)) or _WORD_CHAR.match(text, end + 1)
+                ):
+                    continue
+                counts[keyword] += 1
+                next_start[keyword] = end + 1
+            return counts
+
+        search = self._pattern.search
+        match = search(text)
+        while match is not None:
+            start = match.start()
+            if not (self.word_boundary and start and _WORD_CHAR.match(text, start - 1)):
+                for output in self._outputs[match.group()]:
+                    if start >= next_start.get(output, 0):
+                        counts[output] += 1
+                        next_start[output] = start + len(output)
+            # Resume right after the match start so overlapping keywords
+            # starting inside this one are still found
+            match = search(text, start + 1)
+        return counts
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Total keyword occurrences per family."""
+        totals = dict.fromkeys(self.families, 0)
+        for keyword, occurrences in self.keyword_counts(text).items():
+            for family in self._keyword_families[keyword]:
+                totals[family] += occurrences
+        return totals
+
+    def distinct(self, text: str) -> Dict[str, int]:
+        """Number of different keywords present per family."""
+        totals = dict.fromkeys(self.families, 0)
+        for keyword in self.keyword_counts(text):
+            for family in self._keyword_families[keyword]:
+                totals[family] += 1
+        return totals
+
+
+@lru_cache(maxsize=32)
+def _cached_automaton(families: Tuple[Tuple[str, Tuple[str, ...]], ...], word_boundary: bool, fold: bool) -> KeywordAutomaton:
+    return KeywordAutomaton(dict(families), word_boundary=word_boundary, fold_accents=fold)
+
+
+def get_keyword_automaton(
+    families: Mapping[str, Iterable[str]],
+    word_boundary: bool = False,
+    fold_accents: bool = False,
+) -> KeywordAutomaton:
+    """Return a shared automaton, rebuilt only when the keyword lists change."""
+    key = tuple((family, tuple(keywords)) for family, keywords in families.items())
+    return _cached_automaton(key, word_boundary, fold_accents)
+
+
+__all__ = ["KeywordAutomaton", "fold_accents", "get_keyword_automaton"]
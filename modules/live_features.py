@@ -0,0 +1,169 @@
+"""Conversation features kept up to date from the messages database.
+
+:func:`~modules.extract_features.extract_features` computes a
+conversation's features from a whole ``_chat.txt`` export.  Messages
+that arrive through Layer 1/2 are instead folded into running
+aggregates, one message at a time: every feature except the duration is
+a sum over messages, and the interaction count (sender changes) only
+needs the previous sender.  :class:`SWAILiteManager` applies
+:func:`fold_messages` to the ``conversation_features`` row of a
+conversation in the same transaction that links new messages to it, so
+the row is always current without rereading the conversation.
+
+The counting rules are those of the export path: a message is from the
+secretary when its ``sender_type`` is ``"secretary"`` (anything else is
+the lead/patient, as in Layer 2), keywords are counted per family from
+the ``AGENDAMENTO_KEYWORDS``/``PRECO_KEYWORDS`` lists of the settings
+(:data:`~modules.constants.KEYWORD_SETTINGS` by default), a question is a
+message containing ``?`` and interactions are counted between distinct
+``sender_phone`` values in timestamp order.  A message older than the
+last one folded cannot be placed in that order incrementally; the
+caller recounts interactions for its conversation (see
+:func:`fold_messages`).
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from modules.constants import KEYWORD_FAMILIES, KEYWORD_SETTINGS
+from modules.keyword_matcher import KeywordAutomaton
+
+
+def keyword_matcher(settings: Optional[Mapping[str, Any]] = None) -> KeywordAutomaton:
+    """Matcher for the keyword lists of ``settings``, as the batch extractors use."""
+    return KeywordAutomaton.from_settings(settings or KEYWORD_SETTINGS)
+
+
+KEYWORD_MATCHER = keyword_matcher()
+MEDIA_PATTERN = re.compile("áudio ocultado|imagem ocultada|vídeo ocultado", re.IGNORECASE)
+
+SECRETARY = "secretary"
+LIVE_CHAT_TYPE = "live"
+
+# Running sums stored per conversation, named as in ``extract_features``
+COUNTER_COLUMNS: Tuple[str, ...] = (
+    "total_messages",
+    "secretary_messages",
+    "patient_messages",
+    "num_interactions",
+    *(f"{family}_keywords" for family in KEYWORD_FAMILIES),
+    "audio_media_messages",
+    "patient_questions",
+    "secretary_questions",
+)
+STATE_COLUMNS: Tuple[str, ...] = COUNTER_COLUMNS + ("first_timestamp", "last_timestamp", "last_sender")
+
+# ``(sender_phone, sender_type, content, timestamp)`` of a stored message
+MessageRow = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+def empty_state(conversation_id: str) -> Dict[str, Any]:
+    """Aggregates of a conversation without messages."""
+    state: Dict[str, Any] = dict.fromkeys(COUNTER_COLUMNS, 0)
+    state.update(conversation_id=conversation_id, first_timestamp=None, last_timestamp=None, last_sender=None)
+    return state
+
+
+def message_counts(
+    sender_type: Optional[str],
+    content: Optional[str],
+    matcher: Optional[KeywordAutomaton] = None,
+) -> Dict[str, int]:
+    """Contribution of one message to every counter but ``num_interactions``."""
+    content = content or ""
+    secretary = sender_type == SECRETARY
+    question = "?" in content
+    counts = {
+        "total_messages": 1,
+        "secretary_messages": int(secretary),
+        "patient_messages": int(not secretary),
+        "audio_media_messages": int(MEDIA_PATTERN.search(content) is not None),
+        "patient_questions": int(question and not secretary),
+        "secretary_questions": int(question and secretary),
+    }
+    for family, occurrences in (matcher or KEYWORD_MATCHER).count(content).items():
+        counts[f"{family}_keywords"] = occurrences
+    return counts
+
+
+def fold_messages(
+    state: Dict[str, Any],
+    messages: Iterable[MessageRow],
+    settings: Optional[Mapping[str, Any]] = None,
+) -> bool:
+    """Add new messages of one conversation to its aggregates, in place.
+
+    ``messages`` should come in timestamp order; keywords are counted
+    with the lists of ``settings`` (see :func:`keyword_matcher`).
+    Returns ``True`` when a message is older than one already folded:
+    every counter is still right, but ``num_interactions`` and
+    ``last_sender`` must then be recounted over the whole conversation.
+    """
+    out_of_order = False
+    matcher = keyword_matcher(settings)
+    for sender_phone, sender_type, content, timestamp in messages:
+        for column, value in message_counts(sender_type, content, matcher).items():
+            state[column] += value
+
+        if timestamp is None:
+            continue
+        first, last = state["first_timestamp"], state["last_timestamp"]
+        state["first_timestamp"] = timestamp if first is None else min(first, timestamp)
+        if last is not None and timestamp < last:
+            out_of_order = True
+            continue
+        if last is None or sender_phone != state["last_sender"]:
+            state["num_interactions"] += 1
+        state["last_sender"] = sender_phone
+        state["last_timestamp"] = timestamp
+    return out_of_order
+
+
+def count_interactions(senders: Sequence[Optional[str]]) -> int:
+    """Sender changes in a conversation, counting its first message."""
+    return sum(1 for index, sender in enumerate(senders) if index == 0 or sender != senders[index - 1])
+
+
+def features_frame(rows: Iterable[Mapping[str, Any]]) -> pd.DataFrame:
+    """Feature rows shaped like ``extract_features`` output.
+
+    ``chat_name`` is the conversation id and ``chat_type`` is
+    :data:`LIVE_CHAT_TYPE`, since the outcome of a live conversation is
+    not known yet.
+    """
+    columns = ["chat_name", "chat_type", "start_time", "duration_minutes", *COUNTER_COLUMNS]
+    df = pd.DataFrame(list(rows))
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    first = pd.to_datetime(df["first_timestamp"], utc=True, errors="coerce", format="ISO8601")
+    last = pd.to_datetime(df["last_timestamp"], utc=True, errors="coerce", format="ISO8601")
+    df["chat_name"] = df["conversation_id"]
+    df["chat_type"] = LIVE_CHAT_TYPE
+    df["start_time"] = df["first_timestamp"]
+    df["duration_minutes"] = ((last - first).dt.total_seconds() / 60).fillna(0.0)
+    return df[columns]
+
+
+def load_live_features(manager: Any, conversation_ids: Optional[List[str]] = None) -> pd.DataFrame:
+    """Current features of stored conversations, for the dashboard."""
+    return features_frame(manager.get_conversation_features(conversation_ids))
+
+
+__all__ = [
+    "COUNTER_COLUMNS",
+    "KEYWORD_MATCHER",
+    "LIVE_CHAT_TYPE",
+    "MEDIA_PATTERN",
+    "STATE_COLUMNS",
+    "count_interactions",
+    "empty_state",
+    "features_frame",
+    "fold_messages",
+    "keyword_matcher",
+    "load_live_features",
+    "message_counts",
+]
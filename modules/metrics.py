@@ -0,0 +1,136 @@
+"""Per-``chat_type`` aggregates behind the dashboard metrics.
+
+``SWAIAnalyzer.calculate_basic_metrics`` and the legacy
+``modules.utils`` helpers report counts, rates and means of conversation
+features overall and per outcome (``success``/``fail``).  All of them
+are derived from one table of totals per ``chat_type``: the number of
+conversations and, for every metric in :data:`METRIC_COLUMNS`, the
+count of non-null values and their sum.  :func:`chat_type_totals`
+computes that table from a features DataFrame in a single
+``groupby().agg()`` pass; :class:`~modules.rollups.RollupStore` returns
+the same table from its materialized rollups, and
+:func:`metrics_from_totals` turns either into the metrics dictionary.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, Mapping, Sequence, Tuple
+
+import pandas as pd
+
+
+METRIC_COLUMNS: Tuple[str, ...] = (
+    "duration_minutes",
+    "total_messages",
+    "secretary_messages",
+    "patient_messages",
+    "num_interactions",
+    "agendamento_keywords",
+    "preco_keywords",
+)
+
+# Averages reported per chat type by ``calculate_basic_metrics``
+TYPE_AVERAGES = {
+    "avg_duration": "duration_minutes",
+    "avg_messages": "total_messages",
+    "avg_secretary_messages": "secretary_messages",
+    "avg_patient_messages": "patient_messages",
+    "avg_interactions": "num_interactions",
+    "avg_agendamento_keywords": "agendamento_keywords",
+    "avg_preco_keywords": "preco_keywords",
+}
+SUMMARY_AVERAGES = ("avg_duration", "avg_messages", "avg_secretary_messages", "avg_patient_messages")
+
+
+def chat_type_totals(df: pd.DataFrame, metrics: Sequence[str] = METRIC_COLUMNS) -> pd.DataFrame:
+    """Totals per ``chat_type``: ``conversations``, ``<metric>_n`` and ``<metric>_sum``.
+
+    One ``groupby`` over the metric columns; non-numeric values count as
+    null and a metric missing from ``df`` has no values.  Rows without a
+    ``chat_type`` form their own group, so they still count overall.
+    """
+    columns = [metric for metric in metrics if metric in df.columns]
+    values = df[columns]
+    coerce = [
+        column for column in columns
+        if not pd.api.types.is_numeric_dtype(values[column]) or pd.api.types.is_bool_dtype(values[column])
+    ]
+    if coerce:
+        values = values.assign(**{column: pd.to_numeric(values[column], errors="coerce") for column in coerce})
+
+    grouped = values.groupby(df["chat_type"], dropna=False, observed=True, sort=False)
+    size = grouped.size()
+    counts = grouped.agg("count") if columns else None
+    sums = grouped.agg("sum") if columns else None
+    data = {"conversations": size.to_numpy()}
+    for metric in metrics:
+        present = metric in columns
+        data[f"{metric}_n"] = counts[metric].to_numpy() if present else 0
+        data[f"{metric}_sum"] = sums[metric].to_numpy(dtype=float) if present else 0.0
+    return pd.DataFrame(data, index=size.index.rename("chat_type"))
+
+
+def _mean(total: float, count: float) -> float:
+    return total / count if count else math.nan
+
+
+def averages(row: Mapping[str, float], names: Iterable[str]) -> Dict[str, float]:
+    """Named averages (keys of :data:`TYPE_AVERAGES`) of one totals row."""
+    return {name: _mean(row[f"{TYPE_AVERAGES[name]}_sum"], row[f"{TYPE_AVERAGES[name]}_n"]) for name in names}
+
+
+def type_rows(totals: pd.DataFrame) -> Tuple[Dict, Dict[str, float]]:
+    """Totals as plain dicts: one per ``chat_type`` and one for all rows."""
+    matrix = totals.to_numpy(dtype=float)
+    rows = {chat_type: dict(zip(totals.columns, row)) for chat_type, row in zip(totals.index, matrix)}
+    return rows, dict(zip(totals.columns, matrix.sum(axis=0)))
+
+
+def type_count(rows: Mapping[object, Mapping[str, float]], chat_type: str) -> int:
+    """Conversations of one ``chat_type`` in :func:`type_rows` output."""
+    return int(rows[chat_type]["conversations"]) if chat_type in rows else 0
+
+
+def metrics_from_totals(totals: pd.DataFrame) -> Dict:
+    """``calculate_basic_metrics`` dictionary from per-``chat_type`` totals.
+
+    ``totals`` is indexed by ``chat_type`` with the ``conversations`` and
+    ``<metric>_n``/``<metric>_sum`` columns of :func:`chat_type_totals`.
+    """
+    if totals.empty or totals["conversations"].sum() == 0:
+        return {}
+    rows, overall = type_rows(totals)
+    success_count = type_count(rows, "success")
+    fail_count = type_count(rows, "fail")
+    total_conversations = int(overall["conversations"])
+
+    by_type = {
+        chat_type: averages(rows[chat_type], TYPE_AVERAGES) if count > 0 else {}
+        for chat_type, count in (("success", success_count), ("fail", fail_count))
+    }
+
+    return {
+        "summary": {
+            "total_conversations": total_conversations,
+            "success_count": success_count,
+            "fail_count": fail_count,
+            "success_rate": success_count / total_conversations,
+            "failure_rate": fail_count / total_conversations,
+            **averages(overall, SUMMARY_AVERAGES),
+        },
+        "success_metrics": by_type["success"],
+        "fail_metrics": by_type["fail"],
+    }
+
+
+__all__ = [
+    "METRIC_COLUMNS",
+    "SUMMARY_AVERAGES",
+    "TYPE_AVERAGES",
+    "averages",
+    "chat_type_totals",
+    "metrics_from_totals",
+    "type_count",
+    "type_rows",
+]
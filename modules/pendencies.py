@@ -0,0 +1,121 @@
+"""Vectorized pendency detection over a chat's message column.
+
+Every category's patterns are compiled into a single expression with one
+named group per category, each wrapped in an optional lookahead, so a
+single ``Series.str.extract`` call tells which categories each message
+mentions.  The result is a typed table with one row per
+``(message, category)`` hit, in message order and then category order.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+import re
+from typing import Iterable, List, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.constants import SECRETARY_SENDERS
+
+
+# Padrões para detectar pendências, por categoria
+PENDENCY_PATTERNS = {
+    'agendamento': [
+        r'vou agendar',
+        r'podemos agendar',
+        r'disponibilidade para',
+        r'marcar para'
+    ],
+    'informacao': [
+        r'vou te passar',
+        r'preciso que',
+        r'me passa',
+        r'pode me enviar',
+        r'preciso de',
+        r'vou te explicar'
+    ],
+    'exame': [
+        r'solicitar exames',
+        r'pedidos de exames',
+        r'levar exames',
+        r'bioimpedância'
+    ],
+    'pagamento': [
+        r'pagamento',
+        r'valor',
+        r'pix',
+        r'cartão'
+    ]
+}
+
+DESCRIPTION_LIMIT = 100
+
+
+@lru_cache(maxsize=8)
+def _compile(categories: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> re.Pattern:
+    parts = []
+    for category, patterns in categories:
+        if not category.isidentifier():
+            raise ValueError(f"categoria de pendência inválida: {category!r}")
+        parts.append(rf"(?:(?=.*?(?P<{category}>{'|'.join(patterns)})))?")
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def compile_pendency_pattern(patterns: Mapping[str, Iterable[str]] = PENDENCY_PATTERNS) -> re.Pattern:
+    """Return the combined named-group expression for ``patterns``."""
+    return _compile(tuple((category, tuple(items)) for category, items in patterns.items()))
+
+
+def _empty_table(categories: List[str]) -> pd.DataFrame:
+    return pd.DataFrame({
+        'message_index': pd.Series(dtype='int64'),
+        'descricao': pd.Series(dtype='object'),
+        'responsavel': pd.Categorical([], categories=['secretaria', 'paciente']),
+        'tipo': pd.Categorical([], categories=categories),
+        'status': pd.Categorical([], categories=['pendente']),
+    })
+
+
+def extract_pendency_table(
+    chat_df: pd.DataFrame,
+    patterns: Mapping[str, Iterable[str]] = PENDENCY_PATTERNS,
+    secretary_senders: Iterable[str] = SECRETARY_SENDERS,
+) -> pd.DataFrame:
+    """Return one row per message and pendency category it matches.
+
+    Columns are ``message_index`` (position in ``chat_df``), ``descricao``
+    (message truncated to 100 characters), and the categoricals
+    ``responsavel``, ``tipo`` and ``status``.
+    """
+    categories = list(patterns)
+    if chat_df.empty:
+        return _empty_table(categories)
+
+    messages = chat_df['message'].astype(object)
+    hits = messages.str.lower().str.extract(compile_pendency_pattern(patterns)).notna()
+    rows, cols = np.nonzero(hits[categories].to_numpy())
+    if not len(rows):
+        return _empty_table(categories)
+
+    matched = messages.iloc[rows]
+    truncated = matched.str.slice(0, DESCRIPTION_LIMIT) + '...'
+    descricao = np.where(matched.str.len() > DESCRIPTION_LIMIT, truncated, matched)
+    is_secretary = chat_df['sender'].isin(list(secretary_senders)).to_numpy()[rows]
+
+    return pd.DataFrame({
+        'message_index': rows.astype('int64'),
+        'descricao': descricao,
+        'responsavel': pd.Categorical(
+            np.where(is_secretary, 'secretaria', 'paciente'), categories=['secretaria', 'paciente']
+        ),
+        'tipo': pd.Categorical.from_codes(cols, categories=categories),
+        'status': pd.Categorical(['pendente'] * len(rows), categories=['pendente']),
+    })
+
+
+__all__ = [
+    "PENDENCY_PATTERNS",
+    "compile_pendency_pattern",
+    "extract_pendency_table",
+]
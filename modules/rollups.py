@@ -0,0 +1,378 @@
+"""Materialized daily and weekly rollups of conversation features.
+
+Dashboard KPIs (:meth:`SWAIAnalyzer.calculate_basic_metrics`) are counts,
+rates and means over every conversation, so recomputing them scans the
+whole history on each page load.  :class:`RollupStore` keeps, in SQLite,
+one row per ``(day, secretary, chat_type)`` and per ``(week, secretary,
+chat_type)`` holding the number of conversations and, for every metric
+in :data:`ROLLUP_METRICS`, the count of non-null values, their sum and
+their sum of squares.  Those add up, so the metrics of any date range
+are a merge of at most two partial weeks of daily rows plus one row per
+whole week, whatever the number of conversations.
+
+Updates are incremental.  The store remembers what each conversation
+(``member``) contributed; :meth:`RollupStore.apply` adds new
+conversations, replaces changed ones by subtracting their old
+contribution, and skips unchanged rows, and :meth:`RollupStore.sync`
+also retracts conversations that disappeared from the input.
+
+A conversation's day is the date of its ``start_time`` in its own
+offset; conversations without one are counted only in all-time queries.
+The secretary is the ``secretary_name`` column when present.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from pathlib import Path
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.metrics import METRIC_COLUMNS, metrics_from_totals
+
+
+ROLLUP_METRICS: Tuple[str, ...] = METRIC_COLUMNS
+DEFAULT_KEY_COLUMNS: Tuple[str, ...] = ("chat_type", "chat_name")
+SECRETARY_COLUMN = "secretary_name"
+UNKNOWN = ""
+
+_TABLES = {"day": "rollup_daily", "week": "rollup_weekly"}
+_DIMENSIONS = ("secretary", "chat_type")
+_AGGREGATES = ("conversations",) + tuple(
+    f"{metric}_{suffix}" for metric in ROLLUP_METRICS for suffix in ("n", "sum", "sumsq")
+)
+
+
+def _create_sql() -> str:
+    aggregates = ",\n    ".join(
+        f"{name} {'INTEGER' if name == 'conversations' or name.endswith('_n') else 'REAL'} NOT NULL DEFAULT 0"
+        for name in _AGGREGATES
+    )
+    metrics = ",\n    ".join(f"{metric} REAL" for metric in ROLLUP_METRICS)
+    tables = [
+        f"""
+        CREATE TABLE IF NOT EXISTS rollup_members (
+            member_key TEXT PRIMARY KEY,
+            day TEXT NOT NULL,
+            week TEXT NOT NULL,
+            secretary TEXT NOT NULL,
+            chat_type TEXT NOT NULL,
+            {metrics}
+        )
+        """
+    ]
+    for grain in ("day", "week"):
+        tables.append(
+            f"""
+            CREATE TABLE IF NOT EXISTS {_TABLES[grain]} (
+                {grain} TEXT NOT NULL,
+                secretary TEXT NOT NULL,
+                chat_type TEXT NOT NULL,
+                {aggregates},
+                PRIMARY KEY ({grain}, secretary, chat_type)
+            )
+            """
+        )
+    return ";".join(tables)
+
+
+def _merge_sql(grain: str) -> str:
+    columns = (grain,) + _DIMENSIONS + _AGGREGATES
+    updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in _AGGREGATES)
+    return (
+        f"INSERT INTO {_TABLES[grain]} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT ({grain}, secretary, chat_type) DO UPDATE SET {updates}"
+    )
+
+
+_MEMBER_COLUMNS = ("member_key", "day", "week") + _DIMENSIONS + ROLLUP_METRICS
+
+
+def _days(start_time: pd.Series) -> pd.Series:
+    """``AAAA-MM-DD`` of each start time, in its own offset ('' if unknown)."""
+    if pd.api.types.is_datetime64_any_dtype(start_time):
+        days = start_time.dt.strftime("%Y-%m-%d")
+    else:
+        days = start_time.map(lambda value: value if isinstance(value, str) else None).str[:10]
+    valid = pd.to_datetime(days, format="%Y-%m-%d", errors="coerce")
+    return days.where(valid.notna(), UNKNOWN)
+
+
+def _weeks(days: pd.Series) -> pd.Series:
+    """Monday of each day's ISO week ('' if unknown)."""
+    moments = pd.to_datetime(days, format="%Y-%m-%d", errors="coerce")
+    weeks = (moments - pd.to_timedelta(moments.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d")
+    return weeks.fillna(UNKNOWN)
+
+
+def member_frame(df: pd.DataFrame, key_columns: Sequence[str] = DEFAULT_KEY_COLUMNS) -> pd.DataFrame:
+    """One row per conversation with its rollup keys and metric values.
+
+    Rows sharing a key keep the last one.  Missing metric columns count
+    as null values.
+    """
+    missing = [column for column in key_columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"colunas de chave ausentes: {', '.join(missing)}")
+
+    key = None
+    for column in key_columns:
+        part = df[column].astype(object).where(df[column].notna(), "").map(str)
+        key = part if key is None else key + "\x1f" + part
+    members = pd.DataFrame({"member_key": key}, index=df.index)
+    start_time = df["start_time"] if "start_time" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    members["day"] = _days(start_time)
+    members["week"] = _weeks(members["day"])
+    secretary = df[SECRETARY_COLUMN] if SECRETARY_COLUMN in df.columns else pd.Series(None, index=df.index)
+    members["secretary"] = secretary.astype(object).where(secretary.notna(), UNKNOWN).map(str)
+    members["chat_type"] = df["chat_type"].astype(object).where(df["chat_type"].notna(), UNKNOWN).map(str)
+    for metric in ROLLUP_METRICS:
+        values = df[metric] if metric in df.columns else pd.Series(np.nan, index=df.index)
+        members[metric] = pd.to_numeric(values, errors="coerce").astype(float)
+    return members.drop_duplicates("member_key", keep="last").reset_index(drop=True)
+
+
+def _contributions(members: pd.DataFrame, sign: int) -> pd.DataFrame:
+    """Signed aggregate columns of each member row."""
+    parts = {"conversations": np.full(len(members), sign, dtype=np.int64)}
+    for metric in ROLLUP_METRICS:
+        values = members[metric].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        parts[f"{metric}_n"] = sign * present.astype(np.int64)
+        parts[f"{metric}_sum"] = sign * filled
+        parts[f"{metric}_sumsq"] = sign * filled * filled
+    return pd.concat([members[["day", "week", *_DIMENSIONS]].reset_index(drop=True), pd.DataFrame(parts)], axis=1)
+
+
+def _same(new: pd.DataFrame, old: pd.DataFrame) -> np.ndarray:
+    """Row-wise equality of aligned member frames (nulls compare equal)."""
+    same = np.ones(len(new), dtype=bool)
+    for column in ("day", "week", *_DIMENSIONS):
+        same &= new[column].to_numpy() == old[column].to_numpy()
+    for metric in ROLLUP_METRICS:
+        a = new[metric].to_numpy(dtype=float)
+        b = old[metric].to_numpy(dtype=float)
+        same &= (a == b) | (np.isnan(a) & np.isnan(b))
+    return same
+
+
+class RollupStore:
+    """Daily/weekly feature rollups in a SQLite file.
+
+    Parameters
+    ----------
+    db_path:
+        SQLite file holding the rollup tables (created on first use).
+    key_columns:
+        Columns identifying a conversation across updates.
+    """
+
+    def __init__(self, db_path: str, key_columns: Sequence[str] = DEFAULT_KEY_COLUMNS) -> None:
+        self.db_path = str(db_path)
+        self.key_columns = tuple(key_columns)
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(_create_sql())
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "RollupStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def _stored_members(self, keys: Optional[List[str]] = None) -> pd.DataFrame:
+        if keys is None:
+            return pd.read_sql_query("SELECT * FROM rollup_members", self.conn)
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_keys (member_key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM rollup_keys")
+        self.conn.executemany("INSERT OR IGNORE INTO rollup_keys VALUES (?)", [(key,) for key in keys])
+        return pd.read_sql_query(
+            "SELECT m.* FROM rollup_members AS m JOIN rollup_keys USING (member_key)", self.conn
+        )
+
+    def _merge(self, delta: pd.DataFrame) -> None:
+        if delta.empty:
+            return
+        for grain in ("day", "week"):
+            grouped = delta.groupby([grain, *_DIMENSIONS], sort=False)[list(_AGGREGATES)].sum().reset_index()
+            counts = [name for name in _AGGREGATES if name == "conversations" or name.endswith("_n")]
+            grouped[counts] = grouped[counts].astype(int)
+            rows = grouped.astype(object).itertuples(index=False, name=None)
+            self.conn.executemany(_merge_sql(grain), rows)
+            self.conn.execute(f"DELETE FROM {_TABLES[grain]} WHERE conversations = 0")
+
+    def _write(self, added: pd.DataFrame, retracted: pd.DataFrame) -> None:
+        delta = pd.concat(
+            [_contributions(added, 1), _contributions(retracted, -1)], ignore_index=True
+        )
+        self._merge(delta)
+        if len(retracted):
+            self.conn.executemany(
+                "DELETE FROM rollup_members WHERE member_key = ?", [(key,) for key in retracted["member_key"]]
+            )
+        if len(added):
+            rows = added[list(_MEMBER_COLUMNS)].astype(object)
+            rows = rows.where(rows.notna(), None)
+            self.conn.executemany(
+                f"INSERT INTO rollup_members ({', '.join(_MEMBER_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_MEMBER_COLUMNS))})",
+                rows.itertuples(index=False, name=None),
+            )
+
+    def _apply(self, members: pd.DataFrame) -> Dict[str, int]:
+        # Runs inside the caller's transaction
+        stored = self._stored_members(members["member_key"].tolist()).set_index("member_key")
+        known = members["member_key"].isin(stored.index).to_numpy()
+        previous = stored.reindex(members.loc[known, "member_key"]).reset_index()
+        unchanged = np.zeros(len(members), dtype=bool)
+        unchanged[np.flatnonzero(known)] = _same(members[known].reset_index(drop=True), previous)
+        changed = known & ~unchanged
+        self._write(
+            members[~unchanged],
+            previous[~unchanged[known]] if len(previous) else previous,
+        )
+        return {"added": int((~known).sum()), "updated": int(changed.sum()), "unchanged": int(unchanged.sum())}
+
+    def _remove(self, keys: List[str]) -> int:
+        # Runs inside the caller's transaction
+        stored = self._stored_members(keys)
+        self._write(stored.iloc[0:0], stored)
+        return len(stored)
+
+    def apply(self, df: pd.DataFrame) -> Dict[str, int]:
+        """Add or update the conversations in ``df``.
+
+        Returns how many were ``added``, ``updated`` and ``unchanged``.
+        """
+        members = member_frame(df, self.key_columns)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self._apply(members)
+
+    def remove(self, keys: Iterable[str]) -> int:
+        """Retract conversations by member key; return how many were stored."""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self._remove(list(keys))
+
+    def sync(self, df: pd.DataFrame) -> Dict[str, int]:
+        """Make the store reflect exactly the conversations in ``df``.
+
+        Reading the stored keys, retracting the missing conversations and
+        applying ``df`` form one transaction.
+        """
+        members = member_frame(df, self.key_columns)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            stored = {key for (key,) in self.conn.execute("SELECT member_key FROM rollup_members")}
+            gone = sorted(stored - set(members["member_key"]))
+            removed = self._remove(gone) if gone else 0
+            counts = self._apply(members)
+        return {**counts, "removed": removed}
+
+    def rebuild(self, df: pd.DataFrame) -> Dict[str, int]:
+        """Drop every rollup and recompute from ``df``, in one transaction."""
+        members = member_frame(df, self.key_columns)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for table in ("rollup_members", "rollup_daily", "rollup_weekly"):
+                self.conn.execute(f"DELETE FROM {table}")
+            return self._apply(members)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def totals(
+        self,
+        start: Optional[str | date] = None,
+        end: Optional[str | date] = None,
+        secretary: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Aggregates per ``chat_type`` for days ``start``..``end`` (inclusive).
+
+        Whole weeks inside the range are read from the weekly rollup and
+        only the partial weeks at its edges from the daily one.  Without
+        ``start`` and ``end`` every conversation is included, also those
+        without a known day.
+        """
+        columns = ", ".join(("chat_type",) + _AGGREGATES)
+        if start is None and end is None:
+            parts = [("rollup_weekly", "1", [])]
+        else:
+            first = date.fromisoformat(str(start)[:10]) if start is not None else date.min
+            last = date.fromisoformat(str(end)[:10]) if end is not None else date.max
+            # Whole weeks: Monday on or after ``first`` to the Sunday on or before ``last``
+            monday = first + timedelta(days=-first.weekday() % 7)
+            sunday = last - timedelta(days=(last.weekday() + 1) % 7)
+            if monday + timedelta(days=6) <= sunday:
+                parts = [
+                    ("rollup_weekly", "week BETWEEN ? AND ?",
+                     [monday.isoformat(), (sunday - timedelta(days=6)).isoformat()]),
+                    ("rollup_daily", "((day >= ? AND day < ?) OR (day > ? AND day <= ?))",
+                     [first.isoformat(), monday.isoformat(), sunday.isoformat(), last.isoformat()]),
+                ]
+            else:
+                parts = [("rollup_daily", "day BETWEEN ? AND ?", [first.isoformat(), last.isoformat()])]
+
+        selects, params = [], []
+        for table, where, values in parts:
+            if secretary is not None:
+                where, values = f"{where} AND secretary = ?", [*values, secretary]
+            selects.append(f"SELECT {columns} FROM {table} WHERE {where}")
+            params.extend(values)
+        sums = ", ".join(f"SUM({name})" for name in _AGGREGATES)
+        rows = self.conn.execute(
+            f"SELECT chat_type, {sums} FROM ({' UNION ALL '.join(selects)}) GROUP BY chat_type", params
+        ).fetchall()
+        return pd.DataFrame.from_records(rows, columns=("chat_type",) + _AGGREGATES, index="chat_type")
+
+    def basic_metrics(
+        self,
+        start: Optional[str | date] = None,
+        end: Optional[str | date] = None,
+        secretary: Optional[str] = None,
+    ) -> Dict:
+        """:meth:`SWAIAnalyzer.calculate_basic_metrics` for a date range, from the rollups."""
+        return metrics_from_totals(self.totals(start, end, secretary))
+
+    def metric_stats(
+        self,
+        start: Optional[str | date] = None,
+        end: Optional[str | date] = None,
+        secretary: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Count, mean and sample standard deviation of each metric per ``chat_type``."""
+        totals = self.totals(start, end, secretary)
+        stats = {}
+        for metric in ROLLUP_METRICS:
+            n = totals[f"{metric}_n"].astype(float)
+            total = totals[f"{metric}_sum"].astype(float)
+            mean = total / n.where(n > 0)
+            variance = (totals[f"{metric}_sumsq"] - n * mean * mean) / (n - 1).where(n > 1)
+            stats[(metric, "count")] = n.astype(int)
+            stats[(metric, "mean")] = mean
+            stats[(metric, "std")] = np.sqrt(variance.clip(lower=0))
+        return pd.DataFrame(stats, index=totals.index)
+
+    def secretaries(self) -> List[str]:
+        """Secretaries with rolled-up conversations."""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT secretary FROM rollup_weekly ORDER BY 1")]
+
+
+__all__ = [
+    "DEFAULT_KEY_COLUMNS",
+    "ROLLUP_METRICS",
+    "RollupStore",
+    "member_frame",
+]
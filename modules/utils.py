@@ -1,32 +1,69 @@
 import pandas as pd
 import json
 import os
-from modules.constants import EXTRACTED_FEATURES_CSV, DETAILED_ANALYSIS_JSON, VALOR_MEDIO_CONSULTA, LEADS_DIARIOS
+from modules.constants import EXTRACTED_FEATURES_CSV, DETAILED_ANALYSIS_JSON, FEATURE_STORE_DIR, VALOR_MEDIO_CONSULTA, LEADS_DIARIOS
+from modules.feature_store import DETAILS_TABLE, PENDENCIES_TABLE, load_features
+from modules.metrics import SUMMARY_AVERAGES, averages, chat_type_totals, type_count, type_rows
 
-def load_data():
-    """Load extracted features data"""
-    try:
-        df = pd.read_csv(EXTRACTED_FEATURES_CSV)
-        return df
-    except FileNotFoundError:
-        return None
+def load_data(columns=None, filters=None):
+    """Load extracted features data (Parquet feature store, or the legacy CSV)"""
+    return load_features(FEATURE_STORE_DIR, EXTRACTED_FEATURES_CSV, columns=columns, filters=filters)
 
-def load_detailed_analysis():
-    """Load detailed analysis results"""
-    try:
-        with open(DETAILED_ANALYSIS_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except FileNotFoundError:
-        return None
+def load_detailed_analysis(filters=None):
+    """Load detailed analysis results
+
+    Rebuilds the per-conversation records (features, ``resumo_diario``,
+    ``pendencias`` and ``alinhamento``) from the feature store tables,
+    falling back to the legacy JSON file.
+    """
+    details = load_features(FEATURE_STORE_DIR, filters=filters, table=DETAILS_TABLE)
+    if details is None:
+        try:
+            with open(DETAILED_ANALYSIS_JSON, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data
+        except FileNotFoundError:
+            return None
+
+    features = load_features(FEATURE_STORE_DIR, filters=filters)
+    pendencies = load_features(FEATURE_STORE_DIR, filters=filters, table=PENDENCIES_TABLE)
+
+    records = {}
+    for row in features.drop(columns=['clinic', 'month'], errors='ignore').to_dict('records'):
+        alignment = {
+            'score_similaridade': row.pop('alignment_similarity', 0),
+            'score_cobertura': row.pop('alignment_coverage', 0),
+            'score_sequencia': row.pop('alignment_sequence', 0),
+            'score_geral': row.pop('alignment_overall', 0),
+        }
+        row['chat_type'] = str(row['chat_type'])
+        row['alinhamento'] = alignment
+        row['pendencias'] = []
+        records[(row.get('chat_name'), row['chat_type'])] = row
+
+    for row in details.to_dict('records'):
+        record = records.get((row['chat_name'], str(row['chat_type'])))
+        if record is not None:
+            record['resumo_diario'] = row['resumo_diario']
+            record['alinhamento']['detalhes'] = row['alignment_details']
+
+    if pendencies is not None:
+        pendency_columns = ['descricao', 'responsavel', 'tipo', 'status']
+        for row in pendencies.to_dict('records'):
+            record = records.get((row['chat_name'], str(row['chat_type'])))
+            if record is not None:
+                record['pendencias'].append({key: str(row[key]) for key in pendency_columns})
+
+    return list(records.values())
 
 def calculate_opportunity_cost(df, valor_consulta=VALOR_MEDIO_CONSULTA, leads_diarios=LEADS_DIARIOS):
     """Calculate opportunity cost based on conversion rates"""
     if df is None or df.empty:
         return None
     
-    success_count = df[df['chat_type'] == 'success'].shape[0]
-    fail_count = df[df['chat_type'] == 'fail'].shape[0]
+    rows, _ = type_rows(chat_type_totals(df, metrics=()))
+    success_count = type_count(rows, 'success')
+    fail_count = type_count(rows, 'fail')
     total_cases = success_count + fail_count
     
     if total_cases == 0:
@@ -65,28 +102,23 @@ def get_summary_stats(df):
     if df is None or df.empty:
         return None
     
+    rows, overall = type_rows(chat_type_totals(df))
     stats = {}
     
     # Basic stats
-    stats['total_conversations'] = len(df)
-    stats['success_conversations'] = len(df[df['chat_type'] == 'success'])
-    stats['fail_conversations'] = len(df[df['chat_type'] == 'fail'])
+    stats['total_conversations'] = int(overall['conversations'])
+    stats['success_conversations'] = type_count(rows, 'success')
+    stats['fail_conversations'] = type_count(rows, 'fail')
     
     # Average metrics
-    stats['avg_duration'] = df['duration_minutes'].mean()
-    stats['avg_messages'] = df['total_messages'].mean()
-    stats['avg_secretary_messages'] = df['secretary_messages'].mean()
-    stats['avg_patient_messages'] = df['patient_messages'].mean()
+    stats.update(averages(overall, SUMMARY_AVERAGES))
     
     # Success vs Fail comparison
-    success_df = df[df['chat_type'] == 'success']
-    fail_df = df[df['chat_type'] == 'fail']
-    
-    if not success_df.empty and not fail_df.empty:
-        stats['success_avg_duration'] = success_df['duration_minutes'].mean()
-        stats['fail_avg_duration'] = fail_df['duration_minutes'].mean()
-        stats['success_avg_messages'] = success_df['total_messages'].mean()
-        stats['fail_avg_messages'] = fail_df['total_messages'].mean()
+    if stats['success_conversations'] and stats['fail_conversations']:
+        for chat_type in ('success', 'fail'):
+            type_averages = averages(rows[chat_type], ('avg_duration', 'avg_messages'))
+            stats[f'{chat_type}_avg_duration'] = type_averages['avg_duration']
+            stats[f'{chat_type}_avg_messages'] = type_averages['avg_messages']
     
     return stats
 
@@ -0,0 +1,725 @@
+"""Dispatch of ``ready_for_ai`` conversations to a summarizer (Layer 3).
+
+Layer 2 flags a conversation ``ready_for_ai`` once it has enough
+messages, and keeps flagging it for every later message.
+:class:`Dispatcher` turns those flags into summarization work:
+
+* :meth:`Dispatcher.on_batch` (an ``IngestionService`` ``on_batch``
+  callback) enqueues every ready conversation.  Repeated triggers for a
+  conversation that is already waiting coalesce into one job; a trigger
+  arriving while it is being summarized, or after it was, queues it
+  again so the summary catches up with the new messages.
+* Worker threads claim jobs in batches and call the pluggable
+  ``summarize`` function, at most ``rate_limit`` calls per second.
+* A batch that raises, or a conversation missing from its result, is
+  retried with exponential backoff and marked ``failed`` after
+  ``max_attempts``.  A claimed job is leased for ``lease_seconds``; if its
+  worker dies, another worker picks it up after the lease expires.
+
+The queue itself lives in a backend: :class:`SQLiteDispatchBackend` (the
+default, a table in any SQLite file) or :class:`RedisDispatchBackend`,
+for the ``swaif_redis`` service of ``docker/services/redis_shared``, when
+several processes share the work.  ``redis`` is only needed for the
+latter.
+
+Usage::
+
+    backend = SQLiteDispatchBackend("data/databases/messages.db")
+    dispatcher = Dispatcher(backend, summarize_conversations, workers=2).start()
+    service = IngestionService(db_path, on_batch=dispatcher.on_batch)
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from integrations.database.sqlite_manager import check_sqlite_version
+
+try:  # optional: only the Redis backend needs it
+    import redis
+except ImportError:  # pragma: no cover - depends on the environment
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (PENDING, RUNNING, DONE, FAILED)
+
+# Host parameters per statement guaranteed by any SQLite build (see
+# ``integrations.database.sqlite_manager``)
+_MAX_VARIABLES = 999
+
+
+@dataclass(frozen=True)
+class DispatchJob:
+    """A conversation claimed for summarization.
+
+    ``attempts`` counts claims so far, this one included, and identifies
+    the claim: a worker whose lease expired cannot settle the job anymore.
+    """
+
+    conversation_id: str
+    attempts: int
+    enqueued_at: float
+
+
+Summarizer = Callable[[List[DispatchJob]], Optional[Mapping[str, Any]]]
+ResultCallback = Callable[[DispatchJob, Any], None]
+
+
+def _unique(conversation_ids: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(cid for cid in conversation_ids if cid))
+
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+class DispatchBackend:
+    """Storage for dispatch jobs; all methods must be thread-safe."""
+
+    def enqueue(self, conversation_ids: Iterable[str], now: Optional[float] = None) -> int:
+        """Trigger conversations; return how many became pending."""
+        raise NotImplementedError
+
+    def claim(self, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[DispatchJob]:
+        """Lease up to ``limit`` due jobs, oldest first."""
+        raise NotImplementedError
+
+    def complete(self, job: DispatchJob, now: Optional[float] = None) -> bool:
+        """Mark a job done (or pending again if it was re-triggered)."""
+        raise NotImplementedError
+
+    def retry(self, job: DispatchJob, available_at: float, error: str) -> bool:
+        """Return a job to the queue, due at ``available_at``."""
+        raise NotImplementedError
+
+    def fail(self, job: DispatchJob, error: str) -> bool:
+        """Give up on a job."""
+        raise NotImplementedError
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a conversation's job."""
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs per status."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS ai_dispatch_queue (
+    conversation_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    triggers INTEGER NOT NULL DEFAULT 1,
+    claimed_triggers INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ai_dispatch_due ON ai_dispatch_queue(status, available_at);
+"""
+
+# Column references on the right-hand side see the row before the update
+_ENQUEUE_SQL = """
+INSERT INTO ai_dispatch_queue (conversation_id, status, available_at, enqueued_at, updated_at)
+VALUES (?1, 'pending', ?2, ?2, ?2)
+ON CONFLICT(conversation_id) DO UPDATE SET
+    triggers = triggers + 1,
+    status = CASE WHEN status IN ('done', 'failed') THEN 'pending' ELSE status END,
+    attempts = CASE WHEN status IN ('done', 'failed') THEN 0 ELSE attempts END,
+    available_at = CASE WHEN status IN ('done', 'failed') THEN ?2 ELSE available_at END,
+    enqueued_at = CASE WHEN status IN ('done', 'failed') THEN ?2 ELSE enqueued_at END,
+    updated_at = ?2
+"""
+
+_CLAIM_SQL = """
+UPDATE ai_dispatch_queue
+SET status = 'running', attempts = attempts + 1, claimed_triggers = triggers,
+    lease_until = ?1, updated_at = ?2
+WHERE conversation_id IN (
+    SELECT conversation_id FROM ai_dispatch_queue
+    WHERE (status = 'pending' AND available_at <= ?2)
+       OR (status = 'running' AND lease_until <= ?2)
+    ORDER BY available_at
+    LIMIT ?3
+)
+RETURNING conversation_id, attempts, enqueued_at
+"""
+
+_COMPLETE_SQL = """
+UPDATE ai_dispatch_queue
+SET status = CASE WHEN triggers > claimed_triggers THEN 'pending' ELSE 'done' END,
+    attempts = CASE WHEN triggers > claimed_triggers THEN 0 ELSE attempts END,
+    available_at = ?3, lease_until = NULL, last_error = NULL, updated_at = ?3
+WHERE conversation_id = ?1 AND status = 'running' AND attempts = ?2
+"""
+
+_RETRY_SQL = """
+UPDATE ai_dispatch_queue
+SET status = 'pending', available_at = ?3, lease_until = NULL, last_error = ?4, updated_at = ?5
+WHERE conversation_id = ?1 AND status = 'running' AND attempts = ?2
+"""
+
+_FAIL_SQL = """
+UPDATE ai_dispatch_queue
+SET status = 'failed', lease_until = NULL, last_error = ?3, updated_at = ?4
+WHERE conversation_id = ?1 AND status = 'running' AND attempts = ?2
+"""
+
+
+class SQLiteDispatchBackend(DispatchBackend):
+    """Dispatch queue in the ``ai_dispatch_queue`` table of a SQLite file.
+
+    The table is created on first use, so it can share the messages
+    database or live in a file of its own.  Claims are a single
+    ``UPDATE ... RETURNING``, safe across threads and processes, so
+    SQLite 3.35 or newer is required.
+    """
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000) -> None:
+        check_sqlite_version()
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self.conn.executescript(_CREATE_SQL)
+
+    def _write(self, sql: str, rows: Sequence[Tuple[Any, ...]]) -> int:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed = sum(self.conn.execute(sql, row).rowcount for row in rows)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        return changed
+
+    def enqueue(self, conversation_ids: Iterable[str], now: Optional[float] = None) -> int:
+        ids = _unique(conversation_ids)
+        if not ids:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                waiting = 0
+                for start in range(0, len(ids), _MAX_VARIABLES):
+                    chunk = ids[start:start + _MAX_VARIABLES]
+                    waiting += self.conn.execute(
+                        "SELECT COUNT(*) FROM ai_dispatch_queue WHERE status IN ('pending', 'running') "
+                        f"AND conversation_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchone()[0]
+                self.conn.executemany(_ENQUEUE_SQL, [(cid, now) for cid in ids])
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        return len(ids) - waiting
+
+    def claim(self, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[DispatchJob]:
+        now = time.time() if now is None else now
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(_CLAIM_SQL, (now + lease_seconds, now, limit)).fetchall()
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        jobs = [DispatchJob(row["conversation_id"], row["attempts"], row["enqueued_at"]) for row in rows]
+        return sorted(jobs, key=lambda job: job.enqueued_at)
+
+    def complete(self, job: DispatchJob, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return self._write(_COMPLETE_SQL, [(job.conversation_id, job.attempts, now)]) > 0
+
+    def retry(self, job: DispatchJob, available_at: float, error: str) -> bool:
+        row = (job.conversation_id, job.attempts, available_at, error, time.time())
+        return self._write(_RETRY_SQL, [row]) > 0
+
+    def fail(self, job: DispatchJob, error: str) -> bool:
+        return self._write(_FAIL_SQL, [(job.conversation_id, job.attempts, error, time.time())]) > 0
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM ai_dispatch_queue WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM ai_dispatch_queue GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+class RedisDispatchBackend(DispatchBackend):
+    """Dispatch queue in Redis, shared by processes on several hosts.
+
+    Each job is a hash ``<prefix>:job:<conversation_id>``, the source of
+    truth for its state; due jobs are indexed in the sorted set
+    ``<prefix>:ready`` (score: due time), leased ones in
+    ``<prefix>:running`` (score: lease expiry) and finished ones in the
+    sets ``<prefix>:done`` and ``<prefix>:failed``, so :meth:`counts`
+    reports the current status of each job, as the SQLite backend does.  Every state change reads
+    the hash under ``WATCH`` and writes the hash and both indexes in one
+    ``MULTI``/``EXEC``, retried when another client touched the job in
+    between: a trigger racing a completion is never lost, and a worker
+    whose lease was taken over cannot settle the job.  ``client`` is a
+    ``redis.Redis`` created with ``decode_responses=True`` (see
+    :meth:`from_env`).
+    """
+
+    def __init__(self, client: Any, prefix: str = "swai:ai_dispatch") -> None:
+        self.client = client
+        self.prefix = prefix
+        self._ready = f"{prefix}:ready"
+        self._running = f"{prefix}:running"
+        self._finished = {DONE: f"{prefix}:done", FAILED: f"{prefix}:failed"}
+
+    @classmethod
+    def from_env(cls, prefix: str = "swai:ai_dispatch") -> "RedisDispatchBackend":
+        """Connect with ``REDIS_URL`` or ``REDIS_HOST``/``REDIS_PORT``/``REDIS_PASSWORD``."""
+        if redis is None:
+            raise RuntimeError("redis não está instalado")
+        url = os.environ.get("REDIS_URL")
+        if url:
+            client = redis.Redis.from_url(url, decode_responses=True)
+        else:
+            client = redis.Redis(
+                host=os.environ.get("REDIS_HOST", "localhost"),
+                port=int(os.environ.get("REDIS_PORT", 6379)),
+                password=os.environ.get("REDIS_PASSWORD") or None,
+                decode_responses=True,
+            )
+        return cls(client, prefix)
+
+    def _key(self, conversation_id: str) -> str:
+        return f"{self.prefix}:job:{conversation_id}"
+
+    def _atomic(self, conversation_id: str, update: Callable[[Any, Dict[str, str]], Any]) -> Any:
+        """Run ``update(pipe, state)`` as one transaction on a job.
+
+        ``state`` is the job hash read under ``WATCH``; ``update`` queues
+        its writes on ``pipe`` (already in ``MULTI``) and returns the
+        result.  The whole step is retried if the hash changed before
+        ``EXEC``.
+        """
+        key = self._key(conversation_id)
+
+        def transaction(pipe: Any) -> Any:
+            state = pipe.hgetall(key)
+            pipe.multi()
+            return update(pipe, state)
+
+        return self.client.transaction(transaction, key, value_from_callable=True)
+
+    @staticmethod
+    def _owns(state: Mapping[str, str], job: DispatchJob) -> bool:
+        return state.get("status") == RUNNING and int(state.get("attempts", 0)) == job.attempts
+
+    def _make_pending(self, pipe: Any, conversation_id: str, available_at: float, **fields: Any) -> None:
+        pipe.hset(
+            self._key(conversation_id),
+            mapping={"status": PENDING, "available_at": available_at, "lease_until": "", **fields},
+        )
+        pipe.zadd(self._ready, {conversation_id: available_at})
+
+    def enqueue(self, conversation_ids: Iterable[str], now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        armed = 0
+        for cid in _unique(conversation_ids):
+
+            def arm(pipe: Any, state: Dict[str, str], cid: str = cid) -> int:
+                pipe.hincrby(self._key(cid), "triggers", 1)
+                status = state.get("status")
+                if status in (PENDING, RUNNING):
+                    return 0
+                if status in self._finished:
+                    pipe.srem(self._finished[status], cid)
+                fields: Dict[str, Any] = {"attempts": 0, "enqueued_at": now, "last_error": ""}
+                if not state:
+                    fields["claimed_triggers"] = 0
+                self._make_pending(pipe, cid, now, **fields)
+                return 1
+
+            armed += self._atomic(cid, arm)
+        return armed
+
+    def claim(self, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[DispatchJob]:
+        now = time.time() if now is None else now
+        lease_until = now + lease_seconds
+
+        def lease(pipe: Any, state: Dict[str, str], cid: str) -> Optional[DispatchJob]:
+            status = state.get("status")
+            if status == PENDING:
+                due = float(state["available_at"]) <= now
+            else:
+                # A running job whose worker let the lease expire
+                due = status == RUNNING and float(state.get("lease_until") or "inf") <= now
+            if not due:
+                return None  # claimed or rescheduled by another client meanwhile
+            attempts = int(state.get("attempts", 0)) + 1
+            pipe.zrem(self._ready, cid)
+            pipe.hset(
+                self._key(cid),
+                mapping={
+                    "status": RUNNING,
+                    "attempts": attempts,
+                    "claimed_triggers": state["triggers"],
+                    "lease_until": lease_until,
+                },
+            )
+            pipe.zadd(self._running, {cid: lease_until})
+            return DispatchJob(cid, attempts, float(state["enqueued_at"]))
+
+        candidates = self.client.zrangebyscore(self._running, "-inf", now)
+        candidates += self.client.zrangebyscore(self._ready, "-inf", now, start=0, num=limit)
+        jobs: List[DispatchJob] = []
+        for cid in _unique(candidates):
+            if len(jobs) >= limit:
+                break
+            job = self._atomic(cid, lambda pipe, state, cid=cid: lease(pipe, state, cid))
+            if job is not None:
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job.enqueued_at)
+
+    def complete(self, job: DispatchJob, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        cid = job.conversation_id
+
+        def settle(pipe: Any, state: Dict[str, str]) -> bool:
+            if not self._owns(state, job):
+                return False
+            pipe.zrem(self._running, cid)
+            if int(state["triggers"]) > int(state["claimed_triggers"]):
+                self._make_pending(pipe, cid, now, attempts=0, last_error="")
+            else:
+                pipe.hset(self._key(cid), mapping={"status": DONE, "lease_until": "", "last_error": ""})
+                pipe.sadd(self._finished[DONE], cid)
+            return True
+
+        return self._atomic(cid, settle)
+
+    def retry(self, job: DispatchJob, available_at: float, error: str) -> bool:
+        cid = job.conversation_id
+
+        def requeue(pipe: Any, state: Dict[str, str]) -> bool:
+            if not self._owns(state, job):
+                return False
+            pipe.zrem(self._running, cid)
+            self._make_pending(pipe, cid, available_at, last_error=error)
+            return True
+
+        return self._atomic(cid, requeue)
+
+    def fail(self, job: DispatchJob, error: str) -> bool:
+        cid = job.conversation_id
+
+        def give_up(pipe: Any, state: Dict[str, str]) -> bool:
+            if not self._owns(state, job):
+                return False
+            pipe.zrem(self._running, cid)
+            pipe.hset(self._key(cid), mapping={"status": FAILED, "lease_until": "", "last_error": error})
+            pipe.sadd(self._finished[FAILED], cid)
+            return True
+
+        return self._atomic(cid, give_up)
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        state = self.client.hgetall(self._key(conversation_id))
+        if not state:
+            return None
+        job: Dict[str, Any] = {"conversation_id": conversation_id, **state}
+        for name in ("triggers", "claimed_triggers", "attempts"):
+            job[name] = int(job.get(name, 0))
+        for name in ("available_at", "enqueued_at"):
+            job[name] = float(job[name])
+        job["lease_until"] = float(job["lease_until"]) if job.get("lease_until") else None
+        job["last_error"] = job.get("last_error") or None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        # Every status has its own index: counted without scanning the jobs
+        return {
+            PENDING: self.client.zcard(self._ready),
+            RUNNING: self.client.zcard(self._running),
+            DONE: self.client.scard(self._finished[DONE]),
+            FAILED: self.client.scard(self._finished[FAILED]),
+        }
+
+
+# ----------------------------------------------------------------------
+# Rate limiting
+# ----------------------------------------------------------------------
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second, in bursts of ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("expected rate > 0 and burst >= 1")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; return how many seconds to wait before using it."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+# ----------------------------------------------------------------------
+# Dispatcher
+# ----------------------------------------------------------------------
+class Dispatcher:
+    """Feeds ready conversations to ``summarize`` from a pool of threads.
+
+    Parameters
+    ----------
+    backend:
+        Where jobs are queued.
+    summarize:
+        Called with a batch of :class:`DispatchJob`.  It may return a
+        mapping ``conversation_id -> summary``: conversations missing from
+        it are retried.  ``None`` means the whole batch succeeded.
+        Raising retries the whole batch.
+    workers:
+        Threads calling ``summarize`` concurrently.
+    batch_size:
+        Conversations per ``summarize`` call.
+    max_attempts:
+        Attempts before a job is marked ``failed``.
+    retry_backoff:
+        Seconds before the first retry, doubled for each later one.
+    rate_limit:
+        Optional cap on ``summarize`` calls per second, across workers.
+    lease_seconds:
+        Time a worker may hold a job before others may claim it again.
+    poll_interval:
+        Idle workers look for due jobs at least this often.
+    on_result:
+        Optional callback with each job and its summary, e.g. to store it.
+    """
+
+    def __init__(
+        self,
+        backend: DispatchBackend,
+        summarize: Summarizer,
+        workers: int = 2,
+        batch_size: int = 10,
+        max_attempts: int = 3,
+        retry_backoff: float = 5.0,
+        rate_limit: Optional[float] = None,
+        lease_seconds: float = 300.0,
+        poll_interval: float = 1.0,
+        on_result: Optional[ResultCallback] = None,
+    ) -> None:
+        if workers < 1 or batch_size < 1 or max_attempts < 1:
+            raise ValueError("workers, batch_size and max_attempts must be positive")
+        self.backend = backend
+        self.summarize = summarize
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.limiter = RateLimiter(rate_limit, burst=workers) if rate_limit else None
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "triggers": 0,
+            "enqueued": 0,
+            "batches": 0,
+            "summarized": 0,
+            "retried": 0,
+            "failed": 0,
+            "throttled_s": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    def enqueue(self, conversation_ids: Iterable[str]) -> int:
+        """Queue conversations for summarization; return how many are new."""
+        ids = _unique(conversation_ids)
+        armed = self.backend.enqueue(ids)
+        self._count(triggers=len(ids), enqueued=armed)
+        if armed:
+            self._wake.set()
+        return armed
+
+    def on_batch(self, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+        """``IngestionService`` callback: enqueue the batch's ready conversations."""
+        self.enqueue(result["conversation_id"] for _, result in pairs if result.get("ready_for_ai"))
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    def start(self) -> "Dispatcher":
+        """Start the worker threads."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"swai-ai-dispatch-{n}", daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers after their current batch."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def __enter__(self) -> "Dispatcher":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def run_once(self) -> int:
+        """Claim and summarize one batch on the calling thread.
+
+        Returns the number of jobs claimed (``0`` when nothing is due).
+        """
+        jobs = self.backend.claim(self.batch_size, self.lease_seconds)
+        if not jobs:
+            return 0
+        if self.limiter is not None:
+            delay = self.limiter.reserve()
+            if delay > 0:
+                self._count(throttled_s=delay)
+                if self._stop.wait(delay):
+                    # Shutting down: let the jobs be claimed again right away
+                    for job in jobs:
+                        self.backend.retry(job, time.time(), "interrompido")
+                    return len(jobs)
+        self._process(jobs)
+        return len(jobs)
+
+    def drain(self) -> int:
+        """:meth:`run_once` until nothing is due; return the jobs processed."""
+        total = 0
+        while True:
+            claimed = self.run_once()
+            if not claimed:
+                return total
+            total += claimed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("falha no despacho de conversas para IA")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _process(self, jobs: List[DispatchJob]) -> None:
+        self._count(batches=1)
+        try:
+            results = self.summarize(jobs)
+        except Exception as exc:
+            logger.warning("resumo de %d conversas falhou: %s", len(jobs), exc)
+            for job in jobs:
+                self._retry(job, str(exc) or type(exc).__name__)
+            return
+
+        for job in jobs:
+            if results is not None and job.conversation_id not in results:
+                self._retry(job, "conversa sem resumo")
+                continue
+            if self.on_result is not None:
+                try:
+                    self.on_result(job, None if results is None else results[job.conversation_id])
+                except Exception as exc:
+                    logger.exception("falha ao registrar resumo de %s", job.conversation_id)
+                    self._retry(job, str(exc) or type(exc).__name__)
+                    continue
+            if self.backend.complete(job):
+                self._count(summarized=1)
+
+    def _retry(self, job: DispatchJob, error: str) -> None:
+        if job.attempts >= self.max_attempts:
+            if self.backend.fail(job, error):
+                self._count(failed=1)
+                logger.error("conversa %s descartada após %d tentativas: %s", job.conversation_id, job.attempts, error)
+            return
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        if self.backend.retry(job, time.time() + delay, error):
+            self._count(retried=1)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def _count(self, **increments: float) -> None:
+        with self._lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """Dispatch counters and jobs per status."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats["queue"] = self.backend.counts()
+        stats["workers"] = sum(thread.is_alive() for thread in self._threads)
+        return stats
+
+
+__all__ = [
+    "DONE",
+    "DispatchBackend",
+    "DispatchJob",
+    "Dispatcher",
+    "FAILED",
+    "PENDING",
+    "RUNNING",
+    "RateLimiter",
+    "RedisDispatchBackend",
+    "SQLiteDispatchBackend",
+    "Summarizer",
+]
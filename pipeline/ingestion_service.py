@@ -0,0 +1,426 @@
+"""Asynchronous webhook ingestion for the N8N → Layer 1 → Layer 2 pipeline.
+
+:class:`IngestionService` is a small HTTP/1.1 server built on
+:func:`asyncio.start_server`.  Each ``POST /webhook`` payload is run
+through :func:`~pipeline.layer1_formatter.format_message` and queued; the
+request is acknowledged with ``202`` as soon as its messages are
+accepted by a :class:`~pipeline.write_behind.WriteBehindQueue`.  Its
+single writer thread group-commits batches: it stores the messages and
+groups them into conversations in one transaction with
+:meth:`SWAILiteManager.store_and_group`.  Request handlers
+never touch SQLite, so bursts are absorbed by the buffer instead of
+blocking on commits; when the buffer is full requests wait up to
+``put_timeout`` and are then refused with ``503``.
+
+Run it with ``python -m pipeline.ingestion_service --db data/databases/messages.db``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from functools import partial
+import json
+import logging
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from integrations.database.sqlite_manager import SWAILiteManager
+from pipeline import layer2_grouper
+from pipeline.layer1_formatter import Layer1FormatError, format_message
+from pipeline.session_engine import SessionEngine
+from pipeline.write_behind import QueueFull, WriteBehindQueue
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+BatchCallback = Callable[[List[Tuple[Dict[str, Any], Dict[str, Any]]]], None]
+
+
+class HTTPError(Exception):
+    """Request that cannot be served; ``status`` is the HTTP status code."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def extract_raw_messages(payload: Any) -> List[Dict[str, Any]]:
+    """Return the raw message dictionaries carried by a webhook payload.
+
+    Accepts a single message, the N8N envelope ``{"data": message}`` (where
+    ``data`` may also be a list) or a list of either.
+    """
+
+    if isinstance(payload, list):
+        messages: List[Dict[str, Any]] = []
+        for item in payload:
+            messages.extend(extract_raw_messages(item))
+        return messages
+    if not isinstance(payload, dict):
+        raise Layer1FormatError("payload deve ser um objeto JSON ou uma lista")
+    if "data" in payload:
+        data = payload["data"]
+        if isinstance(data, list):
+            return extract_raw_messages(data)
+        if not isinstance(data, dict):
+            raise Layer1FormatError("campo 'data' inválido")
+        return [data]
+    return [payload]
+
+
+class IngestionService:
+    """Webhook server with a single batched SQLite writer.
+
+    Parameters
+    ----------
+    db_path:
+        SQLite database receiving messages and conversations.
+    host, port:
+        Listening address; ``port=0`` picks a free port (see :attr:`port`).
+    batch_size:
+        Messages that trigger a group commit.
+    flush_interval:
+        Longest time, in seconds, an accepted message waits to be written.
+    max_queue:
+        Accepted-but-unwritten messages before requests are held back.
+    put_timeout:
+        How long a request waits for room in a full buffer before ``503``.
+    log_path:
+        Optional write-behind log making acknowledged messages crash-safe.
+    on_batch:
+        Optional callback run on the writer thread after each batch
+        with ``(formatted_message, layer2_result)`` pairs, e.g. to hand
+        ``ready_for_ai`` conversations to Layer 3.
+    strict_timestamps:
+        Reject messages whose timestamp is ambiguous or unparseable
+        instead of storing it as received.
+    session_gap_minutes:
+        When set, Layer 2 groups with a :class:`SessionEngine` (a new
+        conversation after this many minutes of silence) instead of by
+        calendar day.
+    settings:
+        SWAI settings whose ``AGENDAMENTO_KEYWORDS``/``PRECO_KEYWORDS``
+        are counted in the live conversation features, matching the
+        batch extraction; the module constants when omitted.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        batch_size: int = 200,
+        flush_interval: float = 0.02,
+        max_queue: int = 10000,
+        put_timeout: float = 5.0,
+        log_path: Optional[str] = None,
+        on_batch: Optional[BatchCallback] = None,
+        strict_timestamps: bool = False,
+        session_gap_minutes: Optional[float] = None,
+        settings: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        self.db_path = db_path
+        self.settings = settings
+        self.host = host
+        self.port = port
+        self.put_timeout = put_timeout
+        self.on_batch = on_batch
+        self.strict_timestamps = strict_timestamps
+        self.session_gap_minutes = session_gap_minutes
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "throttled": 0,
+        }
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._manager: Optional[SWAILiteManager] = None
+        self._sessions: Optional[SessionEngine] = None
+        # The writer thread owns the SQLite connection for the service's lifetime
+        self._queue = WriteBehindQueue(
+            self._write_batch,
+            flush_size=batch_size,
+            flush_interval=flush_interval,
+            max_pending=max_queue,
+            log_path=log_path,
+            on_start=self._open_database,
+            on_stop=self._close_database,
+        )
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    async def start(self) -> None:
+        """Open the database, start the writer and begin listening."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._queue.start)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("serviço de ingestão ouvindo em %s:%s", self.host, self.port)
+
+    async def stop(self) -> None:
+        """Stop accepting requests, write everything buffered and close the database."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._queue.close)
+
+    async def serve_forever(self) -> None:
+        """Start the service and run until cancelled."""
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+    async def submit(self, payload: Any) -> Dict[str, Any]:
+        """Format and queue the messages of one webhook payload.
+
+        Returns the acknowledgement body: how many messages were queued
+        and the formatting errors of the rejected ones.
+        """
+        raw_messages = extract_raw_messages(payload)
+        formatted = []
+        errors = []
+        for index, raw in enumerate(raw_messages):
+            try:
+                formatted.append(format_message(raw, strict=self.strict_timestamps))
+            except Layer1FormatError as exc:
+                errors.append({"index": index, "error": str(exc)})
+
+        if formatted:
+            if self._queue.log_path is None:
+                try:
+                    self._queue.put_many(formatted, timeout=0)
+                except QueueFull:
+                    await self._put_blocking(formatted)
+            else:
+                # Appending to the log fsyncs: keep it off the event loop
+                await self._put_blocking(formatted)
+
+        self.stats["accepted"] += len(formatted)
+        self.stats["rejected"] += len(errors)
+        return {"accepted": len(formatted), "errors": errors}
+
+    async def _put_blocking(self, formatted: List[Dict[str, Any]]) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, partial(self._queue.put_many, formatted, self.put_timeout))
+
+    def health(self) -> Dict[str, Any]:
+        """Service status, counters and write-behind metrics."""
+        metrics = self._queue.metrics()
+        health = {
+            "status": "ok",
+            "queue_depth": metrics["depth"],
+            **self.stats,
+            "write_behind": metrics,
+        }
+        sessions = self._sessions
+        if sessions is not None:
+            health["sessions"] = sessions.stats()
+        return health
+
+    # ------------------------------------------------------------------
+    # Database thread
+    # ------------------------------------------------------------------
+    def _open_database(self) -> None:
+        self._manager = SWAILiteManager(self.db_path, settings=self.settings)
+        if self.session_gap_minutes is not None:
+            # One writer: the engine groups through the service's connection
+            self._sessions = SessionEngine(
+                self.db_path, gap_minutes=self.session_gap_minutes, writer=self._manager
+            ).start()
+
+    def _close_database(self) -> None:
+        if self._sessions is not None:
+            self._sessions.close()
+            self._sessions = None
+        if self._manager is not None:
+            self._manager.close()
+            self._manager = None
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if self._sessions is not None:
+            self._manager.store_messages(batch)
+            # Returns once the sessions are committed, so on_batch never
+            # signals ready_for_ai for an unsaved conversation
+            results = self._sessions.record_many(batch)
+        else:
+            # Messages and their conversation links commit together; the
+            # service's own manager is used so the module-level
+            # ``layer2_grouper`` configuration is left alone.
+            records = layer2_grouper.conversation_records(batch)
+            _, convos = self._manager.store_and_group(batch, [record for record in records if record is not None])
+            results = layer2_grouper.batch_results(records, convos)
+        if self.on_batch is not None:
+            self.on_batch(list(zip(batch, results)))
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as exc:
+                    await _respond(writer, exc.status, {"error": str(exc)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.stats["requests"] += 1
+                status, response = await self._route(method, path, body)
+                await _respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.health()
+        if path == "/webhook" or path.startswith("/webhook/"):
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                payload = json.loads(body)
+                ack = await self.submit(payload)
+            except (ValueError, Layer1FormatError) as exc:
+                self.stats["rejected"] += 1
+                return 400, {"error": str(exc)}
+            except QueueFull as exc:
+                self.stats["throttled"] += 1
+                return 503, {"error": str(exc)}
+            except RuntimeError as exc:
+                # The write-behind queue is closed or its writer died
+                logger.error("fila de escrita indisponível: %s", exc)
+                return 503, {"error": "serviço indisponível"}
+            except Exception:
+                logger.exception("erro ao processar webhook")
+                return 500, {"error": "erro interno"}
+            return 202, ack
+        return 404, {"error": "rota não encontrada"}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial.strip():
+            return None  # client closed between requests
+        raise HTTPError(400, "requisição incompleta")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "cabeçalhos muito grandes")
+    if len(head) > MAX_HEADER_BYTES:
+        raise HTTPError(431, "cabeçalhos muito grandes")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "linha de requisição inválida")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    body = b""
+    if method == "POST":
+        if "content-length" not in headers:
+            raise HTTPError(411, "Content-Length obrigatório")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HTTPError(400, "Content-Length inválido")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "payload muito grande")
+        body = await reader.readexactly(length)
+    return method.upper(), path, headers, body
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serviço HTTP de ingestão dos webhooks N8N/Evolution")
+    parser.add_argument("--host", default="0.0.0.0", help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=8080, help="Porta de escuta")
+    parser.add_argument("--db", default="data/databases/messages.db", help="Arquivo SQLite de destino")
+    parser.add_argument("--batch-size", type=int, default=200, help="Mensagens gravadas por lote")
+    parser.add_argument("--flush-interval", type=float, default=0.02, help="Espera máxima (s) para completar um lote")
+    parser.add_argument("--max-queue", type=int, default=10000, help="Mensagens em fila antes de segurar as requisições")
+    parser.add_argument("--log", default=None, help="Log de escrita antecipada para sobreviver a quedas")
+    parser.add_argument("--strict-timestamps", action="store_true", help="Rejeita timestamps ambíguos ou inválidos")
+    parser.add_argument(
+        "--session-gap",
+        type=float,
+        default=None,
+        help="Agrupa conversas por inatividade (minutos) em vez de por dia",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    service = IngestionService(
+        args.db,
+        host=args.host,
+        port=args.port,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval,
+        max_queue=args.max_queue,
+        log_path=args.log,
+        strict_timestamps=args.strict_timestamps,
+        session_gap_minutes=args.session_gap,
+    )
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = ["HTTPError", "IngestionService", "extract_raw_messages"]
@@ -5,13 +5,20 @@ received from the N8N webhook into a normalized structure that can be
 stored into the SWAI Lite database.  The formatter is intentionally
 minimal and focuses on the most common fields emitted by WhatsApp
 through the official Cloud API.
+
+:func:`format_messages_batch` produces the same fields for many messages
+at once, working on whole columns instead of one dictionary at a time.
 """
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
 import hashlib
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pipeline.timestamps import TimestampError, normalize_epochs, normalize_timestamp
 
 
 class Layer1FormatError(Exception):
@@ -44,42 +51,29 @@ def _sanitize_phone(raw: Any) -> str | None:
     return str(raw).split("@")[0]
 
 
+_ID_FIELDS = ("sender_raw_data", "receiver_raw_data", "timestamp", "sent_message")
+
+
 def _generate_message_id(data: Dict[str, Any]) -> str:
     """Generate a deterministic identifier when none is provided."""
 
-    base = "-".join(
-        str(data.get(key, ""))
-        for key in (
-            "sender_raw_data",
-            "receiver_raw_data",
-            "timestamp",
-            "sent_message",
-        )
-    )
+    base = "-".join(str(data.get(key, "")) for key in _ID_FIELDS)
     return hashlib.sha1(base.encode("utf-8")).hexdigest()
 
 
-def _normalize_timestamp(value: Any) -> str:
-    """Normalize raw timestamp values to an ISO formatted string."""
-
-    if value is None:
-        raise Layer1FormatError("timestamp ausente")
+def _normalize_timestamp(value: Any, strict: bool = False) -> str:
+    """Normalize raw timestamp values to an ISO formatted string.
 
-    # Unix timestamps may come as integers or digit strings
-    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
-        return datetime.fromtimestamp(int(value), tz=timezone.utc).isoformat()
-
-    # Attempt to parse ISO formatted strings; if parsing fails, keep raw
-    if isinstance(value, str):
-        try:
-            return datetime.fromisoformat(value).isoformat()
-        except ValueError:
-            return value
+    See :func:`pipeline.timestamps.normalize_timestamp`.
+    """
 
-    raise Layer1FormatError(f"formato de timestamp inválido: {value!r}")
+    try:
+        return normalize_timestamp(value, strict=strict)
+    except TimestampError as exc:
+        raise Layer1FormatError(str(exc)) from None
 
 
-def format_message(data: Dict[str, Any]) -> Dict[str, Any]:
+def format_message(data: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
     """Return a dictionary with the canonical SWAI message fields.
 
     Parameters
@@ -90,13 +84,16 @@ def format_message(data: Dict[str, Any]) -> Dict[str, Any]:
         in N8N.  When ``id`` is missing a deterministic identifier is
         generated from the message contents.  ``sender_raw_data`` and
         ``receiver_raw_data`` are normalised to phone numbers.
+    strict:
+        Reject ambiguous or unparseable timestamps instead of storing
+        them as received (see :mod:`pipeline.timestamps`).
     """
 
     message_id = data.get("id") or data.get("message_id")
     if not message_id:
         message_id = _generate_message_id(data)
 
-    timestamp = _normalize_timestamp(data.get("timestamp"))
+    timestamp = _normalize_timestamp(data.get("timestamp"), strict)
 
     sender_raw = data.get("sender_raw_data") or data.get("from")
     receiver_raw = data.get("receiver_raw_data") or data.get("to")
@@ -113,3 +110,266 @@ def format_message(data: Dict[str, Any]) -> Dict[str, Any]:
 
     return formatted
 
+
+
+# ---------------------------------------------------------------------------
+# Batch formatting
+# ---------------------------------------------------------------------------
+
+CANONICAL_FIELDS = (
+    "message_id",
+    "sender_phone",
+    "receiver_phone",
+    "sender_type",
+    "content",
+    "timestamp",
+    "message_type",
+)
+
+_RAW_FIELDS = (
+    "id",
+    "message_id",
+    "timestamp",
+    "sender_raw_data",
+    "from",
+    "receiver_raw_data",
+    "to",
+    "sender_type",
+    "sent_message",
+    "text",
+    "body",
+    "content",
+    "message_type",
+)
+
+Column = Optional[List[Any]]
+
+
+class _Missing:
+    """Placeholder for an absent key: falsy and empty once stringified,
+    exactly like the ``data.get(key)``/``data.get(key, "")`` defaults."""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __str__(self) -> str:
+        return ""
+
+    def __repr__(self) -> str:
+        return "<missing>"
+
+
+_MISSING = _Missing()
+
+
+def _raw_columns(messages: Any) -> Tuple[int, Dict[str, Column]]:
+    """Return one list per raw field; ``None`` for a field no message has.
+
+    Inside a column, absent keys (and null cells of a frame) are
+    ``_MISSING``.
+    """
+
+    if hasattr(messages, "to_pandas") and not isinstance(messages, pd.DataFrame):
+        messages = messages.to_pandas()  # pyarrow.Table
+
+    if isinstance(messages, pd.DataFrame):
+        columns: Dict[str, Column] = {}
+        for key in _RAW_FIELDS:
+            if key not in messages.columns:
+                columns[key] = None
+                continue
+            values = messages[key].to_numpy(dtype=object)
+            null = pd.isna(values)
+            if null.any():
+                values[null] = _MISSING
+            columns[key] = values.tolist()
+        return len(messages), columns
+
+    messages = list(messages)
+    keys = set().union(*messages) if messages else set()
+    columns = {
+        key: [m.get(key, _MISSING) for m in messages] if key in keys else None
+        for key in _RAW_FIELDS
+    }
+    return len(messages), columns
+
+
+def _coalesce(first: Column, second: Column) -> Column:
+    """Columnwise ``first or second``.
+
+    Without a ``second`` column, falsy values of ``first`` become
+    ``_MISSING``, as ``first or None`` does for a single message.
+    """
+
+    if first is None:
+        return second
+    if second is None:
+        return [a if a else _MISSING for a in first]
+    return [a or b for a, b in zip(first, second)]
+
+
+def _none(column: Column, count: int) -> List[Any]:
+    if column is None:
+        return [None] * count
+    return [None if value is _MISSING else value for value in column]
+
+
+def _by_distinct(values: List[Any], convert: Callable[[Any], Any]) -> List[Any]:
+    """Apply ``convert`` once per distinct value (phones repeat a lot
+    within a dump)."""
+
+    try:
+        mapping = {value: convert(value) for value in dict.fromkeys(values)}
+    except TypeError:  # unhashable values
+        return [convert(value) for value in values]
+    return list(map(mapping.__getitem__, values))
+
+
+def _message_ids(columns: Dict[str, Column], count: int) -> List[Any]:
+    ids = _coalesce(columns["id"], columns["message_id"]) or [_MISSING] * count
+    generate = [row for row, value in enumerate(ids) if not value]
+    if generate:
+        ids = list(ids)
+        parts = [columns[key] or [_MISSING] * count for key in _ID_FIELDS]
+        for row in generate:
+            base = "-".join([str(part[row]) for part in parts])
+            ids[row] = hashlib.sha1(base.encode("utf-8")).hexdigest()
+    return ids
+
+
+def _sanitize_phone_value(raw: Any) -> str | None:
+    return None if raw is _MISSING else _sanitize_phone(raw)
+
+
+def _phones(raw: Column, count: int) -> List[Any]:
+    if raw is None:
+        return [None] * count
+    return _by_distinct(raw, _sanitize_phone_value)
+
+
+def _timestamps(values: Column, count: int, strict: bool) -> List[str]:
+    if values is None:
+        raise Layer1FormatError("mensagem 0: timestamp ausente")
+
+    # Whole column of epoch numbers: one numpy conversion
+    try:
+        array = np.asarray(values)
+    except (TypeError, ValueError):  # nested or ragged values
+        array = np.empty(0, dtype=object)
+    if array.dtype.kind in "iubf":
+        epoch_rows, epochs = list(range(count)), array
+        text_rows: List[int] = []
+    else:
+        epoch_rows, epochs, text_rows = [], [], []
+        for row, value in enumerate(values):
+            if isinstance(value, (int, float)):
+                epoch_rows.append(row)
+                epochs.append(value)
+            elif isinstance(value, str) and value.isdigit():
+                epoch_rows.append(row)
+                epochs.append(int(value))
+            elif isinstance(value, str):
+                text_rows.append(row)
+            elif value is None or value is _MISSING:
+                raise Layer1FormatError(f"mensagem {row}: timestamp ausente")
+            else:
+                raise Layer1FormatError(f"mensagem {row}: formato de timestamp inválido: {value!r}")
+
+    result: List[Any] = [None] * count
+    if epoch_rows:
+        try:
+            converted = normalize_epochs(epochs, strict=strict)
+        except TimestampError as exc:
+            raise Layer1FormatError(f"mensagem {epoch_rows[exc.row]}: {exc}") from None
+        for row, iso in zip(epoch_rows, converted):
+            result[row] = iso
+
+    # ISO strings repeat within a burst: parse each distinct value once
+    parsed: Dict[str, str] = {}
+    for row in text_rows:
+        value = values[row]
+        if value not in parsed:
+            try:
+                parsed[value] = normalize_timestamp(value, strict=strict)
+            except TimestampError as exc:
+                raise Layer1FormatError(f"mensagem {row}: {exc}") from None
+        result[row] = parsed[value]
+    return result
+
+
+def _extract_content_value(text: Any, body: Any, content: Any) -> str:
+    # _extract_content over one row's columns
+    if isinstance(text, dict):
+        return text.get("body", "")
+    if body is not _MISSING:
+        return str(body)
+    if content is not _MISSING:
+        return str(content)
+    return ""
+
+
+def _contents(columns: Dict[str, Column], count: int) -> List[Any]:
+    missing = [_MISSING] * count
+    sent = columns["sent_message"] or missing
+    rows = zip(sent, columns["text"] or missing, columns["body"] or missing, columns["content"] or missing)
+    return [s or _extract_content_value(t, b, c) for s, t, b, c in rows]
+
+
+def format_messages_batch(
+    messages: Iterable[Dict[str, Any]] | pd.DataFrame | Any,
+    strict: bool = False,
+) -> List[Dict[str, Any]]:
+    """Return :func:`format_message` output for many raw messages at once.
+
+    Parameters
+    ----------
+    messages:
+        Raw message dictionaries, or a ``pandas.DataFrame``/``pyarrow.Table``
+        with one row per message and the raw keys as columns.  In frames
+        and tables a null cell counts as an absent key.
+    strict:
+        As in :func:`format_message`.
+
+    Fields are resolved column by column: each distinct phone and ISO
+    timestamp string is converted once, epoch timestamps are converted
+    in one numpy call, and SHA-1 ids are built only for rows without an
+    id.  The result matches ``[format_message(m) for m in messages]``; a
+    message that :func:`format_message` would reject raises
+    :class:`Layer1FormatError` naming its position.
+    """
+
+    count, columns = _raw_columns(messages)
+    if count == 0:
+        return []
+
+    fields = zip(
+        _message_ids(columns, count),
+        _phones(_coalesce(columns["sender_raw_data"], columns["from"]), count),
+        _phones(_coalesce(columns["receiver_raw_data"], columns["to"]), count),
+        _none(columns["sender_type"], count),
+        _contents(columns, count),
+        _timestamps(columns["timestamp"], count, strict),
+        _none(columns["message_type"], count),
+    )
+    return [
+        {
+            "message_id": message_id,
+            "sender_phone": sender_phone,
+            "receiver_phone": receiver_phone,
+            "sender_type": sender_type,
+            "content": content,
+            "timestamp": timestamp,
+            "message_type": message_type,
+        }
+        for message_id, sender_phone, receiver_phone, sender_type, content, timestamp, message_type in fields
+    ]
+
+
+__all__ = [
+    "CANONICAL_FIELDS",
+    "Layer1FormatError",
+    "format_message",
+    "format_messages_batch",
+]
@@ -2,24 +2,44 @@
 
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import logging
 
+from integrations.database.connection_pool import SWAILitePool
 from integrations.database.sqlite_manager import SWAILiteManager
+from pipeline.timestamps import TimestampError, timestamp_date
 
 
 logger = logging.getLogger(__name__)
 
-_db_manager: Optional[SWAILiteManager] = None
+# Messages a conversation needs before Layer 3 may summarise it
+READY_FOR_AI_MESSAGES = 3
 
+_db_manager: Optional[Union[SWAILiteManager, SWAILitePool]] = None
 
-def configure(manager: SWAILiteManager) -> None:
-    """Configure the module with a :class:`SWAILiteManager` instance."""
+
+def configure(manager: Union[SWAILiteManager, SWAILitePool]) -> None:
+    """Configure the module with a :class:`SWAILiteManager` instance.
+
+    A :class:`SWAILitePool` may be given instead when grouping runs on
+    several threads; each call then borrows the pool's writer.
+    """
     global _db_manager
     _db_manager = manager
 
 
+@contextmanager
+def _database() -> Iterator[SWAILiteManager]:
+    if _db_manager is None:
+        raise RuntimeError("database manager not configured")
+    if isinstance(_db_manager, SWAILitePool):
+        with _db_manager.writer() as manager:
+            yield manager
+    else:
+        yield _db_manager
+
+
 def _extract_phones(message: Dict[str, Any]) -> tuple[str, str]:
     """Return ``(lead_phone, secretary_phone)`` from a formatted message."""
 
@@ -32,6 +52,56 @@ def _extract_phones(message: Dict[str, Any]) -> tuple[str, str]:
     return message.get("sender_phone"), message.get("receiver_phone")
 
 
+def _error_result() -> Dict[str, Any]:
+    return {"status": "error", "conversation_id": None, "ready_for_ai": False}
+
+
+def message_parties(formatted_message: Dict[str, Any]) -> Optional[Tuple[str, str, str, str]]:
+    """Return ``(message_id, lead_phone, secretary_phone, timestamp)``.
+
+    Returns ``None`` (and logs why) when required fields are missing.
+    """
+
+    required = ["message_id", "sender_phone", "receiver_phone", "timestamp"]
+    missing = [key for key in required if not formatted_message.get(key)]
+    if missing:
+        logger.error("campos obrigatórios ausentes: %s", ", ".join(missing))
+        return None
+
+    lead_phone, secretary_phone = _extract_phones(formatted_message)
+    if not lead_phone or not secretary_phone:
+        logger.error("números de telefone inválidos")
+        return None
+
+    return formatted_message["message_id"], lead_phone, secretary_phone, formatted_message["timestamp"]
+
+
+def _conversation_record(formatted_message: Dict[str, Any]) -> Optional[Tuple[str, str, str, str, str]]:
+    """Return the ``record_conversation_message`` arguments, or ``None`` if invalid."""
+
+    parties = message_parties(formatted_message)
+    if parties is None:
+        return None
+
+    message_id, lead_phone, secretary_phone, timestamp = parties
+    try:
+        date_str = timestamp_date(timestamp)
+    except TimestampError:
+        logger.error("timestamp inválido: %s", timestamp)
+        return None
+
+    conversation_id = f"{lead_phone}_{date_str}"
+    return conversation_id, message_id, lead_phone, secretary_phone, timestamp
+
+
+def _result(conversation_id: str, convo: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": convo["status"],
+        "conversation_id": conversation_id,
+        "ready_for_ai": convo["message_count"] >= READY_FOR_AI_MESSAGES,
+    }
+
+
 def process_layer2_grouping(formatted_message: Dict[str, Any]) -> Dict[str, Any]:
     """Group messages into conversations based on lead phone and date.
 
@@ -51,40 +121,94 @@ def process_layer2_grouping(formatted_message: Dict[str, Any]) -> Dict[str, Any]
     if _db_manager is None:
         raise RuntimeError("database manager not configured")
 
-    required = ["message_id", "sender_phone", "receiver_phone", "timestamp"]
-    missing = [key for key in required if not formatted_message.get(key)]
-    if missing:
-        logger.error("campos obrigatórios ausentes: %s", ", ".join(missing))
-        return {"status": "error", "conversation_id": None, "ready_for_ai": False}
+    record = _conversation_record(formatted_message)
+    if record is None:
+        return _error_result()
 
-    lead_phone, secretary_phone = _extract_phones(formatted_message)
-    if not lead_phone or not secretary_phone:
-        logger.error("números de telefone inválidos")
-        return {"status": "error", "conversation_id": None, "ready_for_ai": False}
+    conversation_id, message_id, lead_phone, secretary_phone, timestamp = record
+    with _database() as manager:
+        convo = manager.record_conversation_message(
+            conversation_id=conversation_id,
+            message_id=message_id,
+            lead_phone=lead_phone,
+            secretary_phone=secretary_phone,
+            timestamp=timestamp,
+        )
 
-    timestamp = formatted_message["timestamp"]
-    try:
-        date_str = datetime.fromisoformat(timestamp).strftime("%Y%m%d")
-    except ValueError:
-        logger.error("timestamp inválido: %s", timestamp)
-        return {"status": "error", "conversation_id": None, "ready_for_ai": False}
+    return _result(conversation_id, convo)
 
-    conversation_id = f"{lead_phone}_{date_str}"
 
-    convo = _db_manager.record_conversation_message(
-        conversation_id=conversation_id,
-        message_id=formatted_message["message_id"],
-        lead_phone=lead_phone,
-        secretary_phone=secretary_phone,
-        timestamp=timestamp,
-    )
+def process_layer2_batch(formatted_messages: Iterable[Dict[str, Any]], batch_size: int = 500) -> List[Dict[str, Any]]:
+    """Group many Layer 1 messages, one transaction per batch.
 
-    return {
-        "status": convo["status"],
-        "conversation_id": conversation_id,
-        "ready_for_ai": convo["message_count"] >= 3,
-    }
+    Equivalent to calling :func:`process_layer2_grouping` on each message
+    in order (including each message's ``ready_for_ai``), but messages
+    are grouped in memory by ``conversation_id`` and written with
+    :meth:`SWAILiteManager.record_conversation_messages`.
+
+    Parameters
+    ----------
+    formatted_messages:
+        Dictionaries produced by Layer 1 formatting.
+    batch_size:
+        Messages written per transaction.
 
+    Returns
+    -------
+    list of dict
+        One result per input message, in order, shaped like the result of
+        :func:`process_layer2_grouping`.
+    """
+
+    if _db_manager is None:
+        raise RuntimeError("database manager not configured")
+
+    records = conversation_records(formatted_messages)
+    with _database() as manager:
+        convos = manager.record_conversation_messages(
+            [record for record in records if record is not None], batch_size=batch_size
+        )
+
+    return batch_results(records, convos)
+
+
+def conversation_records(
+    formatted_messages: Iterable[Dict[str, Any]],
+) -> List[Optional[Tuple[str, str, str, str, str]]]:
+    """Return the :meth:`SWAILiteManager.record_conversation_messages` record
+    of each message, or ``None`` for the malformed ones (logged).
+
+    Lets a caller that owns its manager group messages without
+    :func:`configure`, e.g. with :meth:`SWAILiteManager.store_and_group`.
+    """
+
+    return [_conversation_record(message) for message in formatted_messages]
+
+
+def batch_results(
+    records: List[Optional[Tuple[str, str, str, str, str]]],
+    convos: Iterable[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Layer 2 results for :func:`conversation_records` output.
+
+    ``convos`` are the conversation rows written for the non-``None``
+    records, in order.
+    """
 
-__all__ = ["configure", "process_layer2_grouping"]
+    convos = iter(convos)
+    return [
+        _error_result() if record is None else _result(record[0], next(convos))
+        for record in records
+    ]
+
+
+__all__ = [
+    "READY_FOR_AI_MESSAGES",
+    "batch_results",
+    "configure",
+    "conversation_records",
+    "message_parties",
+    "process_layer2_batch",
+    "process_layer2_grouping",
+]
 
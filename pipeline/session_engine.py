@@ -0,0 +1,446 @@
+"""Layer 2 grouping by inactivity gap, with open conversations kept in memory.
+
+:func:`~pipeline.layer2_grouper.process_layer2_grouping` groups messages
+by lead and calendar day and reads the conversation from SQLite for
+every message, so an exchange that runs past midnight is split in two.
+:class:`SessionEngine` instead keeps the open conversation of each
+lead/secretary pair in a bounded LRU map and starts a new conversation
+only after ``gap_minutes`` without messages.  A message updates the
+in-memory session; the new state and message link are persisted by a
+:class:`~pipeline.write_behind.WriteBehindQueue` on its own connection,
+so ``ready_for_ai`` may be returned before the write: call
+:meth:`SessionEngine.flush` before acting on it.  Given an existing
+``writer`` (e.g. the manager of an ingestion writer thread), the engine
+instead reads and writes through it synchronously: :meth:`record` and
+:meth:`record_many` return only once their updates are committed, with
+``ready_for_ai`` based on the links actually stored, and updates whose
+write failed are kept and written with the next call.
+
+SQLite is read only when a pair is not in memory (first message after a
+restart or an eviction) and for late messages older than the open
+window, which are matched against the pair's stored conversations.
+Conversation ids are ``<lead_phone>_<secretary_phone>_<AAAAMMDDTHHMMSS>``
+of the first message.  The engine is meant to be driven from a single
+thread; its methods are serialized with a lock.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+import logging
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from integrations.database.sqlite_manager import SWAILiteManager
+from pipeline.layer2_grouper import READY_FOR_AI_MESSAGES, message_parties
+from pipeline.timestamps import TimestampError, timestamp_epoch
+from pipeline.write_behind import WriteBehindQueue
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAP_MINUTES = 360
+DEFAULT_MAX_OPEN = 10000
+
+Pair = Tuple[str, str]
+
+
+@dataclass
+class Session:
+    """One conversation window between a lead and a secretary."""
+
+    conversation_id: str
+    lead_phone: str
+    secretary_phone: str
+    start_time: str
+    end_time: str
+    start: float
+    end: float
+    message_count: int = 0
+    status: str = "active"
+    message_ids: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any], message_ids: List[str]) -> "Session":
+        """Session of a stored conversation; its count is that of the stored links."""
+        end_time = row.get("end_time") or row["start_time"]
+        return cls(
+            conversation_id=row["conversation_id"],
+            lead_phone=row["lead_phone"],
+            secretary_phone=row["secretary_phone"],
+            start_time=row["start_time"],
+            end_time=end_time,
+            start=timestamp_epoch(row["start_time"]),
+            end=timestamp_epoch(end_time),
+            message_count=len(message_ids),
+            status=row["status"],
+            message_ids=set(message_ids),
+        )
+
+    def covers(self, moment: float, gap: float) -> bool:
+        """Whether a message at ``moment`` belongs to this window."""
+        return self.start - gap <= moment <= self.end + gap
+
+    def add(self, message_id: str, timestamp: str, moment: float) -> bool:
+        """Add a message; return ``False`` if it was already counted."""
+        if message_id in self.message_ids:
+            return False
+        self.message_ids.add(message_id)
+        self.message_count += 1
+        if moment < self.start:
+            self.start, self.start_time = moment, timestamp
+        if moment > self.end:
+            self.end, self.end_time = moment, timestamp
+        return True
+
+    def row(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "lead_phone": self.lead_phone,
+            "secretary_phone": self.secretary_phone,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "message_count": self.message_count,
+            "status": self.status,
+        }
+
+
+def session_id(lead_phone: str, secretary_phone: str, timestamp: str) -> str:
+    """Conversation id of a window opened by a message at ``timestamp``."""
+    opened = datetime.fromisoformat(timestamp).strftime("%Y%m%dT%H%M%S")
+    return f"{lead_phone}_{secretary_phone}_{opened}"
+
+
+class SessionEngine:
+    """Gap-windowed conversation grouping with asynchronous persistence.
+
+    Parameters
+    ----------
+    db_path:
+        SQLite database shared with Layer 1.
+    gap_minutes:
+        Silence after which the next message opens a new conversation.
+    max_open:
+        Open sessions kept in memory; the least recently active are
+        evicted (their state is already queued for persistence).
+    flush_size, flush_interval, max_pending:
+        Group-commit settings of the persistence queue.
+    profile:
+        Optional ``SWAILiteManager`` pragma profile.
+    log_path:
+        Optional write-behind log of the persistence queue, so updates
+        acknowledged before a crash (or whose write kept failing) are
+        written on the next start.
+    writer:
+        Manager to read and write through, on the calling thread,
+        instead of two connections and a persistence queue; it is not
+        closed by :meth:`close`.
+    settings:
+        Keyword lists for the live conversation features (see
+        :class:`SWAILiteManager`); ignored with a ``writer``.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        gap_minutes: float = DEFAULT_GAP_MINUTES,
+        max_open: int = DEFAULT_MAX_OPEN,
+        flush_size: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+        profile: Optional[Mapping[str, Any]] = None,
+        log_path: Optional[str] = None,
+        writer: Optional[SWAILiteManager] = None,
+        settings: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        if gap_minutes <= 0 or max_open < 1:
+            raise ValueError("expected gap_minutes > 0 and max_open >= 1")
+        self.db_path = db_path
+        self.gap = gap_minutes * 60
+        self.max_open = max_open
+        self.profile = profile
+        self.settings = settings
+
+        self._open: "OrderedDict[Pair, Session]" = OrderedDict()
+        # Pairs whose dropped sessions may still be waiting in the queue
+        self._dropped: Set[Pair] = set()
+        self._lock = threading.RLock()
+        self._reader: Optional[SWAILiteManager] = None
+        self._writer: Optional[SWAILiteManager] = writer
+        self._shared = writer is not None
+        # Updates not yet committed through a shared writer
+        self._unsaved: List[Dict[str, Any]] = []
+        # Stored link counts of the conversations saved since the last commit
+        self._stored: Dict[str, int] = {}
+        self._queue: Optional[WriteBehindQueue] = None
+        if not self._shared:
+            self._queue = WriteBehindQueue(
+                self._persist,
+                flush_size=flush_size,
+                flush_interval=flush_interval,
+                max_pending=max_pending,
+                log_path=log_path,
+                on_start=self._open_writer,
+                on_stop=self._close_writer,
+            )
+        self._stats: Dict[str, int] = {
+            "messages": 0,
+            "duplicates": 0,
+            "errors": 0,
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "late": 0,
+            "evicted": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> "SessionEngine":
+        """Open the read connection (on this thread) and the persistence queue."""
+        if self._shared:
+            self._reader = self._writer
+            return self
+        self._reader = SWAILiteManager(self.db_path, self.profile)
+        self._queue.start()
+        return self
+
+    def close(self) -> None:
+        """Persist everything pending and close the engine's own connections."""
+        if self._shared:
+            self._save()
+            self._reader = None
+            return
+        self._queue.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self) -> "SessionEngine":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued session update is in SQLite."""
+        if self._shared:
+            with self._lock:
+                self._save()
+            return True
+        return self._queue.flush(timeout)
+
+    # ------------------------------------------------------------------
+    # Grouping
+    # ------------------------------------------------------------------
+    def record(self, formatted_message: Dict[str, Any]) -> Dict[str, Any]:
+        """Assign a Layer 1 message to its conversation window.
+
+        Returns ``status``, ``conversation_id`` and ``ready_for_ai``,
+        shaped like :func:`~pipeline.layer2_grouper.process_layer2_grouping`.
+        With a shared ``writer`` the update is committed first.
+        """
+        with self._lock:
+            return self._commit([self._assign(formatted_message)])[0]
+
+    def record_many(self, formatted_messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """:meth:`record` for each message, in order.
+
+        With a shared ``writer`` the whole batch is committed in one
+        transaction before returning.
+        """
+        with self._lock:
+            return self._commit([self._assign(message) for message in formatted_messages])
+
+    def _commit(self, assigned: List[Tuple[Dict[str, Any], int]]) -> List[Dict[str, Any]]:
+        """Save pending updates, then set ``ready_for_ai`` on each result.
+
+        ``assigned`` pairs each result with the in-memory message count
+        of its conversation at that point.  Through a shared writer the
+        count is capped by the links actually stored, so messages linked
+        elsewhere are never counted; the write-behind queue reports the
+        in-memory count as is.
+        """
+        try:
+            self._save()
+            stored = self._stored
+        finally:
+            self._stored = {}
+        results = []
+        for result, count in assigned:
+            if result["conversation_id"] in stored:
+                count = min(count, stored[result["conversation_id"]])
+            result["ready_for_ai"] = count >= READY_FOR_AI_MESSAGES
+            results.append(result)
+        return results
+
+    def _assign(self, formatted_message: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        parties = message_parties(formatted_message)
+        if parties is None:
+            return self._error(), 0
+        message_id, lead_phone, secretary_phone, timestamp = parties
+        try:
+            moment = timestamp_epoch(timestamp)
+        except TimestampError:
+            logger.error("timestamp inválido: %s", timestamp)
+            return self._error(), 0
+
+        with self._lock:
+            self._stats["messages"] += 1
+            session = self._session_for((lead_phone, secretary_phone), timestamp, moment)
+            if session.status != "completed":
+                if session.add(message_id, timestamp, moment):
+                    self._enqueue({"conversation": session.row(), "message_id": message_id})
+                else:
+                    self._stats["duplicates"] += 1
+            result = {"status": session.status, "conversation_id": session.conversation_id, "ready_for_ai": False}
+            return result, session.message_count
+
+    def _session_for(self, pair: Pair, timestamp: str, moment: float) -> Session:
+        session = self._open.get(pair)
+        if session is not None:
+            self._stats["hits"] += 1
+            self._open.move_to_end(pair)
+        else:
+            self._stats["misses"] += 1
+            session = self._load_latest(pair)
+            if session is not None:
+                self._remember(pair, session)
+
+        if session is not None and session.covers(moment, self.gap):
+            return session
+        if session is None or moment > session.end + self.gap:
+            # Silence longer than the gap: the open window is closed
+            if session is not None:
+                self._dropped.add(pair)
+            return self._create(pair, timestamp, moment, remember=True)
+
+        # Older than the open window: an earlier conversation of the pair.
+        # It stays out of the map, so a later read must see its update.
+        self._stats["late"] += 1
+        earlier = self._load_covering(pair, moment)
+        self._dropped.add(pair)
+        return earlier or self._create(pair, timestamp, moment, remember=False)
+
+    def _create(self, pair: Pair, timestamp: str, moment: float, remember: bool) -> Session:
+        self._stats["created"] += 1
+        session = Session(
+            conversation_id=session_id(pair[0], pair[1], timestamp),
+            lead_phone=pair[0],
+            secretary_phone=pair[1],
+            start_time=timestamp,
+            end_time=timestamp,
+            start=moment,
+            end=moment,
+        )
+        if remember:
+            self._remember(pair, session)
+        return session
+
+    def _remember(self, pair: Pair, session: Session) -> None:
+        self._open[pair] = session
+        self._open.move_to_end(pair)
+        while len(self._open) > self.max_open:
+            evicted, _ = self._open.popitem(last=False)
+            self._dropped.add(evicted)
+            self._stats["evicted"] += 1
+
+    # ------------------------------------------------------------------
+    # SQLite reads (cold path)
+    # ------------------------------------------------------------------
+    def _settle(self, pair: Pair) -> None:
+        """Make sure queued updates of ``pair`` are visible before reading."""
+        if not self._backlog():
+            self._dropped.clear()
+        elif pair in self._dropped:
+            if self._shared:
+                self._save()
+            else:
+                self._queue.flush()
+            self._dropped.clear()
+
+    def _load(self, row: Mapping[str, Any]) -> Session:
+        return Session.from_row(row, self._reader.get_conversation_message_ids(row["conversation_id"]))
+
+    def _load_latest(self, pair: Pair) -> Optional[Session]:
+        self._settle(pair)
+        rows = self._reader.get_pair_conversations(*pair, limit=1)
+        return self._load(rows[0]) if rows else None
+
+    def _load_covering(self, pair: Pair, moment: float) -> Optional[Session]:
+        self._settle(pair)
+        for row in self._reader.get_pair_conversations(*pair):
+            session = self._load(row)
+            if session.covers(moment, self.gap):
+                return session
+        return None
+
+    # ------------------------------------------------------------------
+    # Persistence (writer thread)
+    # ------------------------------------------------------------------
+    def _enqueue(self, item: Dict[str, Any]) -> None:
+        if self._shared:
+            self._unsaved.append(item)
+        else:
+            self._queue.put(item)
+
+    def _backlog(self) -> int:
+        return len(self._unsaved) if self._shared else self._queue.depth
+
+    def _save(self) -> None:
+        """Commit the updates kept for a shared writer.
+
+        The stored link count of each conversation written is kept in
+        ``_stored`` for :meth:`_commit` and the open sessions are reset to
+        it.  On failure the updates stay in ``_unsaved`` and the next call
+        writes them again.
+        """
+        if not self._shared or not self._unsaved:
+            return
+        stored = self._persist(self._unsaved)
+        self._stored.update(stored)
+        for item in self._unsaved:
+            conversation = item["conversation"]
+            session = self._open.get((conversation["lead_phone"], conversation["secretary_phone"]))
+            if session is not None and session.conversation_id in stored:
+                session.message_count = stored[session.conversation_id]
+        self._unsaved = []
+
+    def _open_writer(self) -> None:
+        self._writer = SWAILiteManager(self.db_path, self.profile, settings=self.settings)
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _persist(self, batch: List[Dict[str, Any]]) -> Dict[str, int]:
+        # Only the latest snapshot of each conversation needs writing
+        conversations = {item["conversation"]["conversation_id"]: item["conversation"] for item in batch}
+        links = [(item["conversation"]["conversation_id"], item["message_id"]) for item in batch]
+        return self._writer.save_sessions(conversations.values(), links)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def _error(self) -> Dict[str, Any]:
+        with self._lock:
+            self._stats["errors"] += 1
+        return {"status": "error", "conversation_id": None, "ready_for_ai": False}
+
+    def stats(self) -> Dict[str, Any]:
+        """Grouping counters, open sessions and persistence queue metrics."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["open_sessions"] = len(self._open)
+            if self._shared:
+                stats["unsaved"] = len(self._unsaved)
+        if self._queue is not None:
+            stats["queue"] = self._queue.metrics()
+        return stats
+
+
+__all__ = ["DEFAULT_GAP_MINUTES", "DEFAULT_MAX_OPEN", "Session", "SessionEngine", "session_id"]
@@ -0,0 +1,218 @@
+"""Timestamp normalization shared by Layer 1 and Layer 2.
+
+WhatsApp (Cloud API and Evolution) sends message times as epoch seconds,
+epoch milliseconds or ISO 8601 strings with or without a UTC offset,
+either as numbers or as digit strings.  :func:`normalize_timestamp` turns
+any of them into the canonical ISO string stored by Layer 1, and
+:func:`timestamp_date` derives the ``AAAAMMDD`` day Layer 2 uses in
+conversation ids.  Both are memoized with an LRU cache, since a burst of
+messages repeats the same second and the same day many times.
+
+Epoch numbers below ``EPOCH_MILLIS_THRESHOLD`` are seconds, larger ones
+milliseconds.  In the default (lenient) mode an unparseable string is
+kept as it came, as Layer 1 always did, with a warning.  Strict mode
+rejects, with :class:`TimestampError`, anything that cannot be placed
+unambiguously in time: unparseable strings, ISO strings without an
+offset, booleans and epochs outside ``STRICT_EPOCH_RANGE``.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import logging
+import math
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 8192
+
+# 10**11 seconds is the year 5138, 10**11 milliseconds is March 1973
+EPOCH_MILLIS_THRESHOLD = 10 ** 11
+# 9999-12-31T23:59:59.999, the last instant ``datetime`` can represent
+MAX_EPOCH_MILLIS = 253402300799999
+# Strict mode only accepts 2000-01-01 <= t < 2100-01-01 (seconds)
+STRICT_EPOCH_RANGE = (946684800, 4102444800)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class TimestampError(ValueError):
+    """Raised when a timestamp is missing, malformed or (in strict mode) ambiguous.
+
+    ``row`` is the position of the offending value for column conversions.
+    """
+
+    def __init__(self, message: str, row: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.row = row
+
+
+def _epoch_millis(value: int | float, strict: bool) -> int:
+    if isinstance(value, bool):
+        if strict:
+            raise TimestampError(f"timestamp ambíguo: {value!r}")
+        value = int(value)
+    if isinstance(value, float) and not math.isfinite(value):
+        raise TimestampError(f"formato de timestamp inválido: {value!r}")
+
+    if abs(value) < EPOCH_MILLIS_THRESHOLD:
+        # Fractional seconds are truncated, as Layer 1 always did
+        millis = int(value) * 1000
+    else:
+        millis = int(value)
+    if abs(millis) > MAX_EPOCH_MILLIS:
+        raise TimestampError(f"timestamp fora do intervalo: {value!r}")
+    if strict and not STRICT_EPOCH_RANGE[0] * 1000 <= millis < STRICT_EPOCH_RANGE[1] * 1000:
+        raise TimestampError(f"timestamp ambíguo: {value!r}")
+    return millis
+
+
+def _millis_to_iso(millis: int) -> str:
+    moment = _EPOCH + timedelta(milliseconds=millis)
+    return moment.isoformat(timespec="milliseconds" if millis % 1000 else "seconds")
+
+
+def _parse_iso(value: str, strict: bool) -> str:
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        if strict:
+            raise TimestampError(f"formato de timestamp inválido: {value!r}") from None
+        logger.warning("timestamp não reconhecido mantido como recebido: %r", value)
+        return value
+    if strict and moment.tzinfo is None:
+        raise TimestampError(f"timestamp sem fuso horário: {value!r}")
+    return moment.isoformat()
+
+
+@lru_cache(maxsize=CACHE_SIZE, typed=True)
+def _normalize(value: Any, strict: bool) -> str:
+    if isinstance(value, (int, float)):
+        return _millis_to_iso(_epoch_millis(value, strict))
+    if value.isdigit():
+        return _millis_to_iso(_epoch_millis(int(value), strict))
+    return _parse_iso(value, strict)
+
+
+def normalize_timestamp(value: Any, strict: bool = False) -> str:
+    """Return the canonical ISO 8601 string for a raw message timestamp.
+
+    Epochs become UTC (``+00:00``), with milliseconds only when the input
+    had them; ISO strings keep their offset (or lack of one).
+    """
+    if value is None:
+        raise TimestampError("timestamp ausente")
+    if not isinstance(value, (int, float, str)):
+        raise TimestampError(f"formato de timestamp inválido: {value!r}")
+    return _normalize(value, strict)
+
+
+def normalize_epochs(values: Sequence[int | float] | np.ndarray, strict: bool = False) -> List[str]:
+    """Vectorized :func:`normalize_timestamp` for a column of epoch numbers.
+
+    Raises :class:`TimestampError` for the first rejected value, with its
+    position in ``values`` as ``row``.
+    """
+    array = np.asarray(values)
+    if array.size == 0:
+        return []
+    if strict and array.dtype.kind == "b":
+        raise TimestampError(f"timestamp ambíguo: {values[0]!r}", row=0)
+
+    numbers = array.astype(float)
+    bad = ~np.isfinite(numbers)
+    if bad.any():
+        row = int(np.argmax(bad))
+        raise TimestampError(f"formato de timestamp inválido: {values[row]!r}", row=row)
+
+    truncated = np.trunc(numbers)
+    millis = np.where(np.abs(numbers) < EPOCH_MILLIS_THRESHOLD, truncated * 1000, truncated)
+    bad, reason = np.abs(millis) > MAX_EPOCH_MILLIS, "timestamp fora do intervalo"
+    if strict and not bad.any():
+        low, high = STRICT_EPOCH_RANGE
+        bad, reason = (millis < low * 1000) | (millis >= high * 1000), "timestamp ambíguo"
+    if bad.any():
+        row = int(np.argmax(bad))
+        raise TimestampError(f"{reason}: {values[row]!r}", row=row)
+
+    millis = millis.astype(np.int64)
+    moments = millis.astype("datetime64[ms]")
+    whole = np.datetime_as_string(moments.astype("datetime64[s]"), unit="s")
+    result = [iso + "+00:00" for iso in whole.tolist()]
+    fractional = np.flatnonzero(millis % 1000)
+    if fractional.size:
+        precise = np.datetime_as_string(moments[fractional], unit="ms")
+        for row, iso in zip(fractional.tolist(), precise.tolist()):
+            result[row] = iso + "+00:00"
+    return result
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _date(timestamp: str) -> str:
+    try:
+        return datetime.fromisoformat(timestamp).strftime("%Y%m%d")
+    except ValueError:
+        raise TimestampError(f"timestamp inválido: {timestamp!r}") from None
+
+
+def timestamp_date(timestamp: str) -> str:
+    """Return the ``AAAAMMDD`` calendar day of an ISO timestamp, in its own offset."""
+    if not isinstance(timestamp, str):
+        raise TimestampError(f"timestamp inválido: {timestamp!r}")
+    return _date(timestamp)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _epoch(timestamp: str) -> float:
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise TimestampError(f"timestamp inválido: {timestamp!r}") from None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def timestamp_epoch(timestamp: str) -> float:
+    """Return an ISO timestamp as epoch seconds, reading naive values as UTC.
+
+    Unlike the strings themselves, these compare correctly across offsets.
+    """
+    if not isinstance(timestamp, str):
+        raise TimestampError(f"timestamp inválido: {timestamp!r}")
+    return _epoch(timestamp)
+
+
+def clear_cache() -> None:
+    """Drop every memoized timestamp."""
+    _normalize.cache_clear()
+    _date.cache_clear()
+    _epoch.cache_clear()
+
+
+def cache_info() -> dict:
+    """Hit/miss counters of the normalization, day and epoch caches."""
+    return {
+        "normalize": _normalize.cache_info()._asdict(),
+        "date": _date.cache_info()._asdict(),
+        "epoch": _epoch.cache_info()._asdict(),
+    }
+
+
+__all__ = [
+    "CACHE_SIZE",
+    "EPOCH_MILLIS_THRESHOLD",
+    "STRICT_EPOCH_RANGE",
+    "TimestampError",
+    "cache_info",
+    "clear_cache",
+    "normalize_epochs",
+    "normalize_timestamp",
+    "timestamp_date",
+    "timestamp_epoch",
+]
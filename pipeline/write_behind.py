@@ -0,0 +1,381 @@
+"""Write-behind buffer with group commit in front of SQLite.
+
+Producers hand formatted messages to :class:`WriteBehindQueue` and return
+immediately; a flusher thread writes them in batches, one transaction per
+batch, as soon as ``flush_size`` messages are waiting or ``flush_interval``
+seconds have passed since the oldest one arrived.  The buffer is bounded:
+when ``max_pending`` messages are waiting, :meth:`WriteBehindQueue.put_many`
+blocks (backpressure) or raises :class:`QueueFull` after its timeout.
+
+With ``log_path`` every accepted message is first appended (and fsynced)
+to a local JSON-lines log.  The log is truncated whenever everything in it
+has been written, and replayed on :meth:`WriteBehindQueue.start`, so
+messages acknowledged before a crash are written on the next run.  Batch
+writers must therefore be idempotent, which ``store_messages`` and Layer 2
+grouping are.  A batch whose write fails is retried in-process
+``max_retries`` times with exponential backoff; if it still fails it is
+counted as ``failed`` and, with a log, kept there (the log is rewritten to
+just those messages) so the next start retries it.  Without a log the
+ids of the dropped messages are logged as an error.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+BatchWriter = Callable[[List[Dict[str, Any]]], None]
+
+
+class QueueFull(Exception):
+    """Raised when the buffer stays full for longer than the put timeout."""
+
+
+class WriteBehindQueue:
+    """Bounded in-memory buffer flushed by a single writer thread.
+
+    Parameters
+    ----------
+    write_batch:
+        Called on the flusher thread with each batch; it should commit
+        the whole batch in one transaction.
+    flush_size:
+        Messages that trigger an immediate flush.
+    flush_interval:
+        Longest time, in seconds, a message waits for its batch to fill.
+    max_pending:
+        Buffered messages before producers are held back.
+    log_path:
+        Optional append-only log making accepted messages crash-safe.
+    on_start, on_stop:
+        Run on the flusher thread before the first and after the last
+        batch, e.g. to open and close a thread-bound SQLite connection.
+    max_retries:
+        Extra attempts for a batch whose write raised.
+    retry_backoff:
+        Seconds before the first retry, doubled for each later one.
+    """
+
+    def __init__(
+        self,
+        write_batch: BatchWriter,
+        flush_size: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+        log_path: Optional[str | Path] = None,
+        on_start: Optional[Callable[[], None]] = None,
+        on_stop: Optional[Callable[[], None]] = None,
+        max_retries: int = 3,
+        retry_backoff: float = 0.1,
+    ) -> None:
+        if flush_size < 1 or max_pending < flush_size:
+            raise ValueError("expected 1 <= flush_size <= max_pending")
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative")
+        self.write_batch = write_batch
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.log_path = Path(log_path) if log_path else None
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._oldest: Optional[float] = None
+        self._in_flight = 0
+        # Room promised to producers that are still appending to the log
+        self._reserved = 0
+        self._flush_requested = False
+        self._closing = False
+        self._cond = threading.Condition()
+        # Held while appending to (or truncating) the log and enqueuing, so
+        # the log never loses a line that is not yet in the buffer.
+        self._log_lock = threading.Lock()
+        self._log_file = None
+        # Lines appended since the log was last truncated or rewritten
+        self._log_dirty = False
+        # Messages given up on this run, kept in the log for the next start
+        self._log_failed: List[Dict[str, Any]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._start_error: Optional[BaseException] = None
+
+        self._metrics: Dict[str, float] = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "retries": 0,
+            "flushes": 0,
+            "replayed": 0,
+            "backpressure_waits": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> "WriteBehindQueue":
+        """Replay the log (if any) and start the flusher thread."""
+        if self.log_path is not None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            replay = self._read_log()
+            # Rewrite what was read so a torn last line cannot corrupt the next append
+            self._rewrite_log(replay)
+            self._log_dirty = bool(replay)
+            if replay:
+                with self._cond:
+                    self._pending.extend(replay)
+                    self._oldest = time.monotonic()
+                    self._metrics["replayed"] += len(replay)
+                logger.info("reaplicando %d mensagens do log de escrita", len(replay))
+
+        self._thread = threading.Thread(target=self._run, name="swai-write-behind", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+        return self
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write everything buffered, then stop the flusher thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def __enter__(self) -> "WriteBehindQueue":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    def put(self, message: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        """Buffer one message; see :meth:`put_many`."""
+        self.put_many([message], timeout)
+
+    def put_many(self, messages: Iterable[Dict[str, Any]], timeout: Optional[float] = None) -> None:
+        """Buffer messages for the next batch.
+
+        Blocks while the buffer is full; ``timeout`` (seconds, ``0`` for
+        no wait) bounds that wait and raises :class:`QueueFull`.  When
+        this returns the messages are accepted: logged if a log is
+        configured, and written by a later flush.
+        """
+        messages = list(messages)
+        if not messages:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("write-behind queue is closed")
+            if self._occupied() and self._occupied() + len(messages) > self.max_pending:
+                self._metrics["backpressure_waits"] += 1
+            # A request larger than the whole buffer only waits for it to empty
+            while self._occupied() and self._occupied() + len(messages) > self.max_pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise QueueFull(f"{len(self._pending)} mensagens aguardando gravação")
+                self._cond.wait(remaining)
+            # Checked and reserved under one lock: concurrent producers
+            # cannot both take the last free slots.
+            self._reserved += len(messages)
+
+        try:
+            with self._log_lock:
+                if self._log_file is not None:
+                    self._log_file.write(_log_lines(messages))
+                    self._log_file.flush()
+                    os.fsync(self._log_file.fileno())
+                    self._log_dirty = True
+                with self._cond:
+                    if not self._pending:
+                        self._oldest = time.monotonic()
+                    self._pending.extend(messages)
+                    self._metrics["enqueued"] += len(messages)
+                    self._metrics["max_depth"] = max(self._metrics["max_depth"], len(self._pending))
+        finally:
+            with self._cond:
+                self._reserved -= len(messages)
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything buffered now; return ``False`` on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._flush_requested = False
+        return True
+
+    def _occupied(self) -> int:
+        # Caller holds ``_cond``
+        return len(self._pending) + self._reserved
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    @property
+    def depth(self) -> int:
+        """Messages accepted but not yet written."""
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def metrics(self) -> Dict[str, float]:
+        """Queue depth, throughput counters and flush latency (ms)."""
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["depth"] = len(self._pending) + self._in_flight
+        flushes = metrics["flushes"]
+        metrics["avg_flush_ms"] = metrics.pop("total_flush_ms") / flushes if flushes else 0.0
+        metrics["avg_batch_size"] = (metrics["written"] + metrics["failed"]) / flushes if flushes else 0.0
+        return metrics
+
+    # ------------------------------------------------------------------
+    # Flusher thread
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        try:
+            if self.on_start is not None:
+                self.on_start()
+        except BaseException as exc:
+            self._start_error = exc
+            self._started.set()
+            return
+        self._started.set()
+
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._write(batch)
+        finally:
+            if self.on_stop is not None:
+                self.on_stop()
+
+    def _next_batch(self) -> Optional[List[Dict[str, Any]]]:
+        with self._cond:
+            while not self._pending and not self._closing:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            # Group commit: wait for a full batch or the oldest message's deadline
+            while (len(self._pending) < self.flush_size
+                   and not self._closing and not self._flush_requested):
+                remaining = self._oldest + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(self.flush_size, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(size)]
+            self._in_flight = size
+            self._oldest = time.monotonic() if self._pending else None
+            self._cond.notify_all()  # room for producers held back
+            return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                self.write_batch(batch)
+                failed = False
+                break
+            except Exception:
+                failed = True
+                if retries >= self.max_retries:
+                    logger.exception("falha ao gravar lote de %d mensagens", len(batch))
+                    break
+                delay = self.retry_backoff * 2 ** retries
+                retries += 1
+                logger.warning("falha ao gravar lote de %d mensagens, nova tentativa em %.2fs",
+                               len(batch), delay, exc_info=True)
+                time.sleep(delay)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if failed and self.log_path is None:
+            logger.error("mensagens descartadas: %s", ", ".join(str(m.get("message_id")) for m in batch))
+
+        with self._log_lock, self._cond:
+            self._in_flight = 0
+            self._metrics["failed" if failed else "written"] += len(batch)
+            self._metrics["retries"] += retries
+            self._metrics["flushes"] += 1
+            self._metrics["last_flush_ms"] = elapsed_ms
+            self._metrics["max_flush_ms"] = max(self._metrics["max_flush_ms"], elapsed_ms)
+            self._metrics["total_flush_ms"] += elapsed_ms
+            if failed and self._log_file is not None:
+                self._log_failed.extend(batch)
+            # Everything logged has been written or given up on: start the
+            # log over, keeping only the failed messages for the next start.
+            if self._log_file is not None and not self._pending and self._log_dirty:
+                if self._log_failed:
+                    self._rewrite_log(self._log_failed)
+                else:
+                    self._log_file.truncate(0)
+                    self._log_file.seek(0)
+                self._log_dirty = False
+            self._cond.notify_all()
+
+    def _rewrite_log(self, messages: List[Dict[str, Any]]) -> None:
+        """Atomically replace the log with ``messages`` and reopen it for appending.
+
+        Runs before the flusher starts or with ``_log_lock`` held.
+        """
+        if self._log_file is not None:
+            self._log_file.close()
+        tmp_path = self.log_path.with_name(self.log_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            f.write(_log_lines(messages))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_path)
+        self._log_file = self.log_path.open("a", encoding="utf-8")
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        if not self.log_path.exists():
+            return []
+        messages = []
+        with self.log_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    # Torn write from a crash mid-append: it was never acknowledged
+                    logger.warning("linha incompleta ignorada no log de escrita")
+        return messages
+
+
+def _log_lines(messages: Iterable[Dict[str, Any]]) -> str:
+    return "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in messages)
+
+
+__all__ = ["BatchWriter", "QueueFull", "WriteBehindQueue"]
@@ -0,0 +1,106 @@
+"""Benchmark the Layer 2 write path of :class:`SWAILiteManager`.
+
+Replays a synthetic day of WhatsApp traffic through
+``record_conversation_message`` and reports SQL statements and
+throughput per message, next to the previous six-statement
+implementation (kept here only as a baseline).
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from integrations.database.sqlite_manager import SWAILiteManager  # noqa: E402
+
+
+Event = Tuple[str, str, str, str, str]
+
+
+def _legacy_record(manager: SWAILiteManager, conversation_id: str, message_id: str,
+                   lead_phone: str, secretary_phone: str, timestamp: str) -> Dict:
+    conn = manager.conn
+    with conn:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO conversations (
+                conversation_id, lead_phone, secretary_phone, start_time, message_count, status
+            ) VALUES (?, ?, ?, ?, 0, 'active')
+            """,
+            (conversation_id, lead_phone, secretary_phone, timestamp),
+        )
+        row = conn.execute("SELECT * FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+        if row["status"] == "completed":
+            return dict(row)
+        if row["start_time"] > timestamp:
+            conn.execute("UPDATE conversations SET start_time = ? WHERE conversation_id = ?", (timestamp, conversation_id))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO conversation_messages (conversation_id, message_id) VALUES (?, ?)",
+            (conversation_id, message_id),
+        )
+        if cursor.rowcount:
+            conn.execute(
+                "UPDATE conversations SET message_count = message_count + 1 WHERE conversation_id = ?",
+                (conversation_id,),
+            )
+        row = conn.execute("SELECT * FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+    return dict(row)
+
+
+def _events(messages: int, leads: int) -> List[Event]:
+    events = []
+    for i in range(messages):
+        lead = f"55119{i % leads:08d}"
+        timestamp = f"2025-08-06T{8 + (i // leads) % 10:02d}:{i % 60:02d}:00"
+        events.append((f"{lead}_20250806", f"m{i}", lead, "5511900000000", timestamp))
+    return events
+
+
+def _run(name: str, record: Callable[..., Dict], events: List[Event]) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SWAILiteManager(str(Path(tmp) / "bench.sqlite"))
+        statements: List[str] = []
+        manager.conn.set_trace_callback(statements.append)
+
+        start = time.perf_counter()
+        for event in events:
+            record(manager, *event)
+        elapsed = time.perf_counter() - start
+
+        manager.conn.set_trace_callback(None)
+        manager.close()
+
+    data_statements = [s for s in statements if not s.lstrip().upper().startswith(("BEGIN", "COMMIT"))]
+    result = {
+        "statements_per_message": len(data_statements) / len(events),
+        "messages_per_second": len(events) / elapsed,
+    }
+    print(
+        f"{name:<8} {result['statements_per_message']:5.2f} statements/msg "
+        f"{result['messages_per_second']:10.0f} msg/s"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000, help="Mensagens simuladas")
+    parser.add_argument("--leads", type=int, default=500, help="Leads distintos no dia")
+    args = parser.parse_args()
+
+    events = _events(args.messages, args.leads)
+    legacy = _run("legacy", _legacy_record, events)
+    current = _run("upsert", SWAILiteManager.record_conversation_message, events)
+    print(f"speedup  {current['messages_per_second'] / legacy['messages_per_second']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark the per-``chat_type`` metrics kernel of :mod:`modules.metrics`.
+
+Builds a synthetic features frame and times ``calculate_basic_metrics``
+(``metrics_from_totals(chat_type_totals(df))``),
+``utils.get_summary_stats`` and ``utils.calculate_opportunity_cost``
+next to the previous boolean-mask implementations (kept here only as a
+baseline).
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from modules.metrics import METRIC_COLUMNS, TYPE_AVERAGES, chat_type_totals, metrics_from_totals  # noqa: E402
+from modules.utils import calculate_opportunity_cost, get_summary_stats  # noqa: E402
+
+
+def _legacy_basic_metrics(df: pd.DataFrame) -> Dict:
+    total = len(df)
+    success_df = df[df['chat_type'] == 'success']
+    fail_df = df[df['chat_type'] == 'fail']
+    summary = {
+        'total_conversations': total,
+        'success_count': len(success_df),
+        'fail_count': len(fail_df),
+        'success_rate': len(success_df) / total if total else 0,
+        'failure_rate': len(fail_df) / total if total else 0,
+        'avg_duration': df['duration_minutes'].mean(),
+        'avg_messages': df['total_messages'].mean(),
+        'avg_secretary_messages': df['secretary_messages'].mean(),
+        'avg_patient_messages': df['patient_messages'].mean(),
+    }
+    per_type = [
+        {name: part[column].mean() for name, column in TYPE_AVERAGES.items()} if not part.empty else {}
+        for part in (success_df, fail_df)
+    ]
+    return {'summary': summary, 'success_metrics': per_type[0], 'fail_metrics': per_type[1]}
+
+
+def _legacy_summary_stats(df: pd.DataFrame) -> Dict:
+    stats = {
+        'total_conversations': len(df),
+        'success_conversations': len(df[df['chat_type'] == 'success']),
+        'fail_conversations': len(df[df['chat_type'] == 'fail']),
+        'avg_duration': df['duration_minutes'].mean(),
+        'avg_messages': df['total_messages'].mean(),
+        'avg_secretary_messages': df['secretary_messages'].mean(),
+        'avg_patient_messages': df['patient_messages'].mean(),
+    }
+    success_df = df[df['chat_type'] == 'success']
+    fail_df = df[df['chat_type'] == 'fail']
+    if not success_df.empty and not fail_df.empty:
+        stats['success_avg_duration'] = success_df['duration_minutes'].mean()
+        stats['fail_avg_duration'] = fail_df['duration_minutes'].mean()
+        stats['success_avg_messages'] = success_df['total_messages'].mean()
+        stats['fail_avg_messages'] = fail_df['total_messages'].mean()
+    return stats
+
+
+def _legacy_opportunity_cost(df: pd.DataFrame) -> Dict:
+    success_count = df[df['chat_type'] == 'success'].shape[0]
+    fail_count = df[df['chat_type'] == 'fail'].shape[0]
+    return {'success_count': success_count, 'fail_count': fail_count}
+
+
+def _features(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {column: rng.integers(0, 60, rows).astype(float) for column in METRIC_COLUMNS}
+    data['duration_minutes'][rng.random(rows) < 0.05] = np.nan
+    data['chat_type'] = rng.choice(['success', 'fail'], rows)
+    return pd.DataFrame(data)
+
+
+def _time(function: Callable[[pd.DataFrame], object], df: pd.DataFrame, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(df)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Conversas simuladas")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições (melhor tempo)")
+    args = parser.parse_args()
+
+    cases: List = [
+        ("basic_metrics", _legacy_basic_metrics, lambda df: metrics_from_totals(chat_type_totals(df))),
+        ("summary_stats", _legacy_summary_stats, get_summary_stats),
+        ("opportunity_cost", _legacy_opportunity_cost, calculate_opportunity_cost),
+    ]
+    for rows in args.rows:
+        df = _features(rows)
+        for name, legacy, current in cases:
+            before = _time(legacy, df, args.repeat)
+            after = _time(current, df, args.repeat)
+            print(f"{rows:>9} {name:<17} {before:8.1f} -> {after:8.1f} ms  ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
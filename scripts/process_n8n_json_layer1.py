@@ -1,52 +1,338 @@
 """Process N8N exported JSON files applying Layer 1 formatting.
 
-This script iterates over a directory containing JSON payloads captured
-by the N8N webhook.  Each payload is expected to have the same
-structure used by the production webhook where the message data resides
-under the ``data`` key.  The formatted messages are stored in a SQLite
-database using :class:`SWAILiteManager`.
+This script reads JSON payloads captured by the N8N webhook.  Each
+payload is expected to have the same structure used by the production
+webhook where the message data resides under the ``data`` key.  The
+formatted messages are stored in a SQLite database using
+:class:`SWAILiteManager`.
+
+Payloads may come one per ``*.json`` file or as newline-delimited JSON
+streams (``*.jsonl``/``*.ndjson``, optionally gzip-compressed), one
+payload per line.  Streams are read lazily line by line, so an export of
+millions of messages never has to be held in memory or split into
+millions of files.  ``orjson`` is used for decoding when installed.
+
+With ``--workers N`` (N > 1) decoding and formatting run in a pool of N
+processes, one chunk of ``--batch-size`` payloads per task, while a
+single writer thread stores the formatted chunks in order.
 """
 
 from __future__ import annotations
 
 import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import gzip
+from itertools import islice
 import json
 import logging
 from pathlib import Path
-from typing import Any, Dict
+import queue
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
 
-from integrations.database.sqlite_manager import SWAILiteManager
+from integrations.database.sqlite_manager import IGNORED, SWAILiteManager
 from pipeline.layer1_formatter import Layer1FormatError, format_message
 
 
 logger = logging.getLogger(__name__)
 
+JSON_SUFFIXES = (".json",)
+STREAM_SUFFIXES = (".jsonl", ".ndjson", ".jsonl.gz", ".ndjson.gz")
 
-def _load_json(path: Path) -> Dict[str, Any]:
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+# (label, raw bytes) read from a file or a stream line; label is
+# ``arquivo.json`` or ``arquivo.jsonl:<linha>``
+RawRecord = Tuple[str, bytes]
+# (label, formatted message or None, error message or None)
+FormattedRecord = Tuple[str, Optional[Dict[str, Any]], Optional[str]]
 
 
-def process_directory(directory: Path, db_path: Path, force: bool = False) -> None:
-    manager = SWAILiteManager(str(db_path))
-    for file_path in sorted(directory.glob("*.json")):
+def json_loads(backend: str = "auto") -> Callable[[bytes], Any]:
+    """Return the JSON decoder for ``backend`` (``auto``, ``json`` or ``orjson``)."""
+    if backend == "json" or (backend == "auto" and orjson is None):
+        return json.loads
+    if orjson is None:
+        raise RuntimeError("orjson não está instalado")
+    return orjson.loads
+
+
+def is_stream(path: Path) -> bool:
+    """Return ``True`` for newline-delimited JSON files (plain or gzip)."""
+    return path.name.lower().endswith(STREAM_SUFFIXES)
+
+
+def iter_stream(path: Path) -> Iterator[RawRecord]:
+    """Yield each non-blank line of a JSONL file, decompressing ``.gz``."""
+    opener = gzip.open if path.suffix.lower() == ".gz" else open
+    with opener(path, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                yield f"{path.name}:{line_number}", line
+
+
+def iter_source(source: Path) -> Iterator[RawRecord]:
+    """Yield raw payloads from a JSON/JSONL file or a directory of them.
+
+    In a directory, ``*.json`` files come first (sorted by name),
+    followed by the lines of each JSONL stream.
+    """
+    if not source.is_dir():
+        if is_stream(source):
+            yield from iter_stream(source)
+        else:
+            yield source.name, source.read_bytes()
+        return
+
+    files = sorted(p for p in source.iterdir() if p.is_file())
+    for path in files:
+        if path.suffix.lower() in JSON_SUFFIXES:
+            yield path.name, path.read_bytes()
+    for path in files:
+        if is_stream(path):
+            yield from iter_stream(path)
+
+
+def format_record(raw: bytes, loads: Callable[[bytes], Any] = json.loads, strict: bool = False) -> Dict[str, Any]:
+    """Decode one webhook payload and apply Layer 1 formatting."""
+    payload = loads(raw)
+    if not isinstance(payload, dict) or "data" not in payload:
+        raise Layer1FormatError("campo 'data' ausente")
+    return format_message(payload["data"], strict=strict)
+
+
+def format_chunk(chunk: List[RawRecord], json_backend: str = "auto", strict: bool = False) -> List[FormattedRecord]:
+    """Decode and format a chunk of payloads; runs in the worker processes."""
+    loads = json_loads(json_backend)
+    results: List[FormattedRecord] = []
+    for label, raw in chunk:
         try:
-            payload = _load_json(file_path)
-            if "data" not in payload:
-                raise Layer1FormatError("campo 'data' ausente")
-            formatted = format_message(payload["data"])
-            row_id = manager.store_message(formatted, overwrite=force)
-            if row_id:
-                msg = f"✅ processado: {file_path.name} → ID: {row_id}"
-            else:
-                msg = f"⚠️ já existente: {file_path.name}"
-            logger.info(msg)
-            print(msg)
+            results.append((label, format_record(raw, loads, strict), None))
+        except Exception as exc:
+            results.append((label, None, str(exc)))
+    return results
+
+
+def _chunks(records: Iterable[RawRecord], size: int) -> Iterator[List[RawRecord]]:
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _report(msg: str, error: bool = False) -> None:
+    if error:
+        logger.error(msg)
+    else:
+        logger.info(msg)
+    print(msg)
+
+
+def _new_summary() -> Dict[str, int]:
+    return {"processed": 0, "duplicates": 0, "errors": 0}
+
+
+def _store_batch(
+    manager: SWAILiteManager,
+    batch: List[Tuple[str, Dict[str, Any]]],
+    force: bool,
+    summary: Dict[str, int],
+    quiet: bool = False,
+) -> None:
+    try:
+        outcomes = manager.store_messages([formatted for _, formatted in batch], overwrite=force)
+    except Exception as exc:  # pragma: no cover - log path
+        # The batch transaction was rolled back: none of its records were stored
+        summary["errors"] += len(batch)
+        for label, _ in batch:
+            _report(f"❌ erro ao processar {label}: {exc}", error=True)
+        return
+    for (label, _), outcome in zip(batch, outcomes):
+        if outcome.status == IGNORED:
+            summary["duplicates"] += 1
+            if not quiet:
+                _report(f"⚠️ já existente: {label}")
+        else:
+            summary["processed"] += 1
+            if not quiet:
+                _report(f"✅ processado: {label} → ID: {outcome.row_id}")
+
+
+def process_records(
+    records: Iterator[RawRecord],
+    manager: SWAILiteManager,
+    force: bool = False,
+    batch_size: int = 500,
+    loads: Callable[[bytes], Any] = json.loads,
+    quiet: bool = False,
+    strict: bool = False,
+) -> Dict[str, int]:
+    """Format raw payloads and store them ``batch_size`` per transaction.
+
+    Returns counts of ``processed``, ``duplicates`` and ``errors``.
+    """
+    summary = _new_summary()
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+    for label, raw in records:
+        try:
+            batch.append((label, format_record(raw, loads, strict)))
         except Exception as exc:  # pragma: no cover - log path
-            err = f"❌ erro ao processar {file_path.name}: {exc}"
-            logger.error(err)
-            print(err)
-    manager.close()
+            summary["errors"] += 1
+            _report(f"❌ erro ao processar {label}: {exc}", error=True)
+            continue
+        if len(batch) >= batch_size:
+            _store_batch(manager, batch, force, summary, quiet)
+            batch = []
+    if batch:
+        _store_batch(manager, batch, force, summary, quiet)
+    return summary
+
+
+class _BatchWriter(threading.Thread):
+    """Single thread owning the SQLite connection in pipelined mode.
+
+    It is also the only thread updating ``summary``: each queued item
+    carries a formatted batch and the ``(label, error)`` pairs of the
+    records that failed to format.  ``ready`` is set once the database
+    is open, or ``error`` holds why it could not be.
+    """
+
+    def __init__(self, db_path: Path, force: bool, summary: Dict[str, int], quiet: bool, max_batches: int) -> None:
+        super().__init__(name="layer1-writer", daemon=True)
+        self.db_path = db_path
+        self.force = force
+        self.summary = summary
+        self.quiet = quiet
+        self.batches: "queue.Queue[Optional[Tuple[List[Tuple[str, Dict[str, Any]]], List[Tuple[str, str]]]]]" = (
+            queue.Queue(max_batches)
+        )
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        try:
+            manager = SWAILiteManager(str(self.db_path))
+        except Exception as exc:
+            self.error = exc
+            return
+        finally:
+            self.ready.set()
+        try:
+            while True:
+                item = self.batches.get()
+                if item is None:
+                    break
+                batch, failures = item
+                for label, error in failures:
+                    self.summary["errors"] += 1
+                    _report(f"❌ erro ao processar {label}: {error}", error=True)
+                if batch:
+                    _store_batch(manager, batch, self.force, self.summary, self.quiet)
+        finally:
+            manager.close()
+
+
+def process_records_parallel(
+    records: Iterable[RawRecord],
+    db_path: Path,
+    force: bool = False,
+    batch_size: int = 500,
+    workers: int = 2,
+    json_backend: str = "auto",
+    quiet: bool = False,
+    strict: bool = False,
+) -> Dict[str, int]:
+    """Pipelined :func:`process_records`: ``workers`` processes decode and
+    format chunks of ``batch_size`` payloads while one thread stores them.
+
+    Chunks are stored in input order, so duplicates are resolved exactly
+    as in the serial mode.  At most ``2 * workers`` chunks are in flight.
+    """
+    json_loads(json_backend)  # fail fast on a missing backend
+    summary = _new_summary()
+    writer = _BatchWriter(db_path, force, summary, quiet, max_batches=2 * workers)
+    writer.start()
+    # Fail before decoding anything when the database cannot be opened
+    writer.ready.wait()
+    if writer.error is not None:
+        writer.join()
+        raise writer.error
+
+    def collect(future: "Future[List[FormattedRecord]]") -> None:
+        batch, failures = [], []
+        for label, formatted, error in future.result():
+            if formatted is None:
+                failures.append((label, error))
+            else:
+                batch.append((label, formatted))
+        writer.batches.put((batch, failures))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending: Deque["Future[List[FormattedRecord]]"] = deque()
+            for chunk in _chunks(records, batch_size):
+                pending.append(pool.submit(format_chunk, chunk, json_backend, strict))
+                if len(pending) >= 2 * workers:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        writer.batches.put(None)
+        writer.join()
+    return summary
+
+
+def format_summary(summary: Dict[str, int], elapsed: float) -> str:
+    """One-line report of counts and throughput for the end of a run."""
+    total = sum(summary.values())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    return (
+        f"📊 {summary['processed']} processadas, {summary['duplicates']} já existentes, "
+        f"{summary['errors']} erros — {total} registros em {elapsed:.2f}s ({rate:.0f} msg/s)"
+    )
+
+
+def process_source(
+    source: Path,
+    db_path: Path,
+    force: bool = False,
+    batch_size: int = 500,
+    json_backend: str = "auto",
+    quiet: bool = False,
+    workers: int = 1,
+    strict_timestamps: bool = False,
+) -> Dict[str, int]:
+    """Format and store every payload in a JSON/JSONL file or directory.
+
+    ``workers > 1`` switches to :func:`process_records_parallel`;
+    ``strict_timestamps`` rejects ambiguous or unparseable timestamps.
+    """
+    if workers > 1:
+        return process_records_parallel(
+            iter_source(source), db_path, force, batch_size, workers, json_backend, quiet, strict_timestamps
+        )
+    loads = json_loads(json_backend)
+    manager = SWAILiteManager(str(db_path))
+    try:
+        return process_records(iter_source(source), manager, force, batch_size, loads, quiet, strict_timestamps)
+    finally:
+        manager.close()
+
+
+def process_directory(directory: Path, db_path: Path, force: bool = False, batch_size: int = 500) -> Dict[str, int]:
+    """Format every JSON payload in ``directory`` and store it.
+
+    Messages are written ``batch_size`` at a time, each batch in a
+    single transaction.
+    """
+    return process_source(directory, db_path, force=force, batch_size=batch_size)
 
 
 def main() -> None:
@@ -55,7 +341,7 @@ def main() -> None:
         "directory",
         nargs="?",
         default="data/n8n_exports",
-        help="Diretório com os arquivos JSON exportados pelo N8N",
+        help="Diretório com os arquivos JSON exportados pelo N8N, ou um arquivo JSONL (.jsonl/.jsonl.gz)",
     )
     parser.add_argument(
         "--db",
@@ -67,10 +353,51 @@ def main() -> None:
         action="store_true",
         help="Reprocessa mensagens já inseridas",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Mensagens gravadas por transação",
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=["auto", "json", "orjson"],
+        default="auto",
+        help="Decodificador JSON (auto usa orjson quando instalado)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processos que decodificam e formatam em paralelo (1 = sequencial)",
+    )
+    parser.add_argument(
+        "--strict-timestamps",
+        action="store_true",
+        help="Rejeita timestamps ambíguos ou inválidos em vez de gravá-los como vieram",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Mostra apenas erros e o resumo final",
+    )
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers deve ser pelo menos 1")
 
     logging.basicConfig(level=logging.INFO, format="%(message)s")
-    process_directory(Path(args.directory), Path(args.db), force=args.force)
+    started = time.perf_counter()
+    summary = process_source(
+        Path(args.directory),
+        Path(args.db),
+        force=args.force,
+        batch_size=args.batch_size,
+        json_backend=args.json_backend,
+        quiet=args.quiet,
+        workers=args.workers,
+        strict_timestamps=args.strict_timestamps,
+    )
+    print(format_summary(summary, time.perf_counter() - started))
 
 
 if __name__ == "__main__":
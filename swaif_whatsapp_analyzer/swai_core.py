@@ -7,13 +7,27 @@ Implementa a análise principal de conversas seguindo os princípios SWAI
 """
 
 import pandas as pd
+import numpy as np
 import json
-import re
+import sys
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import logging
 
+# Pacotes compartilhados (modules, pipeline) ficam na raiz do repositório
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from modules.batch_extraction import find_chat_files, map_chat_files
+from modules.chat_parser import ParsedChat, parse_chat_text
+from modules.feature_manifest import config_digest, incremental_extract, manifest_path_for
+from modules.feature_store import DEFAULT_CLINIC, load_features, save_features
+from modules.keyword_matcher import KeywordAutomaton
+from modules.metrics import chat_type_totals, metrics_from_totals
+from modules.rollups import RollupStore
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,17 +43,28 @@ class SWAIAnalyzer:
         self.agendamento_keywords = settings.get("AGENDAMENTO_KEYWORDS", [])
         self.preco_keywords = settings.get("PRECO_KEYWORDS", [])
         
-    def load_conversation_data(self) -> Optional[pd.DataFrame]:
+    def load_conversation_data(self, columns: Optional[List[str]] = None,
+                               filters: Optional[List[Tuple]] = None) -> Optional[pd.DataFrame]:
         """
-        Carrega dados das conversas processadas
+        Carrega dados das conversas processadas do feature store (Parquet),
+        com fallback para o CSV legado
+        
+        Args:
+            columns (List[str], optional): Colunas a carregar (None = todas)
+            filters (List[Tuple], optional): Filtros ``(coluna, op, valor)``
+                aplicados na leitura, ex.: ``[("month", ">=", "2025-01")]``
         
         Returns:
             pd.DataFrame: Dados carregados ou None se não encontrar
         """
         try:
-            csv_path = self.settings.get("FEATURES_CSV")
-            if csv_path and Path(csv_path).exists():
-                df = pd.read_csv(csv_path)
+            df = load_features(
+                self.settings.get("FEATURE_STORE_DIR"),
+                self.settings.get("FEATURES_CSV"),
+                columns=columns,
+                filters=filters,
+            )
+            if df is not None:
                 logger.info(f"✅ Dados carregados: {len(df)} conversas")
                 return df
             else:
@@ -49,6 +74,51 @@ class SWAIAnalyzer:
             logger.error(f"Erro ao carregar dados: {e}")
             return None
     
+    def save_conversation_data(self, df: pd.DataFrame) -> str:
+        """
+        Grava as features no feature store, substituindo a clínica configurada
+        
+        Args:
+            df (pd.DataFrame): Features extraídas
+            
+        Returns:
+            str: Caminho onde os dados foram gravados
+        """
+        path = save_features(
+            df,
+            self.settings.get("FEATURE_STORE_DIR"),
+            self.settings.get("FEATURES_CSV"),
+            clinic=self.settings.get("CLINIC_ID", DEFAULT_CLINIC),
+        )
+        rollup_db = self.settings.get("ROLLUP_DB")
+        if rollup_db:
+            with RollupStore(rollup_db) as store:
+                changes = store.sync(df)
+            logger.info(f"📊 Agregados atualizados: {changes}")
+        return path
+    
+    def calculate_range_metrics(self, start: Optional[str] = None, end: Optional[str] = None,
+                                secretary: Optional[str] = None) -> Dict:
+        """
+        Métricas básicas de um período a partir dos agregados diários/semanais
+        
+        Mesmo formato de ``calculate_basic_metrics``, sem reler as conversas:
+        o custo depende do número de dias do período, não do de conversas.
+        
+        Args:
+            start (str, optional): Primeiro dia (``AAAA-MM-DD``); None = desde o início
+            end (str, optional): Último dia, inclusivo; None = até o fim
+            secretary (str, optional): Filtra pela secretária (``secretary_name``)
+            
+        Returns:
+            Dict: Métricas calculadas ({} se não houver agregados)
+        """
+        rollup_db = self.settings.get("ROLLUP_DB")
+        if not rollup_db or not Path(rollup_db).exists():
+            return {}
+        with RollupStore(rollup_db) as store:
+            return store.basic_metrics(start, end, secretary)
+    
     def calculate_basic_metrics(self, df: pd.DataFrame) -> Dict:
         """
         Calcula métricas básicas das conversas
@@ -62,65 +132,8 @@ class SWAIAnalyzer:
         if df is None or df.empty:
             return {}
         
-        # Contadores básicos
-        total_conversations = len(df)
-        success_count = len(df[df['chat_type'] == 'success'])
-        fail_count = len(df[df['chat_type'] == 'fail'])
-        
-        # Taxas
-        success_rate = success_count / total_conversations if total_conversations > 0 else 0
-        failure_rate = fail_count / total_conversations if total_conversations > 0 else 0
-        
-        # Médias gerais
-        avg_duration = df['duration_minutes'].mean()
-        avg_messages = df['total_messages'].mean()
-        avg_secretary_messages = df['secretary_messages'].mean()
-        avg_patient_messages = df['patient_messages'].mean()
-        
-        # Médias por tipo
-        success_df = df[df['chat_type'] == 'success']
-        fail_df = df[df['chat_type'] == 'fail']
-        
-        success_metrics = {}
-        fail_metrics = {}
-        
-        if not success_df.empty:
-            success_metrics = {
-                'avg_duration': success_df['duration_minutes'].mean(),
-                'avg_messages': success_df['total_messages'].mean(),
-                'avg_secretary_messages': success_df['secretary_messages'].mean(),
-                'avg_patient_messages': success_df['patient_messages'].mean(),
-                'avg_interactions': success_df['num_interactions'].mean(),
-                'avg_agendamento_keywords': success_df['agendamento_keywords'].mean(),
-                'avg_preco_keywords': success_df['preco_keywords'].mean()
-            }
-        
-        if not fail_df.empty:
-            fail_metrics = {
-                'avg_duration': fail_df['duration_minutes'].mean(),
-                'avg_messages': fail_df['total_messages'].mean(),
-                'avg_secretary_messages': fail_df['secretary_messages'].mean(),
-                'avg_patient_messages': fail_df['patient_messages'].mean(),
-                'avg_interactions': fail_df['num_interactions'].mean(),
-                'avg_agendamento_keywords': fail_df['agendamento_keywords'].mean(),
-                'avg_preco_keywords': fail_df['preco_keywords'].mean()
-            }
-        
-        return {
-            'summary': {
-                'total_conversations': total_conversations,
-                'success_count': success_count,
-                'fail_count': fail_count,
-                'success_rate': success_rate,
-                'failure_rate': failure_rate,
-                'avg_duration': avg_duration,
-                'avg_messages': avg_messages,
-                'avg_secretary_messages': avg_secretary_messages,
-                'avg_patient_messages': avg_patient_messages
-            },
-            'success_metrics': success_metrics,
-            'fail_metrics': fail_metrics
-        }
+        # Totais por tipo em uma única passada (groupby), compartilhados com os agregados
+        return metrics_from_totals(chat_type_totals(df))
     
     def calculate_opportunity_cost(self, metrics: Dict, financial_config: Dict) -> Dict:
         """
@@ -275,6 +288,7 @@ class SWAIConversationExtractor:
         self.settings = settings
         self.agendamento_keywords = settings.get("AGENDAMENTO_KEYWORDS", [])
         self.preco_keywords = settings.get("PRECO_KEYWORDS", [])
+        self.keyword_matcher = KeywordAutomaton.from_settings(settings)
     
     def extract_features_from_file(self, file_path: str, chat_type: str) -> Dict:
         """
@@ -291,96 +305,81 @@ class SWAIConversationExtractor:
             with open(file_path, 'r', encoding='utf-8') as file:
                 content = file.read()
             
-            return self._analyze_conversation_content(content, chat_type)
+            return self._analyze_conversation_content(content, chat_type, Path(file_path).parent.name)
             
         except Exception as e:
             logger.error(f"Erro ao processar {file_path}: {e}")
             return {}
     
-    def _analyze_conversation_content(self, content: str, chat_type: str) -> Dict:
+    def _analyze_conversation_content(self, content: str, chat_type: str, chat_name: str = "") -> Dict:
         """
         Analisa o conteúdo da conversa e extrai features
         
         Args:
             content (str): Conteúdo da conversa
             chat_type (str): Tipo da conversa
+            chat_name (str): Nome da conversa (pasta do export)
             
         Returns:
             Dict: Features extraídas
         """
-        lines = content.strip().split('\n')
-        
-        # Extração de mensagens
-        messages = []
-        for line in lines:
-            # Regex para capturar mensagens do WhatsApp
-            # Formato: [DD/MM/AAAA, HH:MM:SS] Nome: Mensagem
-            match = re.match(r'\[(\d{2}/\d{2}/\d{4}), (\d{2}:\d{2}:\d{2})\] ([^:]+): (.+)', line)
-            if match:
-                date_str, time_str, sender, message = match.groups()
-                messages.append({
-                    'datetime': f"{date_str} {time_str}",
-                    'sender': sender.strip(),
-                    'message': message.strip()
-                })
+        return self._analyze_parsed_chat(parse_chat_text(content), chat_type, chat_name)
+    
+    def _analyze_parsed_chat(self, chat: ParsedChat, chat_type: str, chat_name: str = "") -> Dict:
+        """
+        Calcula as features a partir das colunas do parser compartilhado
         
-        if not messages:
+        Args:
+            chat (ParsedChat): Conversa já parseada
+            chat_type (str): Tipo da conversa
+            chat_name (str): Nome da conversa (pasta do export)
+            
+        Returns:
+            Dict: Features extraídas
+        """
+        total_messages = len(chat)
+        if not total_messages:
             return {}
         
-        # Features básicas
-        total_messages = len(messages)
-        
-        # Identificar secretária (assume que é quem mais manda mensagens ou primeiro nome)
-        senders = [msg['sender'] for msg in messages]
-        sender_counts = {}
-        for sender in senders:
-            sender_counts[sender] = sender_counts.get(sender, 0) + 1
+        codes = chat.sender_codes
         
-        # Secretária = quem mais manda mensagens
-        secretary_name = max(sender_counts, key=sender_counts.get) if sender_counts else ""
+        # Secretária = quem mais manda mensagens (empate: quem apareceu primeiro)
+        secretary_code = int(np.bincount(codes).argmax())
+        secretary_name = chat.senders[secretary_code]
+        is_secretary = codes == secretary_code
         
-        secretary_messages = sum(1 for msg in messages if msg['sender'] == secretary_name)
+        secretary_messages = int(is_secretary.sum())
         patient_messages = total_messages - secretary_messages
         
         # Análise temporal
-        try:
-            first_time = datetime.strptime(messages[0]['datetime'], '%d/%m/%Y %H:%M:%S')
-            last_time = datetime.strptime(messages[-1]['datetime'], '%d/%m/%Y %H:%M:%S')
-            duration_minutes = (last_time - first_time).total_seconds() / 60
-        except:
-            duration_minutes = 0
-        
-        # Contagem de interações (mudanças de remetente)
-        interactions = 0
-        last_sender = ""
-        for msg in messages:
-            if msg['sender'] != last_sender:
-                interactions += 1
-                last_sender = msg['sender']
+        duration_minutes = float(chat.timestamps[-1] - chat.timestamps[0]) / 60
         
-        # Análise de conteúdo
-        full_text = " ".join([msg['message'].lower() for msg in messages])
+        # Contagem de interações (mudanças de remetente, incluindo a primeira mensagem)
+        interactions = int(np.count_nonzero(codes[1:] != codes[:-1])) + 1
         
-        agendamento_count = sum(1 for keyword in self.agendamento_keywords 
-                               if keyword.lower() in full_text)
+        # Análise de conteúdo
+        messages = chat.messages()
+        lowered = [message.lower() for message in messages]
+        full_text = " ".join(lowered)
         
-        preco_count = sum(1 for keyword in self.preco_keywords 
-                         if keyword.lower() in full_text)
+        # Palavras-chave distintas presentes, por família, em uma única varredura
+        keyword_presence = self.keyword_matcher.distinct(full_text)
+        agendamento_count = keyword_presence["agendamento"]
+        preco_count = keyword_presence["preco"]
         
         # Contagem de perguntas (aproximada)
-        patient_questions = sum(1 for msg in messages 
-                               if msg['sender'] != secretary_name and '?' in msg['message'])
-        
-        secretary_questions = sum(1 for msg in messages 
-                                 if msg['sender'] == secretary_name and '?' in msg['message'])
+        has_question = np.fromiter(('?' in message for message in messages), dtype=bool, count=total_messages)
+        secretary_questions = int((has_question & is_secretary).sum())
+        patient_questions = int(has_question.sum()) - secretary_questions
         
         # Contagem de mensagens de áudio/mídia
-        audio_messages = sum(1 for msg in messages 
-                            if any(term in msg['message'].lower() for term in ['áudio', 'audio', '<mídia', 'media']))
+        audio_messages = sum(1 for message in lowered 
+                            if any(term in message for term in ['áudio', 'audio', '<mídia', 'media']))
         
         return {
-            'chat_name': Path(file_path).parent.name,
+            'chat_name': chat_name,
             'chat_type': chat_type,
+            'start_time': str(np.datetime64(int(chat.timestamps[0]), 's')),
             'duration_minutes': duration_minutes,
             'total_messages': total_messages,
             'secretary_messages': secretary_messages,
@@ -394,36 +393,58 @@ class SWAIConversationExtractor:
             'secretary_name': secretary_name
         }
     
-    def process_all_conversations(self) -> pd.DataFrame:
+    def manifest_path(self) -> Path:
+        """Caminho do manifesto usado no reprocessamento incremental"""
+        manifest = self.settings.get("FEATURES_MANIFEST")
+        if manifest:
+            return Path(manifest)
+        return manifest_path_for(self.settings.get("FEATURES_CSV", "extracted_features.csv"))
+    
+    def extractor_config(self) -> str:
+        """Digest das configurações que mudam as features (palavras-chave)"""
+        return config_digest({
+            "AGENDAMENTO_KEYWORDS": list(self.settings.get("AGENDAMENTO_KEYWORDS", [])),
+            "PRECO_KEYWORDS": list(self.settings.get("PRECO_KEYWORDS", [])),
+        })
+    
+    def process_all_conversations(self, workers: Optional[int] = None, chunksize: Optional[int] = None,
+                                  incremental: bool = False) -> pd.DataFrame:
         """
         Processa todas as conversas nas pastas success_cases e fail_cases
         
+        Args:
+            workers (int, optional): Número de processos paralelos. None usa
+                EXTRACTION_WORKERS das configurações; 0 usa todos os núcleos.
+            chunksize (int, optional): Conversas enviadas por lote a cada processo
+            incremental (bool): Reextrai apenas conversas novas ou alteradas,
+                usando o manifesto salvo ao lado de FEATURES_CSV
+            
         Returns:
             pd.DataFrame: DataFrame com features extraídas
         """
-        all_features = []
-        
-        # Processar casos de sucesso
-        success_dir = Path(self.settings.get("SUCCESS_CASES_DIR", ""))
-        if success_dir.exists():
-            for conversation_dir in success_dir.iterdir():
-                if conversation_dir.is_dir():
-                    chat_file = conversation_dir / "_chat.txt"
-                    if chat_file.exists():
-                        features = self.extract_features_from_file(str(chat_file), "success")
-                        if features:
-                            all_features.append(features)
-        
-        # Processar casos de falha
-        fail_dir = Path(self.settings.get("FAIL_CASES_DIR", ""))
-        if fail_dir.exists():
-            for conversation_dir in fail_dir.iterdir():
-                if conversation_dir.is_dir():
-                    chat_file = conversation_dir / "_chat.txt"
-                    if chat_file.exists():
-                        features = self.extract_features_from_file(str(chat_file), "fail")
-                        if features:
-                            all_features.append(features)
+        if workers is None:
+            workers = self.settings.get("EXTRACTION_WORKERS", 1)
+        if chunksize is None:
+            chunksize = self.settings.get("EXTRACTION_CHUNKSIZE")
+        
+        tasks = find_chat_files({
+            "success": self.settings.get("SUCCESS_CASES_DIR", ""),
+            "fail": self.settings.get("FAIL_CASES_DIR", ""),
+        })
+        
+        if incremental:
+            all_features, stats = incremental_extract(
+                self.extract_features_from_file, tasks, self.manifest_path(),
+                workers=workers, chunksize=chunksize, config=self.extractor_config()
+            )
+            logger.info(
+                f"♻️ Incremental: {stats['reused']} reaproveitadas, "
+                f"{stats['extracted']} extraídas, {stats['failed']} com falha, "
+                f"{stats['removed']} removidas"
+            )
+        else:
+            results = map_chat_files(self.extract_features_from_file, tasks, workers=workers, chunksize=chunksize)
+            all_features = [features for features in results if features]
         
         if all_features:
             df = pd.DataFrame(all_features)
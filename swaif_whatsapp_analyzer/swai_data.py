@@ -0,0 +1,221 @@
+# SWAI Data - Serviço de Dados com Cache
+# Filosofia: Ler uma vez, reaproveitar em cada clique
+
+"""
+Serviço de dados compartilhado pelas páginas swai_ui_*
+
+O Streamlit reexecuta a página inteira a cada interação. Aqui a leitura
+das features e o cálculo das métricas ficam em ``st.cache_data``,
+chaveados pela impressão digital dos arquivos de dados (caminho,
+tamanho e mtime) e pelos parâmetros financeiros, de modo que mover um
+controle reaproveita o resultado em vez de reler e recalcular tudo.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from swai_core import SWAIAnalyzer, create_sample_data
+from integrations.database.connection_pool import shared_pool
+from modules.live_features import features_frame, load_live_features
+
+
+def data_fingerprint(settings: dict) -> str:
+    """
+    Impressão digital barata dos dados processados
+
+    Combina caminho, tamanho e mtime de cada arquivo do feature store
+    (ou do CSV legado) sem ler o conteúdo.
+
+    Args:
+        settings (dict): Configurações SWAI
+
+    Returns:
+        str: Hash que muda sempre que os dados gravados mudam
+    """
+    digest = hashlib.sha256()
+    paths: List[Path] = []
+
+    store_dir = settings.get("FEATURE_STORE_DIR")
+    if store_dir and Path(store_dir).is_dir():
+        paths.extend(sorted(Path(store_dir).rglob("*.parquet")))
+    csv_path = settings.get("FEATURES_CSV")
+    if csv_path and Path(csv_path).exists():
+        paths.append(Path(csv_path))
+
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _financial_key(financial_config: Dict) -> Tuple:
+    return tuple(sorted(financial_config.items()))
+
+
+@st.cache_data(show_spinner=False)
+def _load_data(fingerprint: str, store_dir: Optional[str], csv_path: Optional[str]) -> Tuple[pd.DataFrame, bool]:
+    # ``fingerprint`` só participa da chave do cache
+    analyzer = SWAIAnalyzer({"FEATURE_STORE_DIR": store_dir, "FEATURES_CSV": csv_path})
+    df = analyzer.load_conversation_data()
+    if df is None or df.empty:
+        return create_sample_data(), True
+    return df, False
+
+
+@st.cache_data(show_spinner=False)
+def _basic_metrics(fingerprint: str, store_dir: Optional[str], csv_path: Optional[str]) -> Dict:
+    df, _ = _load_data(fingerprint, store_dir, csv_path)
+    return SWAIAnalyzer({}).calculate_basic_metrics(df)
+
+
+@st.cache_data(show_spinner=False)
+def _cost_and_insights(fingerprint: str, store_dir: Optional[str], csv_path: Optional[str],
+                       financial_key: Tuple) -> Tuple[Dict, List[Dict]]:
+    analyzer = SWAIAnalyzer({})
+    metrics = _basic_metrics(fingerprint, store_dir, csv_path)
+    opportunity_cost = analyzer.calculate_opportunity_cost(metrics, dict(financial_key))
+    return opportunity_cost, analyzer.generate_insights(metrics, opportunity_cost)
+
+
+def _source(settings: dict) -> Tuple[str, Optional[str], Optional[str]]:
+    return data_fingerprint(settings), settings.get("FEATURE_STORE_DIR"), settings.get("FEATURES_CSV")
+
+
+def get_conversation_data(settings: dict) -> Tuple[pd.DataFrame, bool]:
+    """
+    Dados das conversas, lidos do disco apenas quando os arquivos mudam
+
+    Args:
+        settings (dict): Configurações SWAI
+
+    Returns:
+        Tuple[pd.DataFrame, bool]: Dados e se são dados de exemplo
+    """
+    return _load_data(*_source(settings))
+
+
+def get_basic_metrics(settings: dict) -> Dict:
+    """
+    Métricas básicas (SWAIAnalyzer.calculate_basic_metrics) em cache
+
+    Args:
+        settings (dict): Configurações SWAI
+
+    Returns:
+        Dict: Métricas calculadas
+    """
+    return _basic_metrics(*_source(settings))
+
+
+def get_cost_analysis(settings: dict, financial_config: Dict) -> Tuple[Dict, List[Dict]]:
+    """
+    Custo de oportunidade e insights, em cache por dados e parâmetros financeiros
+
+    Args:
+        settings (dict): Configurações SWAI
+        financial_config (Dict): Parâmetros financeiros usados no cálculo
+
+    Returns:
+        Tuple[Dict, List[Dict]]: Custo de oportunidade e insights
+    """
+    return _cost_and_insights(*_source(settings), _financial_key(financial_config))
+
+
+def get_range_metrics(settings: dict, start: Optional[str] = None, end: Optional[str] = None,
+                      secretary: Optional[str] = None) -> Dict:
+    """
+    Métricas básicas de um período, lidas dos agregados diários/semanais
+
+    Sem agregados gravados (``ROLLUP_DB`` ausente ou vazio), filtra os
+    dados em cache e recalcula, como ``get_basic_metrics``.
+
+    Args:
+        settings (dict): Configurações SWAI
+        start (str, optional): Primeiro dia (``AAAA-MM-DD``)
+        end (str, optional): Último dia, inclusivo
+        secretary (str, optional): Secretária (``secretary_name``)
+
+    Returns:
+        Dict: Métricas calculadas
+    """
+    analyzer = SWAIAnalyzer(settings)
+    metrics = analyzer.calculate_range_metrics(start, end, secretary)
+    if metrics:
+        return metrics
+
+    df, _ = get_conversation_data(settings)
+    if start is not None or end is not None:
+        day = df["start_time"].astype(str).str[:10] if "start_time" in df.columns else pd.Series("", index=df.index)
+        df = df[(day >= str(start or "0000-01-01")[:10]) & (day <= str(end or "9999-12-31")[:10])]
+    if secretary is not None:
+        df = df[df["secretary_name"] == secretary] if "secretary_name" in df.columns else df.iloc[0:0]
+    return analyzer.calculate_basic_metrics(df)
+
+
+def _database_fingerprint(db_path: Optional[str]) -> str:
+    # Com WAL as escritas recentes ficam no arquivo -wal até o checkpoint
+    parts = []
+    for path in (Path(db_path), Path(f"{db_path}-wal")) if db_path else ():
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{path}|{stat.st_size}|{stat.st_mtime_ns}")
+    return "\n".join(parts)
+
+
+@st.cache_data(show_spinner=False)
+def _live_features(fingerprint: str, db_path: str) -> pd.DataFrame:
+    # ``fingerprint`` só participa da chave do cache; o pool migra o esquema ao abrir
+    with shared_pool(db_path).reader() as manager:
+        return load_live_features(manager)
+
+
+def get_live_features(settings: dict) -> pd.DataFrame:
+    """
+    Features das conversas em andamento, mantidas pela ingestão em ``MESSAGES_DB``
+
+    Args:
+        settings (dict): Configurações SWAI
+
+    Returns:
+        pd.DataFrame: Uma linha por conversa (``chat_type == "live"``);
+        vazio quando o banco de mensagens não existe
+    """
+    db_path = settings.get("MESSAGES_DB")
+    fingerprint = _database_fingerprint(db_path)
+    if not fingerprint:
+        return features_frame([])
+    return _live_features(fingerprint, db_path)
+
+
+def rebuild_live_features(settings: dict) -> int:
+    """
+    Recalcula as features das conversas a partir das mensagens gravadas
+
+    Preenche conversas agrupadas antes da tabela existir e corrige
+    agregados desatualizados, contando as palavras-chave das configurações.
+
+    Args:
+        settings (dict): Configurações SWAI
+
+    Returns:
+        int: Número de conversas recalculadas
+    """
+    db_path = settings.get("MESSAGES_DB")
+    if not db_path or not Path(db_path).exists():
+        return 0
+    with shared_pool(db_path).writer() as manager:
+        rebuilt = manager.rebuild_conversation_features(settings=settings)
+    _live_features.clear()
+    return rebuilt
+
+
+def clear_data_cache() -> None:
+    """Descarta dados e métricas em cache (próxima leitura vai ao disco)"""
+    _load_data.clear()
+    _basic_metrics.clear()
+    _cost_and_insights.clear()
+    _live_features.clear()
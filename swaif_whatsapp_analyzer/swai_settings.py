@@ -35,6 +35,11 @@ SWAI_SETTINGS = {
     "SUCCESS_CASES_DIR": str(DATA_DIR / "success_cases"),
     "FAIL_CASES_DIR": str(DATA_DIR / "fail_cases"),
     "FEATURES_CSV": str(DATA_DIR / "extracted_features_enhanced.csv"),
+    "FEATURE_STORE_DIR": str(DATA_DIR / "feature_store"),  # Parquet particionado por clínica/mês
+    "CLINIC_ID": "default",
+    "FEATURES_MANIFEST": str(DATA_DIR / "extracted_features_enhanced.manifest.json"),
+    "ROLLUP_DB": str(DATA_DIR / "feature_rollups.sqlite"),  # Agregados diários/semanais dos KPIs
+    "MESSAGES_DB": str(DATA_DIR / "databases" / "messages.db"),  # Mensagens da ingestão (Layers 1/2)
     "ANALYSIS_JSON": str(DATA_DIR / "detailed_analysis_results.json"),
     
     # Configurações de UI
@@ -49,6 +54,10 @@ SWAI_SETTINGS = {
     "SUCCESS_RATE_THRESHOLD": 0.6,      # 60% taxa de sucesso ideal
     "COST_ALERT_THRESHOLD": 10000.0,    # R$ 10k alerta de custo alto
     
+    # Processamento em lote
+    "EXTRACTION_WORKERS": max(1, (os.cpu_count() or 1) - 1),  # Processos paralelos na extração
+    "EXTRACTION_CHUNKSIZE": None,       # Conversas por lote (None = automático)
+    
     # Configurações de análise
     "AGENDAMENTO_KEYWORDS": [
         "agendar", "agenda", "consulta", "horário", "disponibilidade",
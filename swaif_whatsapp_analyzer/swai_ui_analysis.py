@@ -18,7 +18,7 @@ def show_analysis():
     """
     
     from swai_settings import SWAI_SETTINGS, get_color_scheme
-    from swai_core import SWAIAnalyzer, create_sample_data
+    from swai_data import get_conversation_data
     from swai_features import feature_enabled
     
     st.title("🔍 Análise Detalhada")
@@ -30,17 +30,12 @@ def show_analysis():
         return
     
     # Inicializar
-    analyzer = SWAIAnalyzer(SWAI_SETTINGS)
     colors = get_color_scheme()
     
     # Carregar dados
-    df = analyzer.load_conversation_data()
-    if df is None or df.empty:
+    df, is_sample_data = get_conversation_data(SWAI_SETTINGS)
+    if is_sample_data:
         st.info("📝 Usando dados de exemplo para demonstração")
-        df = create_sample_data()
-        is_sample_data = True
-    else:
-        is_sample_data = False
     
     if df.empty:
         st.error("❌ Nenhum dado disponível para análise")
@@ -18,7 +18,9 @@ def show_configuration():
     
     from swai_settings import SWAI_SETTINGS, update_setting, get_financial_settings, update_financial_settings
     from swai_features import FEATURES, toggle_feature, feature_enabled, get_enabled_features, get_disabled_features, feature_count
-    from swai_core import SWAIConversationExtractor, create_sample_data
+    from swai_core import SWAIAnalyzer, SWAIConversationExtractor, create_sample_data
+    from swai_data import clear_data_cache, rebuild_live_features
+    from modules.feature_store import count_features
     
     st.title("⚙️ Configurações SWAI")
     st.markdown("*Controle total do sistema com simplicidade máxima*")
@@ -202,19 +204,21 @@ def show_configuration():
         st.markdown("#### 📊 Status dos Dados")
         
         # Verificar se existem dados
-        features_csv = Path(SWAI_SETTINGS.get('FEATURES_CSV', ''))
         success_dir = Path(SWAI_SETTINGS.get('SUCCESS_CASES_DIR', ''))
         fail_dir = Path(SWAI_SETTINGS.get('FAIL_CASES_DIR', ''))
         
-        if features_csv.exists():
+        try:
+            # Contagem lida dos metadados do Parquet, sem carregar as colunas
+            processed_count = count_features(
+                SWAI_SETTINGS.get('FEATURE_STORE_DIR'), SWAI_SETTINGS.get('FEATURES_CSV')
+            )
+        except Exception:
+            processed_count = None
+            st.warning("⚠️ Erro ao ler dados processados")
+        
+        if processed_count is not None:
             st.success("✅ Dados processados encontrados")
-            # Mostrar informações do arquivo
-            try:
-                import pandas as pd
-                df = pd.read_csv(features_csv)
-                st.info(f"📄 {len(df)} conversas processadas")
-            except:
-                st.warning("⚠️ Erro ao ler dados processados")
+            st.info(f"📄 {processed_count} conversas processadas")
         else:
             st.warning("⚠️ Nenhum dado processado encontrado")
         
@@ -228,15 +232,24 @@ def show_configuration():
     with col2:
         st.markdown("#### 🔄 Ações de Dados")
         
+        full_rebuild = st.checkbox(
+            "Reprocessar tudo",
+            value=False,
+            help="Ignora o manifesto e reextrai todas as conversas, mesmo as inalteradas"
+        )
+        
         if st.button("🔄 Reprocessar Conversas", use_container_width=True):
             with st.spinner("Processando conversas..."):
                 try:
                     extractor = SWAIConversationExtractor(SWAI_SETTINGS)
-                    df = extractor.process_all_conversations()
+                    if full_rebuild:
+                        extractor.manifest_path().unlink(missing_ok=True)
+                    df = extractor.process_all_conversations(incremental=True)
                     
                     if not df.empty:
                         # Salvar dados processados
-                        df.to_csv(features_csv, index=False)
+                        SWAIAnalyzer(SWAI_SETTINGS).save_conversation_data(df)
+                        clear_data_cache()
                         st.success(f"✅ {len(df)} conversas processadas com sucesso!")
                     else:
                         st.warning("⚠️ Nenhuma conversa encontrada para processar")
@@ -247,13 +260,24 @@ def show_configuration():
             with st.spinner("Gerando dados de exemplo..."):
                 try:
                     sample_df = create_sample_data()
-                    sample_df.to_csv(features_csv, index=False)
+                    SWAIAnalyzer(SWAI_SETTINGS).save_conversation_data(sample_df)
+                    clear_data_cache()
                     st.success(f"✅ {len(sample_df)} conversas de exemplo geradas!")
                 except Exception as e:
                     st.error(f"❌ Erro ao gerar exemplos: {str(e)}")
         
+        if st.button("📡 Recalcular Conversas ao Vivo", use_container_width=True,
+                     help="Refaz as features das conversas da ingestão a partir das mensagens gravadas"):
+            with st.spinner("Recalculando features..."):
+                try:
+                    rebuilt = rebuild_live_features(SWAI_SETTINGS)
+                    st.success(f"✅ {rebuilt} conversas recalculadas!")
+                except Exception as e:
+                    st.error(f"❌ Erro ao recalcular: {str(e)}")
+        
         if st.button("🗑️ Limpar Cache", use_container_width=True):
-            # Limpar cache do Streamlit
+            # Limpar cache do Streamlit (inclui dados e métricas das páginas)
+            clear_data_cache()
             st.cache_data.clear()
             st.success("✅ Cache limpo!")
     
@@ -329,7 +353,7 @@ def show_configuration():
             
             update_setting('AGENDAMENTO_KEYWORDS', new_agendamento)
             update_setting('PRECO_KEYWORDS', new_preco)
-            st.success("✅ Palavras-chave atualizadas!")
+            st.success("✅ Palavras-chave atualizadas! O próximo reprocessamento reextrai todas as conversas.")
     
     with st.expander("🐛 Configurações de Debug"):
         st.markdown("#### Modo Desenvolvedor")
@@ -456,7 +480,7 @@ def show_configuration():
     with col2:
         st.markdown("**📊 Estatísticas**")
         st.caption(f"Features Ativas: {feature_stats['enabled']}")
-        st.caption(f"Dados Processados: {'Sim' if features_csv.exists() else 'Não'}")
+        st.caption(f"Dados Processados: {'Sim' if processed_count is not None else 'Não'}")
         st.caption(f"Cache Status: {'Ativo' if st.cache_data else 'Inativo'}")
     
     with col3:
@@ -19,7 +19,8 @@ def show_cost_calculator():
     """
     
     from swai_settings import SWAI_SETTINGS, get_financial_settings, update_financial_settings, get_color_scheme
-    from swai_core import SWAIAnalyzer, create_sample_data
+    from swai_core import SWAIAnalyzer
+    from swai_data import get_basic_metrics, get_conversation_data, get_cost_analysis
     from swai_features import feature_enabled
     
     st.title("💰 Custo de Oportunidade")
@@ -35,13 +36,9 @@ def show_cost_calculator():
     colors = get_color_scheme()
     
     # Carregar dados
-    df = analyzer.load_conversation_data()
-    if df is None or df.empty:
+    df, is_sample_data = get_conversation_data(SWAI_SETTINGS)
+    if is_sample_data:
         st.info("📝 Usando dados de exemplo para demonstração")
-        df = create_sample_data()
-        is_sample_data = True
-    else:
-        is_sample_data = False
     
     if df.empty:
         st.error("❌ Nenhum dado disponível para cálculo")
@@ -91,8 +88,8 @@ def show_cost_calculator():
         financial_config = get_financial_settings()
     
     # === MÉTRICAS ATUAIS ===
-    metrics = analyzer.calculate_basic_metrics(df)
-    opportunity_cost = analyzer.calculate_opportunity_cost(metrics, {
+    metrics = get_basic_metrics(SWAI_SETTINGS)
+    opportunity_cost, _ = get_cost_analysis(SWAI_SETTINGS, {
         'valor_consulta': valor_consulta,
         'leads_diarios': leads_diarios,
         'dias_uteis_mes': dias_uteis_mes,
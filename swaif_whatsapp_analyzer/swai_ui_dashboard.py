@@ -19,7 +19,8 @@ def show_dashboard():
     
     # Importações locais para evitar dependências circulares
     from swai_settings import SWAI_SETTINGS, get_financial_settings, get_color_scheme
-    from swai_core import SWAIAnalyzer, create_sample_data
+    from swai_core import SWAIAnalyzer
+    from swai_data import get_basic_metrics, get_conversation_data, get_cost_analysis, get_live_features, get_range_metrics
     from swai_features import feature_enabled
     
     st.title("📊 Dashboard SWAI")
@@ -36,25 +37,46 @@ def show_dashboard():
     
     # Carregar dados
     with st.spinner("🔄 Carregando dados..."):
-        df = analyzer.load_conversation_data()
+        # Em cache: só relê o disco quando os dados processados mudam
+        df, is_sample_data = get_conversation_data(SWAI_SETTINGS)
         
         # Se não há dados reais, usar dados de exemplo
-        if df is None or df.empty:
+        if is_sample_data:
             st.info("📝 Usando dados de exemplo para demonstração")
-            df = create_sample_data()
-            is_sample_data = True
-        else:
-            is_sample_data = False
     
     if df.empty:
         st.error("❌ Nenhum dado disponível para análise")
         return
     
+    # === FILTRO DE PERÍODO ===
+    filter_col1, filter_col2 = st.columns([2, 1])
+    
+    with filter_col1:
+        period = st.date_input("📅 Período", value=(), help="Vazio = todo o histórico")
+    
+    with filter_col2:
+        secretaries = []
+        if "secretary_name" in df.columns:
+            secretaries = sorted(df["secretary_name"].dropna().astype(str).unique())
+        secretary = st.selectbox("👩‍💼 Secretária", ["Todas", *secretaries]) if secretaries else "Todas"
+    
+    period = tuple(period) if isinstance(period, (list, tuple)) else (period,)
+    start = period[0].isoformat() if period else None
+    end = period[-1].isoformat() if period else None
+    secretary = None if secretary == "Todas" else secretary
+    
     # Calcular métricas
-    metrics = analyzer.calculate_basic_metrics(df)
     financial_config = get_financial_settings()
-    opportunity_cost = analyzer.calculate_opportunity_cost(metrics, financial_config)
-    insights = analyzer.generate_insights(metrics, opportunity_cost)
+    if start is None and secretary is None:
+        metrics = get_basic_metrics(SWAI_SETTINGS)
+        opportunity_cost, insights = get_cost_analysis(SWAI_SETTINGS, financial_config)
+    else:
+        # Período filtrado: agregados diários/semanais, sem reler as conversas
+        metrics = get_range_metrics(SWAI_SETTINGS, start, end, secretary)
+        opportunity_cost = analyzer.calculate_opportunity_cost(metrics, financial_config)
+        insights = analyzer.generate_insights(metrics, opportunity_cost)
+        if not metrics:
+            st.info("📭 Nenhuma conversa no período selecionado")
     
     # === SEÇÃO 1: MÉTRICAS PRINCIPAIS ===
     st.markdown("### 🎯 Métricas Principais")
@@ -316,6 +338,24 @@ def show_dashboard():
     for i, rec in enumerate(recommendations, 1):
         st.markdown(f"{i}. {rec}")
     
+    # === CONVERSAS EM ANDAMENTO ===
+    # Features mantidas pela ingestão a cada mensagem (sem reprocessar exports)
+    live_df = get_live_features(SWAI_SETTINGS)
+    if not live_df.empty:
+        st.markdown("---")
+        st.markdown("### 📡 Conversas em Andamento")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Conversas ao Vivo", len(live_df))
+        with col2:
+            st.metric("Mensagens", int(live_df["total_messages"].sum()))
+        with col3:
+            st.metric("Duração Média", f"{live_df['duration_minutes'].mean():.1f} min")
+        
+        with st.expander("Ver conversas"):
+            st.dataframe(live_df, use_container_width=True)
+    
     # === FOOTER ===
     st.markdown("---")
     
@@ -6,6 +6,9 @@ import sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
-if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
-
+# The Streamlit app lives in a flat script directory imported by module name
+# (``swai_core``, ``swai_settings``...), exactly as ``run_swai.py`` does.
+SWAI_DIR = ROOT / "swaif_whatsapp_analyzer"
+for path in (SWAI_DIR, ROOT):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,351 @@
+"""Tests for the ready_for_ai dispatch queue."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from pipeline.ai_dispatch import (
+    DONE,
+    FAILED,
+    PENDING,
+    RUNNING,
+    Dispatcher,
+    RateLimiter,
+    RedisDispatchBackend,
+    SQLiteDispatchBackend,
+)
+
+
+class FakeRedis:
+    """The subset of ``redis.Redis(decode_responses=True)`` the backend uses.
+
+    ``transaction`` follows ``WATCH``/``MULTI``/``EXEC``: queued writes
+    are dropped and the callable runs again when a watched key was
+    written in between.  ``before_exec`` lets a test run another client's
+    commands right before ``EXEC``.
+    """
+
+    def __init__(self) -> None:
+        self.hashes: dict = {}
+        self.zsets: dict = {}
+        self.sets: dict = {}
+        self.versions: dict = {}
+        self.before_exec = None
+        self._lock = threading.RLock()
+
+    def _touch(self, name) -> None:
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def hget(self, name, key):
+        with self._lock:
+            return self.hashes.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self.hashes.get(name, {}))
+
+    def hset(self, name, mapping):
+        with self._lock:
+            self.hashes.setdefault(name, {}).update({k: str(v) for k, v in mapping.items()})
+            self._touch(name)
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            values = self.hashes.setdefault(name, {})
+            values[key] = str(int(values.get(key, 0)) + amount)
+            self._touch(name)
+            return int(values[key])
+
+    def zadd(self, name, mapping):
+        with self._lock:
+            self.zsets.setdefault(name, {}).update({k: float(v) for k, v in mapping.items()})
+            self._touch(name)
+
+    def zrem(self, name, *values):
+        with self._lock:
+            zset = self.zsets.get(name, {})
+            removed = sum(zset.pop(value, None) is not None for value in values)
+            if removed:
+                self._touch(name)
+            return removed
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        low = float(min)
+        high = float(max)
+        with self._lock:
+            members = sorted(
+                (score, member) for member, score in self.zsets.get(name, {}).items() if low <= score <= high
+            )
+        members = [member for _, member in members]
+        if start is not None:
+            members = members[start:start + num]
+        return members
+
+    def sadd(self, name, *values):
+        with self._lock:
+            members = self.sets.setdefault(name, set())
+            added = len(set(values) - members)
+            members.update(values)
+            self._touch(name)
+            return added
+
+    def srem(self, name, *values):
+        with self._lock:
+            members = self.sets.get(name, set())
+            removed = len(members & set(values))
+            members.difference_update(values)
+            self._touch(name)
+            return removed
+
+    def scard(self, name):
+        with self._lock:
+            return len(self.sets.get(name, set()))
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self.zsets.get(name, {}))
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        while True:
+            pipe = FakePipeline(self, watches)
+            value = func(pipe)
+            hook, self.before_exec = self.before_exec, None
+            if hook is not None:
+                hook()
+            results = pipe.execute()
+            if results is not None:
+                return value if value_from_callable else results
+
+
+class FakePipeline:
+    """Reads run immediately; after ``multi()`` writes are queued for ``execute``."""
+
+    def __init__(self, client: FakeRedis, watches) -> None:
+        self.client = client
+        self.watched = {name: client.versions.get(name, 0) for name in watches}
+        self.queued = None
+
+    def multi(self) -> None:
+        self.queued = []
+
+    def execute(self):
+        with self.client._lock:
+            if any(self.client.versions.get(name, 0) != version for name, version in self.watched.items()):
+                return None
+            return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.queued or []]
+
+    def __getattr__(self, name):
+        if self.queued is None:
+            return getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+
+        return queue
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteDispatchBackend(str(tmp_path / "dispatch.sqlite"))
+    else:
+        backend = RedisDispatchBackend(FakeRedis())
+    yield backend
+    backend.close()
+
+
+def _ready(*conversation_ids: str, ready: bool = True) -> list:
+    return [({"message_id": cid}, {"conversation_id": cid, "ready_for_ai": ready, "status": "active"})
+            for cid in conversation_ids]
+
+
+def test_repeated_triggers_coalesce_into_one_job(backend) -> None:
+    seen = []
+    dispatcher = Dispatcher(backend, lambda jobs: seen.extend(job.conversation_id for job in jobs))
+
+    dispatcher.on_batch(_ready("a", "a", "b"))
+    dispatcher.on_batch(_ready("a", "c", ready=False))
+
+    assert dispatcher.drain() == 2
+    assert sorted(seen) == ["a", "b"]
+    assert backend.counts() == {PENDING: 0, RUNNING: 0, DONE: 2, FAILED: 0}
+    assert dispatcher.stats()["enqueued"] == 2
+
+
+def test_trigger_during_summary_requeues_conversation(backend) -> None:
+    calls = []
+
+    def summarize(jobs):
+        calls.append([job.conversation_id for job in jobs])
+        if len(calls) == 1:
+            backend.enqueue(["a"])  # a new message arrives meanwhile
+        return {job.conversation_id: "resumo" for job in jobs}
+
+    dispatcher = Dispatcher(backend, summarize)
+    dispatcher.enqueue(["a"])
+
+    assert dispatcher.drain() == 2
+    assert calls == [["a"], ["a"]]
+    assert backend.get("a")["status"] == DONE
+
+    dispatcher.enqueue(["a"])  # and again after it was summarized
+    assert backend.get("a")["status"] == PENDING
+
+
+def test_counts_report_the_current_status_of_each_job(backend) -> None:
+    dispatcher = Dispatcher(backend, lambda jobs: {job.conversation_id: "resumo" for job in jobs})
+    ids = [f"c{i}" for i in range(1200)]  # more than one chunk of SQLite variables
+
+    assert backend.enqueue(ids) == 1200
+    assert backend.enqueue(ids[:2]) == 0
+    dispatcher.drain()
+    assert backend.enqueue(["c0"]) == 1
+    assert backend.counts() == {PENDING: 1, RUNNING: 0, DONE: 1199, FAILED: 0}
+
+    dispatcher.drain()
+    assert backend.counts() == {PENDING: 0, RUNNING: 0, DONE: 1200, FAILED: 0}
+
+
+def test_failures_are_retried_then_marked_failed(backend) -> None:
+    attempts = []
+
+    def summarize(jobs):
+        attempts.append(jobs[0].attempts)
+        raise RuntimeError("API indisponível")
+
+    dispatcher = Dispatcher(backend, summarize, max_attempts=3, retry_backoff=0)
+    dispatcher.enqueue(["a"])
+
+    dispatcher.drain()
+
+    assert attempts == [1, 2, 3]
+    assert backend.get("a")["status"] == FAILED
+    assert backend.get("a")["last_error"] == "API indisponível"
+    stats = dispatcher.stats()
+    assert (stats["retried"], stats["failed"]) == (2, 1)
+
+
+def test_missing_results_retry_only_those_conversations(backend) -> None:
+    stored = {}
+    dispatcher = Dispatcher(
+        backend,
+        lambda jobs: {job.conversation_id: f"resumo {job.conversation_id}" for job in jobs if job.attempts > 1
+                      or job.conversation_id == "a"},
+        retry_backoff=0,
+        on_result=lambda job, summary: stored.__setitem__(job.conversation_id, summary),
+    )
+    dispatcher.enqueue(["a", "b"])
+
+    dispatcher.drain()
+
+    assert stored == {"a": "resumo a", "b": "resumo b"}
+    assert backend.get("b")["attempts"] == 2
+
+
+def test_backoff_delays_retries(backend) -> None:
+    dispatcher = Dispatcher(backend, lambda jobs: {}, retry_backoff=60)
+    dispatcher.enqueue(["a"])
+
+    assert dispatcher.run_once() == 1
+    assert dispatcher.run_once() == 0
+    assert backend.claim(10, 300, now=time.time() + 61)[0].attempts == 2
+
+
+def test_expired_lease_is_claimed_again_and_stale_worker_cannot_settle(backend) -> None:
+    backend.enqueue(["a"])
+    stale = backend.claim(10, lease_seconds=10)[0]
+
+    assert backend.claim(10, lease_seconds=10) == []
+    fresh = backend.claim(10, lease_seconds=10, now=time.time() + 11)[0]
+
+    assert fresh.attempts == 2
+    assert not backend.complete(stale)
+    assert backend.complete(fresh)
+    assert backend.get("a")["status"] == DONE
+
+
+def test_worker_pool_summarizes_everything(backend) -> None:
+    done = []
+    lock = threading.Lock()
+
+    def summarize(jobs):
+        with lock:
+            done.extend(job.conversation_id for job in jobs)
+
+    with Dispatcher(backend, summarize, workers=3, batch_size=4, poll_interval=0.01) as dispatcher:
+        dispatcher.enqueue(f"c{i}" for i in range(40))
+        deadline = time.monotonic() + 5
+        while len(done) < 40 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert dispatcher.stats()["workers"] == 3
+
+    assert sorted(done) == sorted(f"c{i}" for i in range(40))
+    assert backend.counts()[DONE] == 40
+
+
+def test_rate_limiter_spaces_calls() -> None:
+    now = [0.0]
+    limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0])
+
+    assert [limiter.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert limiter.reserve() == 0.0
+
+
+def test_rate_limit_is_recorded(tmp_path) -> None:
+    backend = SQLiteDispatchBackend(str(tmp_path / "dispatch.sqlite"))
+    dispatcher = Dispatcher(backend, lambda jobs: None, workers=1, batch_size=1, rate_limit=50)
+    dispatcher.enqueue(["a", "b", "c"])
+
+    started = time.monotonic()
+    assert dispatcher.drain() == 3
+
+    assert time.monotonic() - started >= 0.035
+    assert dispatcher.stats()["throttled_s"] > 0
+    backend.close()
+
+
+def test_redis_backend_requires_client_library(monkeypatch) -> None:
+    import pipeline.ai_dispatch as ai_dispatch
+
+    monkeypatch.setattr(ai_dispatch, "redis", None)
+    with pytest.raises(RuntimeError):
+        RedisDispatchBackend.from_env()
+
+
+def test_redis_trigger_racing_a_completion_is_not_lost() -> None:
+    client = FakeRedis()
+    backend = RedisDispatchBackend(client)
+    backend.enqueue(["a"])
+    job = backend.claim(10, lease_seconds=60)[0]
+
+    # Another process triggers "a" between complete()'s read and its EXEC
+    client.before_exec = lambda: backend.enqueue(["a"])
+    assert backend.complete(job)
+
+    assert backend.get("a")["status"] == PENDING
+    assert backend.get("a")["triggers"] == 2
+    assert [job.conversation_id for job in backend.claim(10, lease_seconds=60)] == ["a"]
+
+
+def test_redis_stale_worker_loses_to_a_racing_claim() -> None:
+    client = FakeRedis()
+    backend = RedisDispatchBackend(client)
+    backend.enqueue(["a"])
+    stale = backend.claim(10, lease_seconds=10)[0]
+    later = time.time() + 11
+    fresh = []
+
+    # The lease expires and another worker claims "a" while the stale
+    # worker is completing it
+    client.before_exec = lambda: fresh.extend(backend.claim(10, lease_seconds=10, now=later))
+    assert not backend.complete(stale)
+
+    assert fresh[0].attempts == 2
+    assert backend.get("a")["status"] == RUNNING
+    assert backend.complete(fresh[0])
+    assert backend.counts() == {PENDING: 0, RUNNING: 0, DONE: 1, FAILED: 0}
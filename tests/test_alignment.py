@@ -0,0 +1,75 @@
+"""Tests for the fit-once TF-IDF alignment scorer."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from modules.alignment import AlignmentScorer, secretary_text
+from modules.extract_features_enhanced import calculate_alignment_score, score_alignment_batch
+
+
+ALIGNED = "Always confirm the appointment date, explain pricing clearly and send the clinic address."
+TEXTS = [
+    "Please confirm the appointment date. I will send the clinic address.",
+    "Pricing depends on the exams, let me explain it clearly.",
+    "Hello there",
+]
+
+
+def _chat(*messages: tuple[str, str]) -> pd.DataFrame:
+    return pd.DataFrame(messages, columns=["sender", "message"])
+
+
+def test_batch_similarity_matches_sklearn_fit_on_same_corpus() -> None:
+    scorer = AlignmentScorer(ALIGNED, corpus=TEXTS)
+
+    matrix = TfidfVectorizer(stop_words="english").fit_transform([ALIGNED] + TEXTS)
+    expected = cosine_similarity(matrix[1:], matrix[0:1]).ravel()
+
+    assert np.allclose(scorer.similarity(TEXTS), expected)
+    # Texts outside the fitted corpus go through the tokenizing path
+    assert np.allclose(scorer.similarity(TEXTS[:2] + ["unrelated"])[:2], expected[:2])
+
+
+def test_unseen_terms_lower_similarity() -> None:
+    scorer = AlignmentScorer(ALIGNED)
+
+    plain, padded = scorer.similarity(["confirm appointment", "confirm appointment zebra giraffe"])
+
+    assert 0 < padded < plain
+
+
+def test_score_texts_handles_missing_secretary_text() -> None:
+    results = AlignmentScorer(ALIGNED, corpus=TEXTS).score_texts([TEXTS[0], None])
+
+    assert results[0]["score_sequencia"] == 75
+    assert results[0]["score_similaridade"] > 0
+    assert results[1]["detalhes"] == "Nenhuma mensagem da secretária encontrada"
+
+
+def test_single_conversation_score_matches_legacy_pairwise_fit() -> None:
+    chat = _chat(("Sol", TEXTS[0]), ("Lead", "ok"), ("Sol", TEXTS[1]))
+    text = secretary_text(chat)
+
+    matrix = TfidfVectorizer(stop_words="english").fit_transform([text, ALIGNED])
+    legacy = cosine_similarity(matrix[0:1], matrix[1:2])[0][0] * 100
+
+    assert calculate_alignment_score(chat, ALIGNED)["score_similaridade"] == round(legacy, 2)
+
+
+def test_score_alignment_batch_fills_every_conversation() -> None:
+    features = [{"chat_type": "success"}, {"chat_type": "fail"}]
+
+    score_alignment_batch(features, [TEXTS[0], None], ALIGNED)
+
+    assert features[0]["alinhamento"]["score_geral"] > 0
+    assert features[1]["alinhamento"]["score_geral"] == 0
+
+
+def test_stop_word_only_content_scores_zero_similarity() -> None:
+    scorer = AlignmentScorer("the and of")
+
+    assert scorer.similarity(["the and of"]).tolist() == [0.0]
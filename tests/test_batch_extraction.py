@@ -0,0 +1,74 @@
+"""Tests for process-pool batch extraction of conversation exports."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from modules.batch_extraction import find_chat_files, map_chat_files
+import swai_core
+
+
+def _write_chat(base: Path, name: str, lines: list[str]) -> Path:
+    folder = base / name
+    folder.mkdir(parents=True)
+    path = folder / "_chat.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def _chat_lines(patient: str, count: int) -> list[str]:
+    lines = []
+    for i in range(count):
+        sender = "Sol" if i % 2 else patient
+        lines.append(f"[01/02/2025, 10:{i:02d}:00] {sender}: mensagem {i} consulta?")
+    return lines
+
+
+def _settings(tmp_path: Path) -> dict:
+    success_dir = tmp_path / "success_cases"
+    fail_dir = tmp_path / "fail_cases"
+    for i in range(3):
+        _write_chat(success_dir, f"chat_s{i}", _chat_lines(f"Lead S{i}", 4 + i))
+        _write_chat(fail_dir, f"chat_f{i}", _chat_lines(f"Lead F{i}", 3))
+    return {
+        "SUCCESS_CASES_DIR": str(success_dir),
+        "FAIL_CASES_DIR": str(fail_dir),
+        "AGENDAMENTO_KEYWORDS": ["consulta"],
+        "PRECO_KEYWORDS": ["valor"],
+    }
+
+
+def _echo(chat_file: str, chat_type: str) -> dict:
+    return {"chat_file": chat_file, "chat_type": chat_type}
+
+
+def test_find_chat_files_is_sorted_and_typed(tmp_path: Path) -> None:
+    settings = _settings(tmp_path)
+    tasks = find_chat_files({"success": settings["SUCCESS_CASES_DIR"], "fail": settings["FAIL_CASES_DIR"], "x": ""})
+
+    assert [Path(f).parent.name for f, _ in tasks] == [
+        "chat_s0", "chat_s1", "chat_s2", "chat_f0", "chat_f1", "chat_f2",
+    ]
+    assert [t for _, t in tasks] == ["success"] * 3 + ["fail"] * 3
+
+
+def test_map_chat_files_preserves_order_across_workers(tmp_path: Path) -> None:
+    tasks = [(f"file{i}", "success" if i % 2 else "fail") for i in range(10)]
+
+    serial = map_chat_files(_echo, tasks, workers=1)
+    parallel = map_chat_files(_echo, tasks, workers=2, chunksize=3)
+
+    assert parallel == serial
+    assert [row["chat_file"] for row in parallel] == [f for f, _ in tasks]
+
+
+def test_process_all_conversations_parallel_matches_serial(tmp_path: Path) -> None:
+    extractor = swai_core.SWAIConversationExtractor(_settings(tmp_path))
+
+    serial = extractor.process_all_conversations(workers=1)
+    parallel = extractor.process_all_conversations(workers=2, chunksize=2)
+
+    assert len(parallel) == 6
+    assert parallel.equals(serial)
+    assert parallel["chat_name"].tolist()[:3] == ["chat_s0", "chat_s1", "chat_s2"]
+    assert parallel["total_messages"].tolist()[:3] == [4, 5, 6]
@@ -0,0 +1,97 @@
+"""Tests for the shared single-pass WhatsApp export parser."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from modules.chat_parser import parse_chat_file, parse_chat_text
+
+
+SAMPLE = (
+    "texto antes do primeiro cabeçalho\n"
+    "[06/11/2024, 10:38:46] # Fer: Olá, bom dia\n"
+    "[06/11/2024, 10:40:00] Dra Cristal Endocrinologista: Bom dia!  \n"
+    "Segunda linha\n"
+    "\n"
+    "   Terceira linha\n"
+    "[07/11/2024, 08:00:05] # Fer: Hora: 10:00?\n"
+)
+
+
+def _epoch(*args: int) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_parse_columns_and_multiline_messages() -> None:
+    chat = parse_chat_text(SAMPLE)
+
+    assert len(chat) == 3
+    assert chat.senders == ["# Fer", "Dra Cristal Endocrinologista"]
+    assert chat.sender_codes.tolist() == [0, 1, 0]
+    assert chat.timestamps.dtype.kind == "i"
+    assert chat.timestamps.tolist() == [
+        _epoch(2024, 11, 6, 10, 38, 46),
+        _epoch(2024, 11, 6, 10, 40, 0),
+        _epoch(2024, 11, 7, 8, 0, 5),
+    ]
+    assert chat.messages() == [
+        "Olá, bom dia",
+        "Bom dia!\nSegunda linha\n\nTerceira linha",
+        "Hora: 10:00?",
+    ]
+    assert chat.offsets[-1] == len(chat.text)
+
+
+def test_empty_export_yields_empty_columns() -> None:
+    chat = parse_chat_text("nenhuma mensagem aqui\n")
+
+    assert len(chat) == 0
+    assert chat.messages() == []
+    assert chat.to_dataframe().empty
+
+
+def test_to_dataframe_matches_legacy_shape() -> None:
+    df = parse_chat_text(SAMPLE).to_dataframe()
+
+    assert list(df.columns) == ["timestamp", "sender", "message"]
+    assert df["timestamp"].iloc[1] == datetime(2024, 11, 6, 10, 40, 0)
+    assert df["sender"].tolist() == ["# Fer", "Dra Cristal Endocrinologista", "# Fer"]
+
+
+def test_parse_chat_file_reads_export(tmp_path: Path) -> None:
+    path = tmp_path / "_chat.txt"
+    path.write_text(SAMPLE, encoding="utf-8")
+
+    assert parse_chat_file(path).messages() == parse_chat_text(SAMPLE).messages()
+
+
+def test_impossible_dates_are_dropped() -> None:
+    chat = parse_chat_text(
+        "[31/02/2024, 10:00:00] Sol: não existe\n"
+        "[29/02/2024, 23:59:59] # Fer: bissexto\n"
+        "[01/13/2024, 10:00:00] Sol: mês 13\n"
+        "[01/03/2024, 24:00:00] Sol: hora 24\n"
+        "[01/03/2024, 08:00:00] Dra Cristal Endocrinologista: ok\n"
+    )
+
+    assert chat.messages() == ["bissexto", "ok"]
+    assert chat.senders == ["# Fer", "Dra Cristal Endocrinologista"]
+    assert chat.sender_codes.tolist() == [0, 1]
+    assert chat.timestamps.tolist() == [_epoch(2024, 2, 29, 23, 59, 59), _epoch(2024, 3, 1, 8, 0, 0)]
+    assert chat.offsets[-1] == len(chat.text)
+
+
+def test_dropped_dates_keep_first_appearance_order() -> None:
+    chat = parse_chat_text(
+        "[31/02/2024, 10:00:00] Ana: não existe\n"
+        "[01/03/2024, 08:00:00] Zeca: oi\n"
+        "[01/03/2024, 08:01:00] Ana: olá\n"
+    )
+
+    assert chat.senders == ["Zeca", "Ana"]
+    assert chat.sender_codes.tolist() == [0, 1]
+    # swai_core breaks the secretary tie with bincount().argmax()
+    assert chat.senders[np.bincount(chat.sender_codes).argmax()] == "Zeca"
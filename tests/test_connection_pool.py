@@ -0,0 +1,219 @@
+"""Tests for the SWAILitePool connection pool."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+
+import pytest
+
+from integrations.database.connection_pool import PoolTimeout, SWAILitePool, shared_pool
+from pipeline import layer2_grouper
+
+
+def _message(message_id: str, lead: str = "111", timestamp: str = "2025-08-06T10:00:00+00:00") -> dict:
+    return {
+        "message_id": message_id,
+        "sender_phone": lead,
+        "receiver_phone": "999",
+        "sender_type": "lead",
+        "content": "oi",
+        "timestamp": timestamp,
+    }
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SWAILitePool(str(tmp_path / "db.sqlite"), readers=2, timeout=0.5)
+    yield pool
+    pool.close()
+
+
+def test_readers_see_committed_writes_and_cannot_write(pool) -> None:
+    with pool.writer() as manager:
+        manager.store_message(_message("m1"))
+
+    with pool.reader() as manager:
+        assert manager.read_only
+        assert manager.get_message_by_id("m1")["content"] == "oi"
+        with pytest.raises(sqlite3.OperationalError):
+            manager.store_message(_message("m2"))
+
+
+def test_nested_reader_reuses_thread_connection(pool) -> None:
+    with pool.reader() as outer:
+        with pool.reader() as inner:
+            assert inner is outer
+        assert pool.stats()["readers_in_use"] == 1
+
+    stats = pool.stats()
+    assert stats["reader_checkouts"] == 1
+    assert stats["readers_in_use"] == 0
+    assert stats["readers_idle"] == 1
+
+
+def test_concurrent_threads_share_bounded_readers(pool) -> None:
+    with pool.writer() as manager:
+        manager.store_messages([_message(f"m{i}") for i in range(50)])
+
+    errors = []
+    barrier = threading.Barrier(6)
+
+    def work(worker: int) -> None:
+        try:
+            barrier.wait()
+            for i in range(20):
+                with pool.reader() as manager:
+                    assert manager.get_message_by_id(f"m{i}") is not None
+                with pool.writer() as manager:
+                    manager.store_message(_message(f"w{worker}-{i}"))
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stats = pool.stats()
+    assert stats["readers_open"] <= 2
+    assert stats["reader_checkouts"] == 120
+    assert stats["writer_checkouts"] == 121
+    with pool.reader() as manager:
+        count = manager.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    assert count == 170
+
+
+def test_checkout_times_out_when_exhausted(tmp_path) -> None:
+    with SWAILitePool(str(tmp_path / "db.sqlite"), readers=1, timeout=0.05) as pool:
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold() -> None:
+            with pool.reader():
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            with pytest.raises(PoolTimeout):
+                with pool.reader():
+                    pass
+        finally:
+            release.set()
+            thread.join()
+
+        assert pool.stats()["timeouts"] == 1
+        assert pool.stats()["waits"] == 1
+
+
+def test_broken_reader_is_replaced(tmp_path) -> None:
+    with SWAILitePool(str(tmp_path / "db.sqlite"), readers=1, health_check_interval=0) as pool:
+        with pool.reader() as manager:
+            broken = manager
+        broken.conn.close()
+
+        with pool.reader() as manager:
+            assert manager is not broken
+            assert manager.conn.execute("SELECT 1").fetchone()[0] == 1
+        assert pool.stats()["replaced"] == 1
+        assert pool.health()["status"] == "ok"
+
+
+def test_failed_replacement_frees_the_slot(tmp_path, monkeypatch) -> None:
+    from integrations.database import connection_pool
+
+    with SWAILitePool(str(tmp_path / "db.sqlite"), readers=1, timeout=0.1, health_check_interval=0) as pool:
+        with pool.reader() as manager:
+            broken = manager
+        broken.conn.close()
+        writer = pool._writer
+        writer.conn.close()
+
+        def unavailable(*args, **kwargs):
+            raise sqlite3.OperationalError("unable to open database file")
+
+        monkeypatch.setattr(connection_pool, "SWAILiteManager", unavailable)
+        for _ in range(3):
+            with pytest.raises(sqlite3.OperationalError):
+                with pool.reader():
+                    pass
+            with pytest.raises(sqlite3.OperationalError):
+                with pool.writer():
+                    pass
+        assert pool.stats()["readers_open"] == 0
+
+        monkeypatch.undo()
+        with pool.reader() as manager:
+            assert manager.conn.execute("SELECT 1").fetchone()[0] == 1
+        with pool.writer() as manager:
+            assert manager is not writer
+            assert manager.conn.execute("SELECT 1").fetchone()[0] == 1
+        assert pool.stats()["timeouts"] == 0
+
+
+def test_health_reports_and_replaces_dead_idle_readers(pool) -> None:
+    with pool.reader() as manager:
+        broken = manager
+    broken.conn.close()
+
+    health = pool.health()
+
+    assert health == {"status": "degraded", "writer": True, "readers_checked": 1, "readers_replaced": 1}
+    assert pool.health()["status"] == "ok"
+
+
+def test_closed_pool_rejects_checkouts(tmp_path) -> None:
+    pool = SWAILitePool(str(tmp_path / "db.sqlite"))
+    pool.close()
+    with pytest.raises(RuntimeError):
+        with pool.reader():
+            pass
+    with pytest.raises(RuntimeError):
+        with pool.writer():
+            pass
+
+
+def test_pool_rejects_memory_database() -> None:
+    with pytest.raises(ValueError):
+        SWAILitePool(":memory:")
+
+
+def test_shared_pool_is_reused_per_path(tmp_path) -> None:
+    path = str(tmp_path / "db.sqlite")
+    pool = shared_pool(path)
+    try:
+        assert shared_pool(path) is pool
+    finally:
+        pool.close()
+    replacement = shared_pool(path)
+    assert replacement is not pool
+    replacement.close()
+
+
+def test_layer2_grouping_through_pool_from_threads(pool) -> None:
+    layer2_grouper.configure(pool)
+    try:
+        threads = [
+            threading.Thread(target=lambda n=n: [
+                layer2_grouper.process_layer2_grouping(_message(f"{n}-{i}", lead=str(n)))
+                for i in range(5)
+            ])
+            for n in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = layer2_grouper.process_layer2_batch([_message("0-5", lead="0")])
+    finally:
+        layer2_grouper.configure(None)
+
+    assert results[0]["conversation_id"] == "0_20250806"
+    with pool.reader() as manager:
+        assert manager.get_conversation("0_20250806")["message_count"] == 6
+        assert manager.get_conversation("3_20250806")["message_count"] == 5
@@ -0,0 +1,93 @@
+"""Tests for the cached data service used by the swai_ui_* pages."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+import swai_data
+from swai_core import SWAIAnalyzer, create_sample_data
+
+
+@pytest.fixture
+def settings(tmp_path):
+    swai_data.clear_data_cache()
+    yield {"FEATURE_STORE_DIR": str(tmp_path / "store"), "FEATURES_CSV": str(tmp_path / "features.csv")}
+    swai_data.clear_data_cache()
+
+
+def _features(types: list[str]) -> pd.DataFrame:
+    return create_sample_data().head(len(types)).assign(chat_type=types)
+
+
+def test_falls_back_to_sample_data(settings) -> None:
+    df, is_sample = swai_data.get_conversation_data(settings)
+
+    assert is_sample
+    assert not df.empty
+
+
+def test_cache_hit_until_files_change(settings, monkeypatch) -> None:
+    SWAIAnalyzer(settings).save_conversation_data(_features(["success", "fail"]))
+    loads = []
+    original = SWAIAnalyzer.load_conversation_data
+    monkeypatch.setattr(SWAIAnalyzer, "load_conversation_data",
+                        lambda self, *a, **kw: loads.append(1) or original(self, *a, **kw))
+
+    first = swai_data.get_basic_metrics(settings)
+    swai_data.get_conversation_data(settings)
+    assert first["summary"]["total_conversations"] == 2
+    assert len(loads) == 1
+
+    SWAIAnalyzer(settings).save_conversation_data(_features(["success", "success", "fail"]))
+    assert swai_data.get_basic_metrics(settings)["summary"]["total_conversations"] == 3
+    assert len(loads) == 2
+
+
+def test_cost_analysis_keyed_on_financial_settings(settings) -> None:
+    SWAIAnalyzer(settings).save_conversation_data(_features(["success", "fail"]))
+    config = {"valor_consulta": 800.0, "leads_diarios": 5, "dias_uteis_mes": 20, "dias_uteis_ano": 240}
+
+    cheap, _ = swai_data.get_cost_analysis(settings, config)
+    expensive, insights = swai_data.get_cost_analysis(settings, {**config, "valor_consulta": 1600.0})
+
+    assert expensive["current_costs"]["diario"] == 2 * cheap["current_costs"]["diario"]
+    assert isinstance(insights, list)
+
+
+def test_clear_data_cache_forces_reload(settings, monkeypatch) -> None:
+    swai_data.get_conversation_data(settings)
+    loads = []
+    monkeypatch.setattr(SWAIAnalyzer, "load_conversation_data", lambda self, *a, **kw: loads.append(1))
+
+    swai_data.get_conversation_data(settings)
+    swai_data.clear_data_cache()
+    swai_data.get_conversation_data(settings)
+
+    assert len(loads) == 1
+
+
+def test_live_features_follow_the_messages_database(settings, tmp_path) -> None:
+    from integrations.database.sqlite_manager import SWAILiteManager
+    from pipeline import layer2_grouper
+
+    settings["MESSAGES_DB"] = str(tmp_path / "messages.db")
+    assert swai_data.get_live_features(settings).empty
+
+    manager = SWAILiteManager(settings["MESSAGES_DB"])
+    messages = [
+        {"message_id": f"m{i}", "sender_phone": "5511999", "receiver_phone": "5511888", "sender_type": "lead",
+         "content": "quanto custa?", "timestamp": f"2025-08-06T10:0{i}:00+00:00"}
+        for i in range(2)
+    ]
+    records = layer2_grouper.conversation_records(messages)
+    manager.store_and_group(messages, records)
+    with manager.conn:
+        manager.conn.execute("DELETE FROM conversation_features")
+    manager.close()
+
+    assert swai_data.get_live_features(settings).empty
+    assert swai_data.rebuild_live_features(settings) == 1
+    live = swai_data.get_live_features(settings)
+    assert live["total_messages"].tolist() == [2]
+    assert live["chat_type"].tolist() == ["live"]
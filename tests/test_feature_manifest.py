@@ -0,0 +1,132 @@
+"""Tests for incremental reprocessing driven by the feature manifest."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from modules.feature_manifest import MANIFEST_VERSION, FeatureManifest, incremental_extract, manifest_path_for
+import swai_core
+
+
+CALLS: list[str] = []
+
+
+def _extract(chat_file: str, chat_type: str) -> dict:
+    CALLS.append(Path(chat_file).parent.name)
+    text = Path(chat_file).read_text(encoding="utf-8")
+    return {"chat_name": Path(chat_file).parent.name, "chat_type": chat_type, "size": len(text)}
+
+
+def _write_chat(base: Path, name: str, body: str) -> str:
+    folder = base / name
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / "_chat.txt"
+    path.write_text(body, encoding="utf-8")
+    return str(path)
+
+
+def test_only_new_or_changed_exports_are_extracted(tmp_path: Path) -> None:
+    manifest_path = tmp_path / "features.manifest.json"
+    a = _write_chat(tmp_path, "a", "[01/01/2025, 10:00:00] X: oi\n")
+    b = _write_chat(tmp_path, "b", "[01/01/2025, 10:00:00] Y: oi\n")
+    tasks = [(a, "success"), (b, "fail")]
+
+    CALLS.clear()
+    rows, stats = incremental_extract(_extract, tasks, manifest_path)
+    assert CALLS == ["a", "b"]
+    assert stats == {"reused": 0, "extracted": 2, "failed": 0, "removed": 0}
+    assert [r["chat_name"] for r in rows] == ["a", "b"]
+
+    # Nothing changed: no extraction at all
+    CALLS.clear()
+    rows, stats = incremental_extract(_extract, tasks, manifest_path)
+    assert CALLS == []
+    assert stats["reused"] == 2
+
+    # Touched but identical content is detected through the hash
+    os.utime(a, ns=(1, 1))
+    c = _write_chat(tmp_path, "c", "[02/01/2025, 10:00:00] Z: novo\n")
+    Path(b).write_text("[01/01/2025, 10:00:00] Y: conteúdo alterado\n", encoding="utf-8")
+    CALLS.clear()
+    rows, stats = incremental_extract(_extract, [(a, "success"), (b, "fail"), (c, "fail")], manifest_path)
+    assert sorted(CALLS) == ["b", "c"]
+    assert stats == {"reused": 1, "extracted": 2, "failed": 0, "removed": 0}
+    assert [r["chat_name"] for r in rows] == ["a", "b", "c"]
+
+
+def test_removed_exports_are_dropped(tmp_path: Path) -> None:
+    manifest_path = tmp_path / "m.json"
+    a = _write_chat(tmp_path, "a", "[01/01/2025, 10:00:00] X: oi\n")
+    b = _write_chat(tmp_path, "b", "[01/01/2025, 10:00:00] Y: oi\n")
+    incremental_extract(_extract, [(a, "success"), (b, "fail")], manifest_path)
+
+    rows, stats = incremental_extract(_extract, [(a, "success")], manifest_path)
+
+    assert stats["removed"] == 1
+    assert [r["chat_name"] for r in rows] == ["a"]
+    assert list(FeatureManifest.load(manifest_path).entries) == [a]
+
+
+def test_config_change_discards_cached_rows(tmp_path: Path) -> None:
+    manifest_path = tmp_path / "m.json"
+    a = _write_chat(tmp_path, "a", "[01/01/2025, 10:00:00] X: oi\n")
+    incremental_extract(_extract, [(a, "success")], manifest_path, config="v1")
+
+    CALLS.clear()
+    incremental_extract(_extract, [(a, "success")], manifest_path, config="v1")
+    assert CALLS == []
+    _, stats = incremental_extract(_extract, [(a, "success")], manifest_path, config="v2")
+    assert CALLS == ["a"]
+    assert stats["extracted"] == 1
+
+
+def test_failed_extractions_are_retried(tmp_path: Path) -> None:
+    manifest_path = tmp_path / "m.json"
+    a = _write_chat(tmp_path, "a", "[01/01/2025, 10:00:00] X: oi\n")
+
+    rows, stats = incremental_extract(lambda chat_file, chat_type: {}, [(a, "success")], manifest_path)
+    assert rows == []
+    assert stats["failed"] == 1
+    assert FeatureManifest.load(manifest_path).entries == {}
+
+    rows, stats = incremental_extract(_extract, [(a, "success")], manifest_path)
+    assert [r["chat_name"] for r in rows] == ["a"]
+    assert stats["extracted"] == 1
+
+
+def test_corrupt_manifest_triggers_full_rebuild(tmp_path: Path) -> None:
+    manifest_path = tmp_path / "m.json"
+    manifest_path.write_text("{not json")
+    a = _write_chat(tmp_path, "a", "[01/01/2025, 10:00:00] X: oi\n")
+
+    rows, stats = incremental_extract(_extract, [(a, "success")], manifest_path)
+
+    assert stats["extracted"] == 1
+    assert json.loads(manifest_path.read_text())["version"] == MANIFEST_VERSION
+
+
+def test_process_all_conversations_incremental(tmp_path: Path) -> None:
+    success_dir = tmp_path / "success_cases"
+    _write_chat(success_dir, "chat1", "[01/01/2025, 10:00:00] Lead: consulta?\n[01/01/2025, 10:05:00] Sol: sim\n")
+    settings = {
+        "SUCCESS_CASES_DIR": str(success_dir),
+        "FAIL_CASES_DIR": str(tmp_path / "fail_cases"),
+        "FEATURES_CSV": str(tmp_path / "features.csv"),
+        "AGENDAMENTO_KEYWORDS": ["consulta"],
+    }
+    extractor = swai_core.SWAIConversationExtractor(settings)
+
+    first = extractor.process_all_conversations(workers=1, incremental=True)
+    second = extractor.process_all_conversations(workers=1, incremental=True)
+
+    assert extractor.manifest_path() == manifest_path_for(settings["FEATURES_CSV"])
+    assert extractor.manifest_path().exists()
+    assert first.equals(second)
+    assert first["agendamento_keywords"].tolist() == [1]
+
+    # New keywords invalidate the cached rows
+    settings["AGENDAMENTO_KEYWORDS"] = ["consulta", "sim"]
+    third = swai_core.SWAIConversationExtractor(settings).process_all_conversations(workers=1, incremental=True)
+    assert third["agendamento_keywords"].tolist() == [2]
@@ -0,0 +1,155 @@
+"""Tests for the partitioned Parquet feature store."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from modules.feature_store import FeatureStore, apply_filters, count_features, load_features, save_features
+
+
+def _features() -> pd.DataFrame:
+    return pd.DataFrame({
+        "chat_name": ["a", "b", "c"],
+        "chat_type": ["success", "fail", "success"],
+        "start_time": ["2025-01-10T09:00:00", "2025-02-01T10:30:00", None],
+        "duration_minutes": [12.5, 3.0, 40.0],
+        "total_messages": [10, 4, 22],
+    })
+
+
+def test_write_partitions_by_clinic_and_month_with_types(tmp_path) -> None:
+    store = FeatureStore(tmp_path)
+    store.write(_features(), clinic="c1")
+
+    clinic_dir = tmp_path / "features" / "clinic=c1"
+    current = clinic_dir / (clinic_dir / "CURRENT").read_text()
+    months = sorted(p.name for p in current.iterdir())
+    assert months == ["month=2025-01", "month=2025-02", "month=desconhecido"]
+
+    df = store.read()
+    assert isinstance(df["chat_type"].dtype, pd.CategoricalDtype)
+    assert str(df["total_messages"].dtype) == "Int32"
+    assert store.count_rows() == 3
+
+
+def test_projection_and_filters(tmp_path) -> None:
+    store = FeatureStore(tmp_path)
+    store.write(_features(), clinic="c1")
+    store.write(_features().iloc[:1], clinic="c2")
+
+    df = store.read(columns=["chat_name", "total_messages"], filters=[("clinic", "=", "c1"), ("total_messages", ">", 5)])
+
+    assert list(df.columns) == ["chat_name", "total_messages"]
+    assert sorted(df["chat_name"]) == ["a", "c"]
+    assert store.count_rows([("month", "=", "2025-01")]) == 2
+
+
+def test_rewrite_replaces_only_that_clinic(tmp_path) -> None:
+    store = FeatureStore(tmp_path)
+    store.write(_features(), clinic="c1")
+    store.write(_features(), clinic="c2")
+
+    store.write(_features().iloc[:1], clinic="c1")
+
+    assert store.count_rows() == 4
+
+
+def test_missing_counts_stay_null(tmp_path) -> None:
+    store = FeatureStore(tmp_path)
+    store.write(_features().assign(total_messages=[10, None, 20]), clinic="c1")
+
+    df = store.read()
+    assert df["total_messages"].isna().sum() == 1
+    assert df["total_messages"].mean() == 15
+
+
+def test_failed_write_keeps_previous_rows(tmp_path, monkeypatch) -> None:
+    store = FeatureStore(tmp_path)
+    store.write(_features(), clinic="c1")
+
+    def crash(*args, **kwargs):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr("modules.feature_store.pq.write_to_dataset", crash)
+    with pytest.raises(OSError):
+        store.write(_features().iloc[:1], clinic="c1")
+    assert store.count_rows() == 3
+
+    monkeypatch.undo()
+    store.write(_features().iloc[:1], clinic="c1")
+    assert store.count_rows() == 1
+    assert [p.name for p in store.path.iterdir()] == ["clinic=c1"]
+
+
+def test_readers_see_old_rows_until_the_pointer_flips(tmp_path, monkeypatch) -> None:
+    import os
+
+    store = FeatureStore(tmp_path)
+    store.write(_features(), clinic="c1")
+    seen = []
+    replace = os.replace
+
+    def observed_replace(src, dst):
+        seen.append(store.count_rows())
+        replace(src, dst)
+        seen.append(store.count_rows())
+
+    monkeypatch.setattr("modules.feature_store.os.replace", observed_replace)
+    store.write(_features().iloc[:1], clinic="c1")
+    monkeypatch.undo()
+
+    assert seen == [3, 1]
+    store.write(_features().iloc[:2], clinic="c1")
+    versions = [p for p in (store.path / "clinic=c1").iterdir() if p.is_dir()]
+    assert len(versions) == 2  # the live one and the one it replaced
+
+
+def test_reads_unversioned_clinic_directories(tmp_path) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    legacy = _features().assign(month=["2025-01", "2025-02", "desconhecido"])
+    pq.write_to_dataset(pa.Table.from_pandas(legacy, preserve_index=False),
+                        root_path=str(tmp_path / "features" / "clinic=old"), partition_cols=["month"])
+    store = FeatureStore(tmp_path)
+    assert store.count_rows() == 3
+
+    store.write(_features().iloc[:1], clinic="old")
+    assert store.count_rows() == 1
+
+
+def test_month_ranges_skip_the_unknown_partition(tmp_path) -> None:
+    store = FeatureStore(tmp_path)
+    store.write(_features(), clinic="c1")
+
+    assert store.count_rows([("month", ">=", "2025-02")]) == 1
+    assert store.count_rows([("month", "!=", "2025-01")]) == 2
+
+    csv_rows = _features().assign(month=["2025-01", "2025-02", "desconhecido"])
+    assert apply_filters(csv_rows, [("month", ">", "2025-01")])["chat_name"].tolist() == ["b"]
+
+
+def test_csv_fallback_applies_same_semantics(tmp_path) -> None:
+    csv_path = tmp_path / "features.csv"
+    _features().to_csv(csv_path, index=False)
+
+    df = load_features(tmp_path / "store", csv_path, columns=["chat_name"], filters=[("chat_type", "in", ["fail"])])
+
+    assert df["chat_name"].tolist() == ["b"]
+    assert count_features(tmp_path / "store", csv_path) == 3
+    assert load_features(tmp_path / "store", tmp_path / "missing.csv") is None
+
+
+def test_save_features_prefers_parquet(tmp_path) -> None:
+    csv_path = tmp_path / "features.csv"
+
+    save_features(_features(), tmp_path / "store", csv_path)
+
+    assert not csv_path.exists()
+    assert load_features(tmp_path / "store", csv_path)["chat_name"].tolist() == ["a", "b", "c"]
+
+
+def test_unknown_filter_operator_rejected() -> None:
+    with pytest.raises(ValueError):
+        apply_filters(_features(), [("total_messages", "~", 1)])
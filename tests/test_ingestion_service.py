@@ -0,0 +1,197 @@
+"""Tests for the asyncio webhook ingestion service."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from integrations.database.sqlite_manager import SWAILiteManager
+from pipeline.ingestion_service import IngestionService, extract_raw_messages
+from pipeline.layer1_formatter import Layer1FormatError
+
+
+def _raw(idx: int, sender: str = "5511999990000@s.whatsapp.net") -> dict:
+    return {
+        "id": f"m{idx}",
+        "sender_raw_data": sender,
+        "receiver_raw_data": "5511888880000@s.whatsapp.net",
+        "sender_type": "lead",
+        "sent_message": f"mensagem {idx}",
+        "timestamp": f"2025-08-07T15:{idx % 60:02d}:00",
+    }
+
+
+async def _request(port: int, method: str, path: str, payload=None) -> tuple[int, dict]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+def test_extract_raw_messages_accepts_envelopes() -> None:
+    assert extract_raw_messages({"data": _raw(1)}) == [_raw(1)]
+    assert len(extract_raw_messages([{"data": [_raw(1), _raw(2)]}, _raw(3)])) == 3
+    with pytest.raises(Layer1FormatError):
+        extract_raw_messages("texto")
+
+
+def test_webhook_ingests_through_layer1_and_layer2(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    grouped = []
+
+    async def scenario() -> list:
+        service = IngestionService(str(db_path), port=0, on_batch=grouped.extend)
+        await service.start()
+        try:
+            replies = await asyncio.gather(*(_request(service.port, "POST", "/webhook", {"data": _raw(i)}) for i in range(3)))
+            replies.append(await _request(service.port, "POST", "/webhook", {"data": {"id": "x"}}))
+            replies.append(await _request(service.port, "POST", "/webhook", None))
+            replies.append(await _request(service.port, "GET", "/nada"))
+        finally:
+            await service.stop()
+        return replies
+
+    replies = asyncio.run(scenario())
+
+    assert [status for status, _ in replies[:3]] == [202, 202, 202]
+    assert replies[3] == (202, {"accepted": 0, "errors": [{"index": 0, "error": "timestamp ausente"}]})
+    assert replies[4][0] == 400
+    assert replies[5][0] == 404
+
+    manager = SWAILiteManager(str(db_path))
+    conversation = manager.get_conversation("5511999990000_20250807")
+    manager.close()
+    assert conversation["message_count"] == 3
+    assert [result["ready_for_ai"] for _, result in grouped].count(True) == 1
+
+
+def test_burst_is_written_in_batches(tmp_path: Path) -> None:
+    async def scenario() -> dict:
+        service = IngestionService(str(tmp_path / "db.sqlite"), port=0, batch_size=50)
+        await service.start()
+        try:
+            await asyncio.gather(*(service.submit({"data": _raw(i, sender=f"55119{i:08d}")}) for i in range(300)))
+            _, health = await _request(service.port, "GET", "/health")
+        finally:
+            await service.stop()
+        return service.health(), health
+
+    final, health = asyncio.run(scenario())
+
+    assert final["write_behind"]["written"] == 300
+    assert final["write_behind"]["flushes"] < 300
+    assert health["status"] == "ok"
+
+
+def test_session_grouping_option(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    grouped = []
+
+    async def scenario() -> dict:
+        service = IngestionService(str(db_path), port=0, on_batch=grouped.extend, session_gap_minutes=30)
+        await service.start()
+        try:
+            await _request(service.port, "POST", "/webhook", [{"data": _raw(i)} for i in range(3)])
+            await asyncio.get_running_loop().run_in_executor(None, service._queue.flush)
+            return service.health()
+        finally:
+            await service.stop()
+
+    health = asyncio.run(scenario())
+
+    assert health["sessions"]["messages"] == 3
+    assert {result["conversation_id"] for _, result in grouped} == {"5511999990000_5511888880000_20250807T150000"}
+    manager = SWAILiteManager(str(db_path))
+    assert manager.get_lead_conversations("5511999990000")[0]["message_count"] == 3
+    manager.close()
+
+
+def test_ready_conversations_are_dispatched(tmp_path: Path) -> None:
+    from pipeline.ai_dispatch import Dispatcher, SQLiteDispatchBackend
+
+    db_path = str(tmp_path / "db.sqlite")
+    backend = SQLiteDispatchBackend(db_path)
+    dispatcher = Dispatcher(backend, lambda jobs: None)
+
+    async def scenario() -> None:
+        service = IngestionService(db_path, port=0, on_batch=dispatcher.on_batch)
+        await service.start()
+        try:
+            await _request(service.port, "POST", "/webhook", [{"data": _raw(i)} for i in range(4)])
+            await asyncio.get_running_loop().run_in_executor(None, service._queue.flush)
+        finally:
+            await service.stop()
+
+    asyncio.run(scenario())
+
+    assert backend.get("5511999990000_20250807")["status"] == "pending"
+    assert dispatcher.drain() == 1
+    assert backend.counts()["done"] == 1
+    backend.close()
+
+
+def test_writer_leaves_layer2_configuration_alone(tmp_path: Path) -> None:
+    from pipeline import layer2_grouper
+
+    other = SWAILiteManager(str(tmp_path / "other.sqlite"))
+    layer2_grouper.configure(other)
+
+    async def scenario() -> None:
+        service = IngestionService(str(tmp_path / "db.sqlite"), port=0)
+        await service.start()
+        try:
+            await service.submit({"data": _raw(1)})
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(scenario())
+        assert layer2_grouper._db_manager is other
+    finally:
+        layer2_grouper.configure(None)
+        other.close()
+
+
+def test_messages_and_links_commit_together(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "db.sqlite"
+
+    def broken(self, records):
+        raise RuntimeError("falha no agrupamento")
+
+    monkeypatch.setattr(SWAILiteManager, "_group_batch", broken)
+    service = IngestionService(str(db_path), port=0)
+    service._open_database()
+    try:
+        with pytest.raises(RuntimeError):
+            service._write_batch([{"message_id": "m1", "sender_phone": "5511999990000",
+                                   "receiver_phone": "5511888880000", "sender_type": "lead",
+                                   "timestamp": "2025-08-07T15:00:00"}])
+        assert service._manager.get_message_by_id("m1") is None
+    finally:
+        service._close_database()
+
+
+def test_closed_queue_answers_503(tmp_path: Path) -> None:
+    async def scenario() -> tuple:
+        service = IngestionService(str(tmp_path / "db.sqlite"), port=0)
+        await service.start()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, service._queue.close)
+            return await _request(service.port, "POST", "/webhook", {"data": _raw(1)})
+        finally:
+            await service.stop()
+
+    status, body = asyncio.run(scenario())
+
+    assert status == 503
+    assert "error" in body
@@ -0,0 +1,90 @@
+"""Tests for the single-pass keyword family matcher."""
+
+from __future__ import annotations
+
+import pytest
+
+from modules import keyword_matcher
+from modules.keyword_matcher import KeywordAutomaton
+
+
+BACKENDS = [
+    "regex",
+    pytest.param(
+        "ahocorasick",
+        marks=pytest.mark.skipif(keyword_matcher.ahocorasick is None, reason="pyahocorasick não instalado"),
+    ),
+]
+
+FAMILIES = {
+    "agendamento": ["agenda", "agendar", "horário", "consulta"],
+    "preco": ["valor", "valores", "custa"],
+}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_counts_match_per_keyword_str_count(backend: str) -> None:
+    text = "Quero AGENDAR uma consulta. Qual o valor? Os valores da agenda... custa quanto? agendar!"
+    automaton = KeywordAutomaton(FAMILIES, backend=backend)
+
+    lowered = text.lower()
+    expected = {family: sum(lowered.count(k) for k in keywords) for family, keywords in FAMILIES.items()}
+
+    assert automaton.count(text) == expected
+    assert automaton.keyword_counts(text)["agenda"] == 3
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_repeated_keyword_occurrences_do_not_overlap(backend: str) -> None:
+    automaton = KeywordAutomaton({"a": ["aa", "aaa"], "b": ["haha"]}, backend=backend)
+    text = "aaaaa hahaha"
+
+    assert automaton.keyword_counts(text) == {"aa": text.count("aa"), "aaa": text.count("aaa"), "haha": 1}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_distinct_matches_presence_semantics(backend: str) -> None:
+    automaton = KeywordAutomaton(FAMILIES, backend=backend)
+
+    assert automaton.distinct("agendar agendar valor") == {"agendamento": 2, "preco": 1}
+    assert automaton.distinct("") == {"agendamento": 0, "preco": 0}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_word_boundary_only_counts_whole_words(backend: str) -> None:
+    automaton = KeywordAutomaton(FAMILIES, word_boundary=True, backend=backend)
+
+    counts = automaton.keyword_counts("valores do valor; reagendar a agenda")
+
+    assert counts == {"valores": 1, "valor": 1, "agenda": 1}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_accent_folding(backend: str) -> None:
+    plain = KeywordAutomaton({"a": ["horário"]}, backend=backend)
+    folded = KeywordAutomaton({"a": ["horário"]}, fold_accents=True, backend=backend)
+
+    assert plain.count("HORARIO e horário") == {"a": 1}
+    assert folded.count("HORARIO e horário") == {"a": 2}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_multi_word_keyword_with_nested_prefix(backend: str) -> None:
+    automaton = KeywordAutomaton({"dados": ["nome", "nome completo"]}, word_boundary=True, backend=backend)
+
+    assert automaton.keyword_counts("nome completo, nome") == {"nome completo": 1, "nome": 2}
+
+
+def test_from_settings_is_cached_until_keywords_change() -> None:
+    settings = {"AGENDAMENTO_KEYWORDS": ["agendar"], "PRECO_KEYWORDS": ["valor"]}
+
+    first = KeywordAutomaton.from_settings(settings)
+    assert KeywordAutomaton.from_settings(dict(settings)) is first
+
+    settings["PRECO_KEYWORDS"] = ["valor", "pix"]
+    assert KeywordAutomaton.from_settings(settings) is not first
+
+
+def test_unknown_backend_rejected() -> None:
+    with pytest.raises(ValueError):
+        KeywordAutomaton(FAMILIES, backend="nope")
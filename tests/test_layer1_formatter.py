@@ -0,0 +1,79 @@
+"""Tests for the Layer 1 formatter."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from pipeline.layer1_formatter import Layer1FormatError, format_message, format_messages_batch
+
+
+RAW_MESSAGES = [
+    {"id": "m1", "timestamp": 1700000000, "from": "5511999@s.whatsapp.net", "to": "5511888", "text": {"body": "oi"}},
+    {"message_id": "m2", "timestamp": "1700000060", "sender_raw_data": "5511999", "receiver_raw_data": "5511888@c.us",
+     "sent_message": "olá", "sender_type": "lead", "message_type": "text"},
+    {"timestamp": "2025-08-06T10:00:00", "sender_raw_data": "5511777@s.whatsapp.net", "to": "5511888", "body": 42},
+    {"id": "", "timestamp": "2025-08-06T10:00:00-03:00", "from": "5511777", "to": "5511888", "content": "agenda"},
+    {"timestamp": 1700000000.9, "from": None, "to": "5511888", "text": "not a dict"},
+    {"timestamp": "ontem", "sender_raw_data": None, "from": "5511666", "sent_message": None, "body": None},
+    {"id": "m7", "timestamp": "2025-08-06T10:00:00", "text": {"caption": "sem body"}},
+    {"id": "m8", "timestamp": 1754474400250, "from": "5511999", "to": "5511888", "sent_message": "ms"},
+]
+
+
+def test_batch_matches_format_message() -> None:
+    assert format_messages_batch(RAW_MESSAGES) == [format_message(m) for m in RAW_MESSAGES]
+
+
+def test_batch_empty_phones_without_fallback_columns() -> None:
+    # No message has "from"/"to": empty raw data must still become None
+    raw = [
+        {"id": "a", "timestamp": 1700000000, "sender_raw_data": "", "receiver_raw_data": "5511888"},
+        {"id": "b", "timestamp": 1700000000, "sender_raw_data": "5511999", "receiver_raw_data": ""},
+    ]
+
+    formatted = format_messages_batch(raw)
+
+    assert formatted == [format_message(m) for m in raw]
+    assert [(m["sender_phone"], m["receiver_phone"]) for m in formatted] == [(None, "5511888"), ("5511999", None)]
+
+
+def test_batch_generates_the_same_deterministic_ids() -> None:
+    raw = {"timestamp": 1700000000, "sender_raw_data": "5511999", "receiver_raw_data": "5511888", "sent_message": "oi"}
+
+    first, second = format_messages_batch([raw, dict(raw, sent_message="tchau")])
+
+    assert first["message_id"] == format_message(raw)["message_id"]
+    assert first["message_id"] != second["message_id"]
+
+
+def test_batch_accepts_dataframes_and_arrow_tables() -> None:
+    frame = pd.DataFrame([m for m in RAW_MESSAGES if "text" not in m]).astype({"timestamp": str})
+    # A null cell is an absent key
+    rows = [{k: v for k, v in row.items() if not pd.isna(v)} for row in frame.to_dict("records")]
+    expected = [format_message(row) for row in rows]
+
+    assert format_messages_batch(frame) == expected
+
+    pa = pytest.importorskip("pyarrow")
+    assert format_messages_batch(pa.Table.from_pandas(frame, preserve_index=False)) == expected
+
+
+def test_batch_epoch_column_from_dataframe() -> None:
+    frame = pd.DataFrame({"id": ["a", "b"], "timestamp": [0, 1754474400], "from": ["1", "2"], "to": ["3", "4"]})
+
+    formatted = format_messages_batch(frame)
+
+    assert [m["timestamp"] for m in formatted] == ["1970-01-01T00:00:00+00:00", "2025-08-06T10:00:00+00:00"]
+
+
+@pytest.mark.parametrize("timestamp,detail", [(None, "timestamp ausente"), ([1], "formato de timestamp inválido")])
+def test_batch_rejects_what_format_message_rejects(timestamp, detail) -> None:
+    messages = [{"id": "ok", "timestamp": 1}, {"id": "bad", "timestamp": timestamp}]
+
+    with pytest.raises(Layer1FormatError, match=f"mensagem 1: {detail}"):
+        format_messages_batch(messages)
+
+
+def test_batch_of_nothing() -> None:
+    assert format_messages_batch([]) == []
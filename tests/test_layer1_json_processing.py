@@ -2,9 +2,12 @@
 
 from __future__ import annotations
 
+import gzip
 import importlib.util
 import json
 from pathlib import Path
+import sqlite3
+import sys
 
 import pytest
 
@@ -15,6 +18,8 @@ from integrations.database.sqlite_manager import SWAILiteManager
 MODULE_PATH = Path(__file__).resolve().parents[1] / "scripts" / "process_n8n_json_layer1.py"
 spec = importlib.util.spec_from_file_location("process_n8n_json_layer1", MODULE_PATH)
 process_module = importlib.util.module_from_spec(spec)
+# Registered so worker processes can unpickle its functions
+sys.modules[spec.name] = process_module
 spec.loader.exec_module(process_module)  # type: ignore[attr-defined]
 process_directory = process_module.process_directory
 
@@ -120,3 +125,109 @@ def test_bulk_processing_performance(tmp_path: Path) -> None:
 
     assert _db_rows(db_path) == 120
 
+
+
+def _write_jsonl(path: Path, payloads: list, compress: bool = False) -> Path:
+    text = "".join(json.dumps(p) + "\n" for p in payloads)
+    if compress:
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        path.write_text(text)
+    return path
+
+
+@pytest.mark.parametrize("name,compress", [("export.jsonl", False), ("export.jsonl.gz", True)])
+def test_process_jsonl_stream(tmp_path: Path, name: str, compress: bool) -> None:
+    db_path = tmp_path / "db.sqlite"
+    stream = _write_jsonl(tmp_path / name, [_payload(f"s{i}", timestamp=i) for i in range(5)], compress)
+
+    summary = process_module.process_source(stream, db_path, batch_size=2)
+
+    assert summary == {"processed": 5, "duplicates": 0, "errors": 0}
+    assert _db_rows(db_path) == 5
+
+
+def test_jsonl_errors_report_line_numbers(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    db_path = tmp_path / "db.sqlite"
+    stream = tmp_path / "export.jsonl"
+    stream.write_text(json.dumps(_payload("ok1")) + "\n\n{broken\n" + json.dumps({"foo": 1}) + "\n")
+
+    summary = process_module.process_source(stream, db_path)
+    captured = capsys.readouterr()
+
+    assert summary == {"processed": 1, "duplicates": 0, "errors": 2}
+    assert "erro ao processar export.jsonl:3" in captured.out
+    assert "export.jsonl:4: campo 'data' ausente" in captured.out
+
+
+def test_directory_mixes_json_files_and_streams(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    _write_json(tmp_path, "msg.json", _payload("f1"))
+    _write_jsonl(tmp_path / "more.ndjson", [_payload("f1"), _payload("f2")])
+
+    summary = process_directory(tmp_path, db_path)
+
+    assert summary == {"processed": 2, "duplicates": 1, "errors": 0}
+
+
+def test_iter_stream_is_lazy(tmp_path: Path) -> None:
+    stream = _write_jsonl(tmp_path / "export.jsonl", [_payload(f"l{i}") for i in range(3)])
+
+    records = process_module.iter_stream(stream)
+    label, raw = next(records)
+
+    assert label == "export.jsonl:1"
+    assert json.loads(raw)["data"]["id"] == "l0"
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_json_backends_format_identically(backend: str) -> None:
+    if backend == "orjson":
+        pytest.importorskip("orjson")
+    raw = json.dumps(_payload("b1", text="olá")).encode("utf-8")
+
+    formatted = process_module.format_record(raw, process_module.json_loads(backend))
+
+    assert formatted == process_module.format_record(raw)
+
+
+def test_parallel_mode_matches_serial(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    payloads = [_payload(f"p{i % 40}", timestamp=i) for i in range(50)]
+    stream = tmp_path / "export.jsonl"
+    stream.write_text("".join(json.dumps(p) + "\n" for p in payloads) + "{broken\n")
+
+    serial = process_module.process_source(stream, tmp_path / "serial.sqlite", batch_size=7)
+    parallel = process_module.process_source(stream, tmp_path / "parallel.sqlite", batch_size=7, workers=2)
+    captured = capsys.readouterr()
+
+    assert parallel == serial == {"processed": 40, "duplicates": 10, "errors": 1}
+    assert captured.out.count("erro ao processar export.jsonl:51") == 2
+    assert _db_rows(tmp_path / "parallel.sqlite") == 40
+
+
+def test_parallel_mode_fails_before_formatting_when_database_cannot_open(tmp_path: Path, monkeypatch) -> None:
+    formatted = []
+    monkeypatch.setattr(process_module, "format_chunk", lambda *args: formatted.append(args) or [])
+    records = iter([("a", json.dumps(_payload("a")).encode())])
+
+    with pytest.raises(sqlite3.OperationalError):
+        process_module.process_records_parallel(records, tmp_path / "missing" / "db.sqlite", workers=2)
+
+    assert formatted == []
+    assert next(records, None) is not None  # the input was not consumed
+
+
+def test_format_chunk_reports_errors_per_record() -> None:
+    chunk = [("a", json.dumps(_payload("c1")).encode()), ("b", b"{}")]
+
+    results = process_module.format_chunk(chunk, "json")
+
+    assert results[0][1]["message_id"] == "c1" and results[0][2] is None
+    assert results[1] == ("b", None, "campo 'data' ausente")
+
+
+def test_format_summary_reports_throughput() -> None:
+    line = process_module.format_summary({"processed": 90, "duplicates": 5, "errors": 5}, 2.0)
+
+    assert "100 registros em 2.00s (50 msg/s)" in line
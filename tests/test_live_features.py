@@ -0,0 +1,201 @@
+"""Tests for conversation features maintained incrementally in SQLite."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from integrations.database.sqlite_manager import SWAILiteManager
+from modules.extract_features import extract_features
+from modules.live_features import COUNTER_COLUMNS, features_frame, load_live_features
+from pipeline import layer2_grouper
+from pipeline.session_engine import SessionEngine
+
+
+LEAD = "5511999990000"
+SECRETARY = "Sol"  # a secretary sender for extract_features as well
+
+CHAT = [
+    (LEAD, "Oi, qual o valor da consulta?"),
+    (SECRETARY, "Olá! A consulta custa 800 reais."),
+    (SECRETARY, "Quer agendar um horário?"),
+    (LEAD, "Quero marcar sim"),
+    (LEAD, "[áudio ocultado]"),
+    (SECRETARY, "Temos disponibilidade amanhã"),
+]
+
+
+def _messages(chat=CHAT, prefix: str = "m", hour: int = 10) -> list:
+    return [
+        {
+            "message_id": f"{prefix}{index}",
+            "sender_phone": sender,
+            "receiver_phone": SECRETARY if sender == LEAD else LEAD,
+            "sender_type": "lead" if sender == LEAD else "secretary",
+            "content": content,
+            "timestamp": f"2025-08-06T{hour:02d}:{index:02d}:00+00:00",
+        }
+        for index, (sender, content) in enumerate(chat)
+    ]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = SWAILiteManager(str(tmp_path / "db.sqlite"))
+    layer2_grouper.configure(manager)
+    yield manager
+    layer2_grouper.configure(None)
+    manager.close()
+
+
+def _counters(row) -> dict:
+    return {column: int(row[column]) for column in COUNTER_COLUMNS}
+
+
+def test_incremental_features_match_chat_export_extraction(manager) -> None:
+    messages = _messages()
+    manager.store_messages(messages)
+    for message in messages:
+        layer2_grouper.process_layer2_grouping(message)
+
+    live = load_live_features(manager)
+    chat_df = pd.DataFrame({
+        "sender": [m["sender_phone"] for m in messages],
+        "message": [m["content"] for m in messages],
+        "timestamp": pd.to_datetime([m["timestamp"] for m in messages]),
+    })
+    expected = extract_features(chat_df, "success")
+
+    row = live.iloc[0]
+    assert row["chat_name"] == f"{LEAD}_20250806"
+    assert row["chat_type"] == "live"
+    assert row["duration_minutes"] == expected["duration_minutes"] == 5
+    assert _counters(row) == {column: int(expected[column]) for column in COUNTER_COLUMNS}
+
+
+def test_batch_and_single_paths_agree_and_are_idempotent(manager, tmp_path) -> None:
+    messages = _messages()
+    manager.store_messages(messages)
+    layer2_grouper.process_layer2_batch(messages[:4], batch_size=3)
+    layer2_grouper.process_layer2_batch(messages, batch_size=3)  # replayed batch
+    layer2_grouper.process_layer2_grouping(messages[0])
+
+    incremental = manager.get_conversation_features()
+    manager.rebuild_conversation_features()
+
+    assert manager.get_conversation_features() == incremental
+    assert incremental[0]["total_messages"] == len(messages)
+
+
+def test_messages_grouped_before_they_are_stored(manager) -> None:
+    messages = _messages()
+    layer2_grouper.process_layer2_batch(messages)
+    assert manager.get_conversation_features() == []
+
+    manager.store_messages(messages[:3])
+    for message in messages[3:]:
+        manager.store_message(message)
+    manager.store_messages(messages)  # replay: nothing is folded twice
+
+    incremental = manager.get_conversation_features()
+    manager.rebuild_conversation_features()
+    assert manager.get_conversation_features() == incremental
+    assert incremental[0]["total_messages"] == len(messages)
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_overwrites_fold_new_messages_and_recount_changed_ones(manager, batched) -> None:
+    messages = _messages()
+    layer2_grouper.process_layer2_batch(messages)
+    store = (lambda batch: manager.store_messages(batch, overwrite=True)) if batched else (
+        lambda batch: [manager.store_message(message, overwrite=True) for message in batch])
+
+    store(messages)  # linked before stored: folded on the overwrite path too
+    assert manager.get_conversation_features()[0]["total_messages"] == len(messages)
+
+    edited = [dict(messages[0], content="Oi, tudo bem?"), dict(messages[3], content="Quero marcar a consulta")]
+    store(edited)
+    state = manager.get_conversation_features()[0]
+    manager.rebuild_conversation_features()
+
+    assert manager.get_conversation_features()[0] == state
+    assert state["total_messages"] == len(messages)
+    assert (state["preco_keywords"], state["agendamento_keywords"]) == (1, 6)  # "valor" gone, "consulta" moved
+
+
+def test_keywords_follow_the_settings(tmp_path) -> None:
+    settings = {"AGENDAMENTO_KEYWORDS": ["amanhã"], "PRECO_KEYWORDS": ["800"]}
+    manager = SWAILiteManager(str(tmp_path / "db.sqlite"), settings=settings)
+    messages = _messages()
+    records = layer2_grouper.conversation_records(messages)
+    manager.store_and_group(messages, records)
+
+    state = manager.get_conversation_features()[0]
+    assert (state["agendamento_keywords"], state["preco_keywords"]) == (1, 1)
+    manager.rebuild_conversation_features(settings={})
+    assert manager.get_conversation_features()[0]["preco_keywords"] == 2  # constants: "valor" and "reais"
+    manager.close()
+
+
+def test_late_message_recounts_interactions(manager) -> None:
+    messages = _messages()
+    manager.store_messages(messages)
+    for message in messages[:2] + messages[3:]:
+        layer2_grouper.process_layer2_grouping(message)
+    # The secretary's second message arrives after the rest of the chat
+    layer2_grouper.process_layer2_grouping(messages[2])
+
+    state = manager.get_conversation_features()[0]
+    manager.rebuild_conversation_features()
+    rebuilt = manager.get_conversation_features()[0]
+
+    assert state == rebuilt
+    assert state["num_interactions"] == 4
+    assert state["last_sender"] == SECRETARY
+    assert state["first_timestamp"] == messages[0]["timestamp"]
+
+
+def test_session_engine_updates_features(tmp_path) -> None:
+    db_path = str(tmp_path / "db.sqlite")
+    messages = _messages()
+    manager = SWAILiteManager(db_path)
+    manager.store_messages(messages)
+    with SessionEngine(db_path, gap_minutes=30) as engine:
+        engine.record_many(messages + messages[:2])
+
+    rows = manager.get_conversation_features()
+    manager.close()
+    assert len(rows) == 1
+    assert rows[0]["total_messages"] == len(messages)
+    assert rows[0]["preco_keywords"] == 2  # "valor" and "reais"
+
+
+def test_features_skip_completed_conversations_and_unstored_messages(manager) -> None:
+    messages = _messages()
+    manager.store_messages(messages[:3])
+    layer2_grouper.process_layer2_batch(messages[:4])  # m3 was never stored
+    with manager.conn:
+        manager.conn.execute("UPDATE conversations SET status = 'completed'")
+    layer2_grouper.process_layer2_batch(messages[4:])
+
+    assert manager.get_conversation_features()[0]["total_messages"] == 3
+
+
+def test_rebuild_fills_conversations_grouped_before_the_table(manager) -> None:
+    messages = _messages() + _messages(prefix="n", hour=11)
+    manager.store_messages(messages)
+    layer2_grouper.process_layer2_batch(messages)
+    with manager.conn:
+        manager.conn.execute("DELETE FROM conversation_features")
+
+    assert manager.rebuild_conversation_features([f"{LEAD}_20250806"]) == 1
+    row = manager.get_conversation_features([f"{LEAD}_20250806"])[0]
+    assert row["total_messages"] == 12
+    assert row["last_timestamp"] == "2025-08-06T11:05:00+00:00"
+
+
+def test_features_frame_of_no_rows_has_feature_columns() -> None:
+    df = features_frame([])
+    assert df.empty
+    assert {"chat_name", "chat_type", "duration_minutes", *COUNTER_COLUMNS} <= set(df.columns)
+
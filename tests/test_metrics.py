@@ -0,0 +1,115 @@
+"""Tests for the shared per-chat_type metrics kernel."""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.metrics import METRIC_COLUMNS, chat_type_totals, metrics_from_totals
+from modules.utils import calculate_opportunity_cost, get_summary_stats
+from swai_core import SWAIAnalyzer, create_sample_data
+
+
+def _reference_basic_metrics(df: pd.DataFrame) -> dict:
+    """Column-by-column computation that ``calculate_basic_metrics`` replaced."""
+    by_type = {}
+    for chat_type in ("success", "fail"):
+        subset = df[df["chat_type"] == chat_type]
+        by_type[chat_type] = {} if subset.empty else {
+            "avg_duration": subset["duration_minutes"].mean(),
+            "avg_messages": subset["total_messages"].mean(),
+            "avg_secretary_messages": subset["secretary_messages"].mean(),
+            "avg_patient_messages": subset["patient_messages"].mean(),
+            "avg_interactions": subset["num_interactions"].mean(),
+            "avg_agendamento_keywords": subset["agendamento_keywords"].mean(),
+            "avg_preco_keywords": subset["preco_keywords"].mean(),
+        }
+    success_count = int((df["chat_type"] == "success").sum())
+    fail_count = int((df["chat_type"] == "fail").sum())
+    return {
+        "summary": {
+            "total_conversations": len(df),
+            "success_count": success_count,
+            "fail_count": fail_count,
+            "success_rate": success_count / len(df),
+            "failure_rate": fail_count / len(df),
+            "avg_duration": df["duration_minutes"].mean(),
+            "avg_messages": df["total_messages"].mean(),
+            "avg_secretary_messages": df["secretary_messages"].mean(),
+            "avg_patient_messages": df["patient_messages"].mean(),
+        },
+        "success_metrics": by_type["success"],
+        "fail_metrics": by_type["fail"],
+    }
+
+
+def _assert_close(actual: dict, expected: dict) -> None:
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            _assert_close(actual[key], value)
+        elif isinstance(value, float) and math.isnan(value):
+            assert math.isnan(actual[key]), key
+        else:
+            assert actual[key] == pytest.approx(value), key
+
+
+def _messy_features() -> pd.DataFrame:
+    df = create_sample_data()
+    df.loc[0, "chat_type"] = None
+    df.loc[1, "chat_type"] = "live"
+    df.loc[2, "duration_minutes"] = np.nan
+    df["preco_keywords"] = df["preco_keywords"].astype(object)
+    df.loc[3, "preco_keywords"] = "n/d"
+    return df
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_basic_metrics_match_column_by_column_means(categorical) -> None:
+    df = _messy_features()
+    if categorical:
+        df["chat_type"] = df["chat_type"].astype("category")
+    reference = df.assign(preco_keywords=pd.to_numeric(df["preco_keywords"], errors="coerce"))
+
+    _assert_close(SWAIAnalyzer({}).calculate_basic_metrics(df), _reference_basic_metrics(reference))
+
+
+def test_single_outcome_leaves_the_other_empty() -> None:
+    df = create_sample_data().assign(chat_type="success")
+
+    metrics = SWAIAnalyzer({}).calculate_basic_metrics(df)
+    assert metrics["fail_metrics"] == {}
+    assert metrics["summary"]["success_rate"] == 1.0
+    assert metrics_from_totals(chat_type_totals(df.iloc[0:0])) == {}
+
+
+def test_totals_columns_and_missing_metrics() -> None:
+    df = create_sample_data().drop(columns=["num_interactions"])
+    totals = chat_type_totals(df)
+
+    assert list(totals.columns) == ["conversations"] + [
+        f"{metric}_{stat}" for metric in METRIC_COLUMNS for stat in ("n", "sum")
+    ]
+    assert (totals["num_interactions_n"] == 0).all()
+    assert math.isnan(metrics_from_totals(totals)["success_metrics"]["avg_interactions"])
+
+
+def test_utils_helpers_keep_their_shapes() -> None:
+    df = _messy_features().assign(preco_keywords=0)
+    reference = _reference_basic_metrics(df)
+
+    stats = get_summary_stats(df)
+    assert stats["total_conversations"] == len(df)
+    assert stats["success_conversations"] == reference["summary"]["success_count"]
+    assert stats["avg_duration"] == pytest.approx(reference["summary"]["avg_duration"])
+    assert stats["fail_avg_messages"] == pytest.approx(reference["fail_metrics"]["avg_messages"])
+    assert "success_avg_duration" not in get_summary_stats(df[df["chat_type"] == "success"])
+
+    cost = calculate_opportunity_cost(df, valor_consulta=100, leads_diarios=10)
+    counted = reference["summary"]["success_count"] + reference["summary"]["fail_count"]
+    assert cost["total_cases"] == counted
+    assert cost["custo_oportunidade_diario"] == pytest.approx(10 * reference["summary"]["fail_count"] / counted * 100)
+    assert calculate_opportunity_cost(df[df["chat_type"] == "live"]) is None
@@ -0,0 +1,53 @@
+"""Tests for the vectorized pendency engine."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from modules.pendencies import compile_pendency_pattern, extract_pendency_table
+
+
+def _chat(rows: list[tuple[str, str]]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["sender", "message"])
+
+
+def test_one_row_per_message_and_category_in_order() -> None:
+    long_text = "Preciso de " + "x" * 120
+    chat = _chat([
+        ("Sol", "Vou agendar e o valor vai por PIX"),
+        ("Lead", "tudo bem"),
+        ("Lead", long_text),
+        ("Lead", "bioimpedância\nmarcar para amanhã"),
+    ])
+
+    table = extract_pendency_table(chat)
+
+    assert table["message_index"].tolist() == [0, 0, 2, 3, 3]
+    assert table["tipo"].tolist() == ["agendamento", "pagamento", "informacao", "agendamento", "exame"]
+    assert table["responsavel"].tolist() == ["secretaria", "secretaria", "paciente", "paciente", "paciente"]
+    assert table["descricao"].iloc[2] == long_text[:100] + "..."
+    assert set(table["status"]) == {"pendente"}
+    assert isinstance(table["tipo"].dtype, pd.CategoricalDtype)
+
+
+def test_no_hits_and_empty_chat_keep_schema() -> None:
+    empty = extract_pendency_table(_chat([]))
+    none = extract_pendency_table(_chat([("Lead", "oi")]))
+
+    for table in (empty, none):
+        assert table.empty
+        assert list(table.columns) == ["message_index", "descricao", "responsavel", "tipo", "status"]
+
+
+def test_custom_patterns_and_secretaries() -> None:
+    chat = _chat([("Ana", "mande o laudo"), ("Lead", "ok, laudo enviado")])
+
+    table = extract_pendency_table(chat, patterns={"laudo": ["laudo"]}, secretary_senders=["Ana"])
+
+    assert table["responsavel"].tolist() == ["secretaria", "paciente"]
+
+
+def test_invalid_category_name_rejected() -> None:
+    with pytest.raises(ValueError):
+        compile_pendency_pattern({"não válido": ["x"]})
@@ -80,6 +80,53 @@ def test_malformed_message_logs_error(tmp_path, caplog):
     assert "campos obrigatórios ausentes" in caplog.text
 
 
+def _replay_messages() -> list[dict]:
+    base = datetime(2025, 8, 6, 10, tzinfo=timezone.utc)
+    messages = [_msg(i, (base + timedelta(minutes=i)).isoformat(), sender="lead" if i % 2 else "secretary") for i in range(5)]
+    messages.append(_msg(0, base.isoformat()))  # duplicate
+    messages.append(_msg(9, (base - timedelta(hours=1)).isoformat()))  # earlier start
+    messages.append(_msg(10, (base + timedelta(days=1)).isoformat()))  # next day
+    messages.append({"message_id": "bad"})
+    return messages
+
+
+def test_batch_grouping_matches_sequential(tmp_path):
+    sequential_dir = tmp_path / "seq"
+    batch_dir = tmp_path / "batch"
+    sequential_dir.mkdir()
+    batch_dir.mkdir()
+
+    manager = _setup_manager(sequential_dir)
+    expected = [layer2_grouper.process_layer2_grouping(m) for m in _replay_messages()]
+    expected_rows = [dict(r) for r in manager.conn.execute("SELECT * FROM conversations ORDER BY conversation_id")]
+    manager.close()
+
+    manager = _setup_manager(batch_dir)
+    results = layer2_grouper.process_layer2_batch(_replay_messages(), batch_size=3)
+    rows = [dict(r) for r in manager.conn.execute("SELECT * FROM conversations ORDER BY conversation_id")]
+    links = manager.conn.execute("SELECT COUNT(*) FROM conversation_messages").fetchone()[0]
+    manager.close()
+
+    assert results == expected
+    assert rows == expected_rows
+    assert links == 7
+
+
+def test_batch_grouping_skips_completed_conversations(tmp_path):
+    manager = _setup_manager(tmp_path)
+    ts = datetime(2025, 8, 6, 10, tzinfo=timezone.utc).isoformat()
+    layer2_grouper.process_layer2_grouping(_msg(1, ts))
+    with manager.conn:
+        manager.conn.execute("UPDATE conversations SET status = 'completed'")
+
+    results = layer2_grouper.process_layer2_batch([_msg(2, ts), _msg(3, ts)])
+    count = manager.conn.execute("SELECT message_count FROM conversations").fetchone()[0]
+    manager.close()
+
+    assert [r["status"] for r in results] == ["completed", "completed"]
+    assert count == 1
+
+
 @pytest.mark.slow
 def test_grouping_100_messages_performance(tmp_path):
     manager = _setup_manager(tmp_path)
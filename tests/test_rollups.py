@@ -0,0 +1,194 @@
+"""Tests for the materialized daily/weekly KPI rollups."""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import swai_data
+from modules.rollups import ROLLUP_METRICS, RollupStore, member_frame
+from swai_core import SWAIAnalyzer, create_sample_data
+
+
+SECRETARIES = ["Ana", "Bia", "Cris"]
+
+
+def _features(days: int = 50) -> pd.DataFrame:
+    df = create_sample_data()
+    start = pd.Timestamp("2025-01-01")
+    df["start_time"] = [
+        (start + pd.Timedelta(days=index * days // len(df), hours=9)).isoformat() for index in range(len(df))
+    ]
+    df["secretary_name"] = [SECRETARIES[index % len(SECRETARIES)] for index in range(len(df))]
+    return df
+
+
+def _assert_metrics_equal(actual: dict, expected: dict) -> None:
+    assert actual.keys() == expected.keys()
+    for section, values in expected.items():
+        assert actual[section].keys() == values.keys(), section
+        for name, value in values.items():
+            if isinstance(value, float) and math.isnan(value):
+                assert math.isnan(actual[section][name]), (section, name)
+            else:
+                assert actual[section][name] == pytest.approx(value), (section, name)
+
+
+def _between(df: pd.DataFrame, start: str, end: str) -> pd.DataFrame:
+    day = df["start_time"].str[:10]
+    return df[(day >= start) & (day <= end)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with RollupStore(str(tmp_path / "rollups.sqlite")) as store:
+        yield store
+
+
+def test_all_time_metrics_match_full_recompute(store) -> None:
+    df = _features()
+    store.apply(df)
+
+    _assert_metrics_equal(store.basic_metrics(), SWAIAnalyzer({}).calculate_basic_metrics(df))
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        ("2025-01-01", "2025-02-19"),  # several whole weeks plus partial edges
+        ("2025-01-08", "2025-01-10"),  # inside a single week
+        ("2025-01-06", "2025-01-19"),  # exactly two weeks, Monday to Sunday
+        ("2025-01-12", "2025-01-13"),  # Sunday and the following Monday
+    ],
+)
+def test_range_metrics_match_recompute_of_filtered_rows(store, start, end) -> None:
+    df = _features()
+    store.apply(df)
+
+    expected = SWAIAnalyzer({}).calculate_basic_metrics(_between(df, start, end))
+    _assert_metrics_equal(store.basic_metrics(start, end), expected)
+
+
+def test_secretary_filter_and_open_ended_range(store) -> None:
+    df = _features()
+    store.apply(df)
+
+    subset = _between(df, "2025-01-20", "2099-12-31")
+    expected = SWAIAnalyzer({}).calculate_basic_metrics(subset[subset["secretary_name"] == "Bia"])
+    _assert_metrics_equal(store.basic_metrics(start="2025-01-20", secretary="Bia"), expected)
+    assert store.secretaries() == SECRETARIES
+
+
+def test_incremental_updates_match_rebuild(store, tmp_path) -> None:
+    df = _features()
+    assert store.apply(df.iloc[:30]) == {"added": 30, "updated": 0, "unchanged": 0}
+
+    changed = df.copy()
+    changed.loc[5, "chat_type"] = "fail" if changed.loc[5, "chat_type"] == "success" else "success"
+    changed.loc[6, "start_time"] = "2025-03-01T10:00:00"
+    changed.loc[7, "duration_minutes"] = np.nan
+    # ``chat_type`` is part of the key: the reclassified chat is a new member
+    assert store.apply(changed.iloc[:40]) == {"added": 11, "updated": 2, "unchanged": 27}
+    # ... and its old contribution is retracted by ``sync``
+    assert store.sync(changed.drop(index=[0, 1])) == {"added": 10, "updated": 0, "unchanged": 38, "removed": 3}
+
+    with RollupStore(str(tmp_path / "rebuilt.sqlite")) as rebuilt:
+        rebuilt.apply(changed.drop(index=[0, 1]))
+        for start, end in [(None, None), ("2025-01-01", "2025-01-31"), ("2025-02-01", "2025-03-31")]:
+            _assert_metrics_equal(store.basic_metrics(start, end), rebuilt.basic_metrics(start, end))
+    # Emptied rollup rows are dropped rather than kept at zero
+    assert store.conn.execute("SELECT COUNT(*) FROM rollup_daily WHERE conversations <= 0").fetchone()[0] == 0
+
+
+def test_failed_sync_leaves_rollups_untouched(store, monkeypatch) -> None:
+    df = _features()
+    store.apply(df)
+    before = store.basic_metrics()
+
+    def broken(members):
+        raise RuntimeError("falha ao aplicar")
+
+    monkeypatch.setattr(store, "_apply", broken)
+    with pytest.raises(RuntimeError):
+        store.sync(df.iloc[:10])
+
+    # The retraction of the 40 missing conversations was rolled back too
+    _assert_metrics_equal(store.basic_metrics(), before)
+    assert store.conn.execute("SELECT COUNT(*) FROM rollup_members").fetchone()[0] == len(df)
+
+
+def test_metric_stats_use_sums_of_squares(store) -> None:
+    df = _features()
+    df.loc[3, "preco_keywords"] = np.nan
+    store.apply(df)
+
+    stats = store.metric_stats("2025-01-01", "2025-02-28")
+    expected = df.groupby("chat_type")[list(ROLLUP_METRICS)].agg(["count", "mean", "std"])
+    for metric in ROLLUP_METRICS:
+        for stat in ("count", "mean", "std"):
+            np.testing.assert_allclose(
+                stats[(metric, stat)].sort_index().to_numpy(dtype=float),
+                expected[(metric, stat)].sort_index().to_numpy(dtype=float),
+            )
+
+
+def test_unknown_days_only_count_for_all_time(store) -> None:
+    df = _features().head(4)
+    df.loc[0, "start_time"] = None
+    df.loc[1, "start_time"] = "sem data"
+    store.apply(df)
+
+    assert member_frame(df)["day"].tolist()[:2] == ["", ""]
+    assert store.basic_metrics()["summary"]["total_conversations"] == 4
+    assert store.basic_metrics("2000-01-01", "2099-12-31")["summary"]["total_conversations"] == 2
+    assert store.basic_metrics("2030-01-01", "2030-12-31") == {}
+
+
+def test_analyzer_syncs_rollups_on_save(tmp_path) -> None:
+    settings = {
+        "FEATURE_STORE_DIR": str(tmp_path / "store"),
+        "FEATURES_CSV": str(tmp_path / "features.csv"),
+        "ROLLUP_DB": str(tmp_path / "rollups.sqlite"),
+    }
+    analyzer = SWAIAnalyzer(settings)
+    assert analyzer.calculate_range_metrics() == {}
+
+    df = _features()
+    analyzer.save_conversation_data(df)
+    analyzer.save_conversation_data(df.iloc[10:])
+
+    expected = analyzer.calculate_basic_metrics(_between(df.iloc[10:], "2025-01-15", "2025-02-10"))
+    _assert_metrics_equal(analyzer.calculate_range_metrics("2025-01-15", "2025-02-10"), expected)
+
+    swai_data.clear_data_cache()
+    fallback = swai_data.get_range_metrics({**settings, "ROLLUP_DB": None}, "2025-01-15", "2025-02-10")
+    _assert_metrics_equal(fallback, expected)
+    swai_data.clear_data_cache()
+
+
+def test_extraction_cli_syncs_rollups(tmp_path) -> None:
+    from modules.extract_features_enhanced import save_extraction
+
+    settings = {
+        "FEATURE_STORE_DIR": str(tmp_path / "store"),
+        "FEATURES_CSV": str(tmp_path / "features.csv"),
+        "ROLLUP_DB": str(tmp_path / "rollups.sqlite"),
+    }
+    df = _features()
+    SWAIAnalyzer(settings).save_conversation_data(df)  # previous run
+
+    rerun = df.iloc[10:].assign(chat_type="success")
+    save_extraction(rerun.to_dict("records"), settings["FEATURE_STORE_DIR"], settings["FEATURES_CSV"],
+                    str(tmp_path / "details.json"), settings["ROLLUP_DB"])
+
+    swai_data.clear_data_cache()
+    try:
+        expected = SWAIAnalyzer({}).calculate_basic_metrics(_between(rerun, "2025-01-15", "2025-02-10"))
+        _assert_metrics_equal(swai_data.get_range_metrics(settings, "2025-01-15", "2025-02-10"), expected)
+        unfiltered = swai_data.get_basic_metrics(settings)
+        assert unfiltered["summary"] == swai_data.get_range_metrics(settings)["summary"]
+    finally:
+        swai_data.clear_data_cache()
@@ -0,0 +1,225 @@
+"""Tests for gap-windowed Layer 2 grouping."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from integrations.database.sqlite_manager import SWAILiteManager
+from pipeline import layer2_grouper
+from pipeline.session_engine import SessionEngine
+
+
+LEAD = "5511999990000"
+SECRETARY = "5511888880000"
+
+
+def _msg(idx: int, ts: str, lead: str = LEAD, sender: str = "lead") -> dict:
+    return {
+        "message_id": f"m{idx}",
+        "sender_phone": lead if sender == "lead" else SECRETARY,
+        "receiver_phone": SECRETARY if sender == "lead" else lead,
+        "sender_type": sender,
+        "content": "oi",
+        "timestamp": ts,
+    }
+
+
+def _conversations(db_path: Path) -> list:
+    manager = SWAILiteManager(str(db_path))
+    rows = manager.conn.execute("SELECT * FROM conversations ORDER BY start_time").fetchall()
+    manager.close()
+    return [dict(row) for row in rows]
+
+
+def test_late_night_conversation_stays_whole(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    messages = [
+        _msg(1, "2025-08-06T23:40:00-03:00"),
+        _msg(2, "2025-08-06T23:55:00-03:00", sender="secretary"),
+        _msg(3, "2025-08-07T00:10:00-03:00"),
+    ]
+
+    with SessionEngine(str(db_path), gap_minutes=60) as engine:
+        results = engine.record_many(messages)
+
+    assert len({r["conversation_id"] for r in results}) == 1
+    assert results[0]["conversation_id"] == f"{LEAD}_{SECRETARY}_20250806T234000"
+    assert [r["ready_for_ai"] for r in results] == [False, False, True]
+
+    (conversation,) = _conversations(db_path)
+    assert conversation["message_count"] == 3
+    assert conversation["start_time"] == "2025-08-06T23:40:00-03:00"
+    assert conversation["end_time"] == "2025-08-07T00:10:00-03:00"
+
+    # Calendar-day grouping splits the same exchange at midnight
+    manager = SWAILiteManager(str(tmp_path / "legacy.sqlite"))
+    layer2_grouper.configure(manager)
+    legacy = layer2_grouper.process_layer2_batch(messages)
+    manager.close()
+    assert len({r["conversation_id"] for r in legacy}) == 2
+
+
+def test_silence_longer_than_gap_opens_new_conversation(tmp_path: Path) -> None:
+    with SessionEngine(str(tmp_path / "db.sqlite"), gap_minutes=30) as engine:
+        first = engine.record(_msg(1, "2025-08-06T10:00:00+00:00"))
+        same = engine.record(_msg(2, "2025-08-06T10:29:00+00:00"))
+        new = engine.record(_msg(3, "2025-08-06T11:00:00+00:00"))
+        other_lead = engine.record(_msg(4, "2025-08-06T11:00:00+00:00", lead="5511777770000"))
+
+    assert first["conversation_id"] == same["conversation_id"] != new["conversation_id"]
+    assert other_lead["conversation_id"] not in {first["conversation_id"], new["conversation_id"]}
+    assert [c["message_count"] for c in _conversations(tmp_path / "db.sqlite")] == [2, 1, 1]
+
+
+def test_duplicates_and_invalid_messages(tmp_path: Path) -> None:
+    with SessionEngine(str(tmp_path / "db.sqlite")) as engine:
+        engine.record(_msg(1, "2025-08-06T10:00:00+00:00"))
+        duplicate = engine.record(_msg(1, "2025-08-06T10:00:00+00:00"))
+        invalid = engine.record(_msg(2, "ontem"))
+        missing = engine.record({"message_id": "x"})
+        stats = engine.stats()
+
+    assert duplicate["ready_for_ai"] is False
+    assert invalid["status"] == missing["status"] == "error"
+    assert stats["duplicates"] == 1 and stats["errors"] == 2
+    assert _conversations(tmp_path / "db.sqlite")[0]["message_count"] == 1
+
+
+def test_restart_resumes_open_session_from_sqlite(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    with SessionEngine(str(db_path), gap_minutes=60) as engine:
+        first = engine.record(_msg(1, "2025-08-06T10:00:00+00:00"))
+        engine.record(_msg(2, "2025-08-06T10:05:00+00:00"))
+
+    with SessionEngine(str(db_path), gap_minutes=60) as engine:
+        replayed = engine.record(_msg(2, "2025-08-06T10:05:00+00:00"))
+        resumed = engine.record(_msg(3, "2025-08-06T10:50:00+00:00"))
+        stats = engine.stats()
+
+    assert replayed["conversation_id"] == resumed["conversation_id"] == first["conversation_id"]
+    assert resumed["ready_for_ai"] is True
+    assert stats["misses"] == 1 and stats["duplicates"] == 1
+    assert _conversations(db_path)[0]["message_count"] == 3
+
+
+def test_evicted_sessions_are_reloaded_consistently(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    leads = ["5511000000001", "5511000000002", "5511000000003"]
+    with SessionEngine(str(db_path), max_open=1, flush_interval=10) as engine:
+        results = [
+            engine.record(_msg(i, f"2025-08-06T10:{i:02d}:00+00:00", lead=leads[i % 3]))
+            for i in range(12)
+        ]
+        stats = engine.stats()
+
+    assert len({r["conversation_id"] for r in results}) == 3
+    assert stats["open_sessions"] == 1 and stats["evicted"] == 11
+    assert [c["message_count"] for c in _conversations(db_path)] == [4, 4, 4]
+
+
+def test_late_message_joins_earlier_conversation(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    with SessionEngine(str(db_path), gap_minutes=30) as engine:
+        morning = engine.record(_msg(1, "2025-08-06T09:00:00+00:00"))
+        afternoon = engine.record(_msg(2, "2025-08-06T15:00:00+00:00"))
+        late = engine.record(_msg(3, "2025-08-06T09:10:00+00:00"))
+        stats = engine.stats()
+
+    assert late["conversation_id"] == morning["conversation_id"] != afternoon["conversation_id"]
+    assert stats["late"] == 1
+    counts = {c["conversation_id"]: (c["message_count"], c["end_time"]) for c in _conversations(db_path)}
+    assert counts[morning["conversation_id"]] == (2, "2025-08-06T09:10:00+00:00")
+
+
+def test_completed_conversations_are_left_untouched(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    with SessionEngine(str(db_path)) as engine:
+        conversation_id = engine.record(_msg(1, "2025-08-06T10:00:00+00:00"))["conversation_id"]
+
+    manager = SWAILiteManager(str(db_path))
+    with manager.conn:
+        manager.conn.execute("UPDATE conversations SET status = 'completed'")
+    manager.close()
+
+    with SessionEngine(str(db_path)) as engine:
+        result = engine.record(_msg(2, "2025-08-06T10:01:00+00:00"))
+
+    assert result == {"status": "completed", "conversation_id": conversation_id, "ready_for_ai": False}
+    assert _conversations(db_path)[0]["message_count"] == 1
+
+
+def test_shared_writer_commits_before_returning(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    writer = SWAILiteManager(str(db_path))
+    engine = SessionEngine(str(db_path), writer=writer).start()
+
+    results = engine.record_many([_msg(i, f"2025-08-06T10:0{i}:00+00:00") for i in range(3)])
+
+    assert results[-1]["ready_for_ai"] is True
+    assert _conversations(db_path)[0]["message_count"] == 3
+    assert "queue" not in engine.stats()
+    engine.close()
+    writer.close()
+
+
+def test_failed_save_keeps_links_for_the_next_call(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "db.sqlite"
+    writer = SWAILiteManager(str(db_path))
+    engine = SessionEngine(str(db_path), writer=writer).start()
+    save_sessions = writer.save_sessions
+
+    def locked(conversations, links):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(writer, "save_sessions", locked)
+    with pytest.raises(RuntimeError):
+        engine.record_many([_msg(1, "2025-08-06T10:00:00+00:00"), _msg(2, "2025-08-06T10:01:00+00:00")])
+    assert engine.stats()["unsaved"] == 2
+
+    monkeypatch.setattr(writer, "save_sessions", save_sessions)
+    # The retried batch is made of duplicates: only the kept links add them
+    engine.record_many([_msg(2, "2025-08-06T10:01:00+00:00"), _msg(3, "2025-08-06T10:02:00+00:00")])
+
+    conversation_id = _conversations(db_path)[0]["conversation_id"]
+    assert sorted(writer.get_conversation_message_ids(conversation_id)) == ["m1", "m2", "m3"]
+    assert _conversations(db_path)[0]["message_count"] == 3
+    engine.close()
+    writer.close()
+
+
+def test_ready_for_ai_counts_only_stored_links(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    writer = SWAILiteManager(str(db_path))
+    writer.record_conversation_message("other", "m2", LEAD, SECRETARY, "2025-08-05T10:00:00+00:00")
+    engine = SessionEngine(str(db_path), writer=writer).start()
+
+    # m2 is already linked to another conversation, so only two links are stored
+    results = engine.record_many([_msg(i, f"2025-08-06T10:0{i}:00+00:00") for i in range(3)])
+    assert [r["ready_for_ai"] for r in results] == [False, False, False]
+
+    assert engine.record(_msg(3, "2025-08-06T10:03:00+00:00"))["ready_for_ai"] is True
+    engine.close()
+    writer.close()
+
+
+def test_reloaded_session_counts_stored_links(tmp_path: Path) -> None:
+    db_path = tmp_path / "db.sqlite"
+    with SessionEngine(str(db_path), gap_minutes=60) as engine:
+        engine.record(_msg(1, "2025-08-06T10:00:00+00:00"))
+    manager = SWAILiteManager(str(db_path))
+    with manager.conn:
+        manager.conn.execute("UPDATE conversations SET message_count = 5")
+    manager.close()
+
+    with SessionEngine(str(db_path), gap_minutes=60) as engine:
+        result = engine.record(_msg(2, "2025-08-06T10:05:00+00:00"))
+
+    assert result["ready_for_ai"] is False
+    assert _conversations(db_path)[0]["message_count"] == 2
+
+
+def test_invalid_settings() -> None:
+    with pytest.raises(ValueError):
+        SessionEngine("db.sqlite", gap_minutes=0)
@@ -0,0 +1,264 @@
+"""Tests for SWAILiteManager storage APIs."""
+
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from integrations.database import sqlite_manager
+from integrations.database.sqlite_manager import IGNORED, INSERTED, OVERWRITTEN, SCHEMA_VERSION, SWAILiteManager
+
+
+def _message(message_id: str | None, content: str = "oi", sender: str = "111", receiver: str = "222",
+             timestamp: str = "2025-08-06T10:00:00+00:00") -> dict:
+    return {
+        "message_id": message_id,
+        "sender_phone": sender,
+        "receiver_phone": receiver,
+        "sender_type": "lead",
+        "content": content,
+        "timestamp": timestamp,
+    }
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = SWAILiteManager(str(tmp_path / "db.sqlite"))
+    yield manager
+    manager.close()
+
+
+def test_store_messages_reports_outcome_per_row(manager) -> None:
+    manager.store_message(_message("old"))
+
+    outcomes = manager.store_messages(
+        [_message("a"), _message("old"), _message("b"), _message("a", "again")], batch_size=2
+    )
+
+    assert [o.status for o in outcomes] == [INSERTED, IGNORED, INSERTED, IGNORED]
+    assert outcomes[0].row_id == outcomes[3].row_id == manager.get_message_by_id("a")["id"]
+    assert manager.get_message_by_id("a")["content"] == "oi"
+    assert manager.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 3
+
+
+def test_store_messages_overwrite_matches_sequential_semantics(manager) -> None:
+    manager.store_message(_message("old"))
+
+    outcomes = manager.store_messages([_message("old", "new"), _message("x", "1"), _message("x", "2")], overwrite=True)
+
+    assert [o.status for o in outcomes] == [OVERWRITTEN, INSERTED, OVERWRITTEN]
+    assert manager.get_message_by_id("old")["content"] == "new"
+    assert manager.get_message_by_id("x")["content"] == "2"
+
+
+def test_store_messages_without_id_always_inserts(manager) -> None:
+    outcomes = manager.store_messages([_message(None), _message(None)])
+
+    assert [o.status for o in outcomes] == [INSERTED, INSERTED]
+    assert outcomes[0].row_id != outcomes[1].row_id
+
+
+def test_store_messages_is_one_transaction(manager) -> None:
+    bad = _message("b")
+    bad["timestamp"] = object()  # not bindable: fails inside the second batch
+
+    with pytest.raises(Exception):
+        manager.store_messages([_message("a"), bad], batch_size=1)
+
+    assert manager.get_message_by_id("a") is None
+
+
+def test_performance_profile_applied_by_default(manager) -> None:
+    report = manager.diagnostics()
+
+    assert report["journal_mode"] == "WAL"
+    assert report["synchronous"] == "NORMAL"
+    assert report["temp_store"] == "MEMORY"
+    assert report["busy_timeout"] == 5000
+    assert report["cache_size"] == -64000
+
+
+def test_custom_and_empty_profiles(tmp_path) -> None:
+    custom = SWAILiteManager(str(tmp_path / "custom.sqlite"), profile={"synchronous": "FULL", "busy_timeout": 100})
+    plain = SWAILiteManager(str(tmp_path / "plain.sqlite"), profile={})
+
+    assert custom.diagnostics()["synchronous"] == "FULL"
+    assert custom.diagnostics()["busy_timeout"] == 100
+    assert plain.diagnostics()["journal_mode"] == "DELETE"
+    custom.close()
+    plain.close()
+
+
+@pytest.mark.parametrize("profile", [{"foreign_keys": 1}, {"synchronous": "OFF; DROP TABLE messages"}, {"cache_size": 1.5}])
+def test_invalid_profile_rejected(tmp_path, profile) -> None:
+    with pytest.raises(ValueError):
+        SWAILiteManager(str(tmp_path / "db.sqlite"), profile=profile)
+
+
+def _record(manager, message_id: str, timestamp: str, conversation_id: str = "111_20250806") -> dict:
+    return manager.record_conversation_message(conversation_id, message_id, "111", "222", timestamp)
+
+
+def test_record_conversation_message_upsert(manager) -> None:
+    _record(manager, "m1", "2025-08-06T10:00:00")
+    _record(manager, "m2", "2025-08-06T09:00:00")
+    row = _record(manager, "m1", "2025-08-06T11:00:00")
+
+    assert row["message_count"] == 2
+    assert row["start_time"] == "2025-08-06T09:00:00"
+    assert row["end_time"] == "2025-08-06T11:00:00"
+    assert row["status"] == "active"
+
+
+def test_missing_timestamp_keeps_known_window(manager) -> None:
+    _record(manager, "m1", "2025-08-06T10:00:00")
+    row = _record(manager, "m2", None)
+
+    assert (row["start_time"], row["end_time"], row["message_count"]) == (
+        "2025-08-06T10:00:00", "2025-08-06T10:00:00", 2,
+    )
+
+    rows = manager.record_conversation_messages([
+        ("c2", "m3", "111", "222", "2025-08-06T10:00:00"),
+        ("c2", "m4", "111", "222", None),
+    ])
+    stored = manager.conn.execute(
+        "SELECT start_time, end_time FROM conversations WHERE conversation_id = 'c2'"
+    ).fetchone()
+    assert rows[-1]["start_time"] == "2025-08-06T10:00:00"
+    assert tuple(stored) == ("2025-08-06T10:00:00", "2025-08-06T10:00:00")
+
+
+def test_old_sqlite_rejected(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(sqlite_manager.sqlite3, "sqlite_version_info", (3, 31, 1))
+    monkeypatch.setattr(sqlite_manager.sqlite3, "sqlite_version", "3.31.1")
+
+    with pytest.raises(RuntimeError, match="3.35.0"):
+        SWAILiteManager(str(tmp_path / "old.sqlite"))
+
+
+def test_record_conversation_message_leaves_completed_untouched(manager) -> None:
+    _record(manager, "m1", "2025-08-06T10:00:00")
+    with manager.conn:
+        manager.conn.execute("UPDATE conversations SET status = 'completed'")
+
+    row = _record(manager, "m2", "2025-08-06T08:00:00")
+
+    assert (row["status"], row["message_count"], row["start_time"]) == ("completed", 1, "2025-08-06T10:00:00")
+    assert manager.conn.execute("SELECT COUNT(*) FROM conversation_messages").fetchone()[0] == 1
+
+
+def test_record_conversation_message_round_trips(manager) -> None:
+    manager.store_message(_message("m1"))
+    statements: list[str] = []
+    manager.conn.set_trace_callback(statements.append)
+
+    _record(manager, "m1", "2025-08-06T10:00:00")
+    _record(manager, "m1", "2025-08-06T10:00:00")
+
+    data_statements = [s for s in statements if not s.lstrip().upper().startswith(("BEGIN", "COMMIT"))]
+    # link + conversation upsert, then the message, feature row and its write;
+    # a repeated message costs only the first two
+    assert len(data_statements) == 5 + 2
+
+
+def test_unversioned_database_is_migrated(tmp_path) -> None:
+    db_path = tmp_path / "legacy.sqlite"
+    legacy = sqlite3.connect(db_path)
+    legacy.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, message_id TEXT UNIQUE, "
+                   "sender_phone TEXT, receiver_phone TEXT, sender_type TEXT, content TEXT, timestamp TEXT)")
+    legacy.execute("INSERT INTO messages (message_id, content) VALUES ('keep', 'x')")
+    legacy.commit()
+    legacy.close()
+
+    manager = SWAILiteManager(str(db_path))
+    indexes = {row[0] for row in manager.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    assert manager.schema_version() == SCHEMA_VERSION
+    assert manager.get_message_by_id("keep")["content"] == "x"
+    assert "idx_conversation_messages_conversation" in indexes
+    manager.close()
+
+
+def test_end_time_backfilled_by_migration(tmp_path) -> None:
+    db_path = tmp_path / "v2.sqlite"
+    manager = SWAILiteManager(str(db_path))
+    manager.store_messages([_message("a", timestamp="2025-08-06T10:00:00"), _message("b", timestamp="2025-08-06T12:00:00")])
+    for message_id in ("a", "b", "unstored"):
+        manager.record_conversation_message("111_20250806", message_id, "111", "222", "2025-08-06T10:00:00")
+    manager.record_conversation_message("222_20250806", "unstored-2", "222", "111", "2025-08-06T08:00:00")
+    # Roll the file back to schema version 2
+    with manager.conn:
+        manager.conn.execute("DROP INDEX idx_conversations_pair_start")
+        manager.conn.execute("ALTER TABLE conversations DROP COLUMN end_time")
+        manager.conn.execute("PRAGMA user_version = 2")
+    manager.close()
+
+    manager = SWAILiteManager(str(db_path))
+    end_times = {c["conversation_id"]: c["end_time"] for c in manager.get_lead_conversations("111")
+                 + manager.get_lead_conversations("222")}
+    manager.close()
+
+    assert end_times == {"111_20250806": "2025-08-06T12:00:00", "222_20250806": "2025-08-06T08:00:00"}
+
+
+def test_save_sessions_recounts_stored_links(manager) -> None:
+    session = {"conversation_id": "s1", "lead_phone": "111", "secretary_phone": "222",
+               "start_time": "2025-08-06T10:00:00", "end_time": "2025-08-06T10:05:00"}
+    manager.save_sessions([session], [("s1", "a"), ("s1", "b")])
+    # "a" is already linked: only "c" is new
+    manager.save_sessions([dict(session, end_time="2025-08-06T10:09:00")], [("s1", "a"), ("s1", "c")])
+
+    (row,) = manager.get_pair_conversations("111", "222")
+    assert (row["message_count"], row["end_time"]) == (3, "2025-08-06T10:09:00")
+    assert sorted(manager.get_conversation_message_ids("s1")) == ["a", "b", "c"]
+
+
+def test_in_lists_are_chunked_to_the_variable_limit(manager, monkeypatch) -> None:
+    monkeypatch.setattr(sqlite_manager, "_MAX_VARIABLES", 2)
+    messages = [
+        _message(f"m{i}", sender=sender, timestamp=f"2025-08-06T10:0{9 - i}:00+00:00")
+        for i, sender in enumerate(["111", "222", "111", "111", "222"])
+    ]
+    records = [("c1" if i % 2 else "c2", m["message_id"], "111", "222", m["timestamp"]) for i, m in enumerate(messages)]
+
+    outcomes, _ = manager.store_and_group(messages, records)
+    assert [o.status for o in outcomes] == [INSERTED] * 5
+    manager.save_sessions([], [("c3", "m0"), ("c3", "late")])
+    folded = manager.get_conversation_features(["c2", "c1", "c2"])
+
+    assert [f["conversation_id"] for f in folded] == ["c1", "c2"]
+    assert [f["total_messages"] for f in folded] == [2, 3]
+    assert manager.rebuild_conversation_features(["c2", "c1"]) == 2
+    assert manager.get_conversation_features(["c1", "c2"]) == folded
+
+
+def test_lookup_queries(manager) -> None:
+    manager.store_messages([
+        _message("a", sender="111", receiver="222", timestamp="2025-08-06T10:00:00"),
+        _message("b", sender="222", receiver="111", timestamp="2025-08-06T09:00:00"),
+        _message("c", sender="333", receiver="222", timestamp="2025-08-07T10:00:00"),
+    ])
+    for message_id, timestamp in (("a", "2025-08-06T10:00:00"), ("b", "2025-08-06T09:00:00")):
+        manager.record_conversation_message("111_20250806", message_id, "111", "222", timestamp)
+
+    assert [m["message_id"] for m in manager.get_conversation_messages("111_20250806")] == ["b", "a"]
+    assert [m["message_id"] for m in manager.get_lead_history("111")] == ["b", "a"]
+    assert [m["message_id"] for m in manager.get_lead_history("111", since="2025-08-06T09:30")] == ["a"]
+    assert [m["message_id"] for m in manager.get_messages_between("2025-08-06", "2025-08-07")] == ["b", "a"]
+    assert [m["message_id"] for m in manager.get_messages_between("2025-08-01", "2025-09-01", sender_phone="333")] == ["c"]
+    assert [c["conversation_id"] for c in manager.get_lead_conversations("111")] == ["111_20250806"]
+
+
+@pytest.mark.parametrize("sql, params", [
+    ("SELECT message_id FROM conversation_messages WHERE conversation_id = ?", ("x",)),
+    ("SELECT * FROM messages WHERE timestamp >= ? AND timestamp < ?", ("a", "b")),
+    ("SELECT * FROM messages WHERE sender_phone = ? AND timestamp >= ?", ("1", "")),
+    ("SELECT * FROM conversations WHERE lead_phone = ? ORDER BY start_time", ("1",)),
+    ("SELECT * FROM conversations WHERE lead_phone = ? AND secretary_phone = ? ORDER BY start_time DESC", ("1", "2")),
+])
+def test_lookups_use_indexes(manager, sql, params) -> None:
+    plan = " ".join(row[-1] for row in manager.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+    assert plan.startswith("SEARCH") and "INDEX idx_" in plan
@@ -0,0 +1,89 @@
+"""Tests for the shared timestamp normalization."""
+
+from __future__ import annotations
+
+import pytest
+
+from pipeline import timestamps
+from pipeline.layer1_formatter import Layer1FormatError, format_message, format_messages_batch
+from pipeline.timestamps import TimestampError, normalize_epochs, normalize_timestamp, timestamp_date
+
+
+@pytest.mark.parametrize("value,expected", [
+    (1754474400, "2025-08-06T10:00:00+00:00"),
+    ("1754474400", "2025-08-06T10:00:00+00:00"),
+    (1754474400.9, "2025-08-06T10:00:00+00:00"),
+    (1754474400000, "2025-08-06T10:00:00+00:00"),
+    ("1754474400250", "2025-08-06T10:00:00.250+00:00"),
+    ("2025-08-06T07:00:00-03:00", "2025-08-06T07:00:00-03:00"),
+    ("2025-08-06T10:00:00Z", "2025-08-06T10:00:00+00:00"),
+    ("2025-08-06 10:00:00", "2025-08-06T10:00:00"),
+])
+def test_supported_formats(value, expected) -> None:
+    assert normalize_timestamp(value) == expected
+
+
+def test_lenient_mode_keeps_unparseable_strings(caplog: pytest.LogCaptureFixture) -> None:
+    timestamps.clear_cache()
+
+    assert normalize_timestamp("ontem à tarde") == "ontem à tarde"
+    assert "ontem à tarde" in caplog.text
+
+
+@pytest.mark.parametrize("value,reason", [
+    ("ontem à tarde", "formato de timestamp inválido"),
+    ("2025-08-06T10:00:00", "sem fuso horário"),
+    (True, "ambíguo"),
+    (12345, "ambíguo"),
+    (4102444800000, "ambíguo"),
+])
+def test_strict_mode_rejects_ambiguous_inputs(value, reason) -> None:
+    with pytest.raises(TimestampError, match=reason):
+        normalize_timestamp(value, strict=True)
+
+
+@pytest.mark.parametrize("value", [None, [1], float("nan"), 10 ** 15])
+def test_invalid_values_are_rejected(value) -> None:
+    with pytest.raises(TimestampError):
+        normalize_timestamp(value)
+
+
+def test_repeated_values_hit_the_cache() -> None:
+    timestamps.clear_cache()
+    for _ in range(3):
+        normalize_timestamp(1754474400)
+        timestamp_date("2025-08-06T07:00:00-03:00")
+
+    info = timestamps.cache_info()
+    assert info["normalize"]["hits"] == 2
+    assert info["date"]["hits"] == 2
+
+
+def test_timestamp_date_uses_the_local_day() -> None:
+    assert timestamp_date("2025-08-06T23:30:00-03:00") == "20250806"
+    with pytest.raises(TimestampError):
+        timestamp_date("ontem")
+    with pytest.raises(TimestampError):
+        timestamp_date(1754474400)
+
+
+def test_normalize_epochs_matches_scalar_path() -> None:
+    values = [0, 1754474400, 1754474400.5, 1754474400250, -86400]
+
+    assert normalize_epochs(values) == [normalize_timestamp(v) for v in values]
+
+    with pytest.raises(TimestampError) as exc_info:
+        normalize_epochs([1754474400, 12345], strict=True)
+    assert exc_info.value.row == 1
+
+
+def test_strict_formatting_in_layer1() -> None:
+    raw = {"id": "m1", "timestamp": "2025-08-06T10:00:00", "from": "1", "to": "2"}
+
+    assert format_message(raw)["timestamp"] == "2025-08-06T10:00:00"
+    with pytest.raises(Layer1FormatError, match="sem fuso horário"):
+        format_message(raw, strict=True)
+    with pytest.raises(Layer1FormatError, match="mensagem 1: timestamp sem fuso horário"):
+        format_messages_batch([dict(raw, timestamp=1754474400), raw], strict=True)
+    with pytest.raises(Layer1FormatError, match="mensagem 1: timestamp ambíguo"):
+        format_messages_batch([dict(raw, timestamp="1754474400"), dict(raw, timestamp=7)], strict=True)
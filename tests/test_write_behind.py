@@ -0,0 +1,170 @@
+"""Tests for the write-behind group-commit queue."""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+from pipeline.write_behind import QueueFull, WriteBehindQueue
+
+
+def _messages(n: int, start: int = 0) -> list[dict]:
+    return [{"message_id": f"m{i}"} for i in range(start, start + n)]
+
+
+def test_flushes_by_size_and_by_time() -> None:
+    batches: list[list[dict]] = []
+
+    with WriteBehindQueue(batches.append, flush_size=10, flush_interval=0.05) as queue:
+        queue.put_many(_messages(25))
+        queue.flush()
+        assert [len(b) for b in batches] == [10, 10, 5]
+
+        queue.put(_messages(1, 100)[0])
+        time.sleep(0.2)
+        assert len(batches) == 4  # interval elapsed without an explicit flush
+
+    metrics = queue.metrics()
+    assert metrics["written"] == 26
+    assert metrics["flushes"] == 4
+    assert metrics["depth"] == 0
+    assert metrics["max_flush_ms"] >= metrics["avg_flush_ms"] >= 0
+
+
+def test_backpressure_blocks_then_times_out() -> None:
+    release = threading.Event()
+    queue = WriteBehindQueue(lambda batch: release.wait(), flush_size=2, flush_interval=0, max_pending=2).start()
+    try:
+        queue.put_many(_messages(2))  # taken by the blocked writer
+        time.sleep(0.05)
+        queue.put_many(_messages(2, 2))  # fills the buffer
+
+        with pytest.raises(QueueFull):
+            queue.put(_messages(1, 9)[0], timeout=0.05)
+        assert queue.metrics()["backpressure_waits"] == 1
+    finally:
+        release.set()
+        queue.close()
+    assert queue.metrics()["written"] == 4
+
+
+def test_log_replays_unflushed_messages_after_crash(tmp_path) -> None:
+    log_path = tmp_path / "wb.log"
+    never = threading.Event()
+    crashed = WriteBehindQueue(lambda batch: never.wait(), flush_size=100, flush_interval=60, log_path=log_path).start()
+    crashed.put_many(_messages(3))
+    # Simulated crash: the process dies without close(); a torn line is left behind
+    with log_path.open("a", encoding="utf-8") as f:
+        f.write('{"message_id": "m')
+
+    written: list[dict] = []
+    with WriteBehindQueue(written.extend, flush_size=100, flush_interval=0, log_path=log_path) as queue:
+        queue.flush()
+        assert queue.metrics()["replayed"] == 3
+    never.set()
+
+    assert [m["message_id"] for m in written] == ["m0", "m1", "m2"]
+    assert log_path.read_text() == ""
+
+
+def test_failed_batch_is_kept_in_log(tmp_path) -> None:
+    log_path = tmp_path / "wb.log"
+
+    def fail(batch):
+        raise RuntimeError("disk full")
+
+    with WriteBehindQueue(fail, flush_size=10, flush_interval=0, log_path=log_path,
+                          max_retries=1, retry_backoff=0) as queue:
+        queue.put_many(_messages(2))
+        queue.flush()
+        assert queue.metrics()["failed"] == 2
+        assert queue.metrics()["retries"] == 1
+
+    assert len(log_path.read_text().splitlines()) == 2
+
+
+def test_log_keeps_only_failed_messages(tmp_path) -> None:
+    log_path = tmp_path / "wb.log"
+
+    def write(batch):
+        if batch[0]["message_id"] == "m0":
+            raise RuntimeError("mensagem inválida")
+
+    with WriteBehindQueue(write, flush_size=2, flush_interval=0, log_path=log_path,
+                          max_retries=0) as queue:
+        queue.put_many(_messages(2))
+        queue.flush()
+        queue.put_many(_messages(4, 2))
+        queue.flush()
+        assert queue.metrics()["written"] == 4
+
+    assert [json.loads(line)["message_id"] for line in log_path.read_text().splitlines()] == ["m0", "m1"]
+
+
+def test_failed_batch_is_retried_in_process() -> None:
+    written: list[dict] = []
+    failures = [RuntimeError("database is locked")]
+
+    def flaky(batch):
+        if failures:
+            raise failures.pop()
+        written.extend(batch)
+
+    with WriteBehindQueue(flaky, flush_size=10, flush_interval=0, retry_backoff=0) as queue:
+        queue.put_many(_messages(3))
+        queue.flush()
+
+    assert len(written) == 3
+    assert queue.metrics()["failed"] == 0
+    assert queue.metrics()["retries"] == 1
+
+
+def test_replay_drops_torn_line_before_appending(tmp_path) -> None:
+    log_path = tmp_path / "wb.log"
+    log_path.write_text('{"message_id": "m0"}\n{"message_id": "m', encoding="utf-8")
+    never = threading.Event()
+
+    queue = WriteBehindQueue(lambda batch: never.wait(), flush_size=100, flush_interval=60, log_path=log_path).start()
+    queue.put(_messages(1, 1)[0])
+
+    assert [json.loads(line)["message_id"] for line in log_path.read_text().splitlines()] == ["m0", "m1"]
+    never.set()
+    queue.close()
+
+
+def test_concurrent_producers_respect_the_bound() -> None:
+    release = threading.Event()
+    queue = WriteBehindQueue(lambda batch: release.wait(), flush_size=1, flush_interval=0, max_pending=4).start()
+    queue.put(_messages(1)[0])  # taken by the blocked writer
+    time.sleep(0.05)
+    accepted = []
+
+    def produce(n: int) -> None:
+        try:
+            queue.put_many(_messages(2, 10 * n), timeout=0)
+            accepted.append(n)
+        except QueueFull:
+            pass
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len(accepted) == 2
+        assert queue.metrics()["max_depth"] <= 4
+    finally:
+        release.set()
+        queue.close()
+
+
+def test_closed_queue_rejects_messages() -> None:
+    queue = WriteBehindQueue(lambda batch: None).start()
+    queue.close()
+
+    with pytest.raises(RuntimeError):
+        queue.put({"message_id": "late"})